@@ -0,0 +1,122 @@
+"""In-process HTTP stand-in for the parts of the Elasticsearch API rosbeat uses.
+
+It accepts _bulk requests and counts documents without storing them, so
+benchmarks measure rosbeat rather than a cluster.
+"""
+import json
+import random
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; don't let Nagle delay the body
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body, status=200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('X-Elastic-Product', 'Elasticsearch')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('X-Elastic-Product', 'Elasticsearch')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        self._body()
+        self._reply({"version": {"number": "8.11.0"}, "tagline": "You Know, for Search"})
+
+    def do_POST(self):
+        body = self._body()
+        if not self.path.split('?')[0].endswith('/_bulk'):
+            self._reply({"acknowledged": True})
+            return
+
+        lines = [line for line in body.split(b'\n') if line]
+        fake = self.server.fake
+        # Action and source lines alternate; delete actions (no source) are not used by rosbeat
+        actions = lines[::2]
+        if fake.max_request_docs and len(actions) > fake.max_request_docs:
+            fake.record(0, len(body), throttled=len(actions))
+            self._reply({"error": {"type": "es_rejected_execution_exception"}, "status": 429}, status=429)
+            return
+
+        items = []
+        throttled = 0
+        for action_line in actions:
+            op_type = next(iter(json.loads(action_line)))
+            if fake.reject_rate and fake.random.random() < fake.reject_rate:
+                throttled += 1
+                items.append({op_type: {"status": 429, "error": {"type": "es_rejected_execution_exception"}}})
+            else:
+                items.append({op_type: {"status": 201, "result": "created"}})
+        fake.record(len(items) - throttled, len(body), throttled)
+        self._reply({"took": 1, "errors": bool(throttled), "items": items})
+
+    # The 8.x/9.x clients send _bulk as PUT
+    do_PUT = do_POST
+
+class FakeElasticsearch:
+    """Run the stand-in on a background thread: `with FakeElasticsearch() as es: es.url`.
+
+    reject_rate answers that share of bulk items with 429, and max_request_docs
+    rejects whole requests carrying more documents than that, to exercise
+    backoff and batch shrinking.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, reject_rate=0.0, max_request_docs=None, seed=0):
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.fake = self
+        self.reject_rate = reject_rate
+        self.max_request_docs = max_request_docs
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.docs = 0
+        self.throttled = 0
+        self.bulk_requests = 0
+        self.bytes_received = 0
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, docs, size, throttled=0):
+        with self.lock:
+            self.docs += docs
+            self.throttled += throttled
+            self.bulk_requests += 1
+            self.bytes_received += size
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
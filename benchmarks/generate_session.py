@@ -0,0 +1,115 @@
+"""Write a synthetic ROS log session of roughly the requested size.
+
+    python -m benchmarks.generate_session /tmp/session --size-mb 200 --nodes 40
+"""
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+
+LEVELS = ['DEBUG', 'INFO', 'INFO', 'INFO', 'INFO', 'WARN', 'ERROR']
+MESSAGES = [
+    "Publishing velocity command linear={:.3f} angular={:.3f}",
+    "Received goal {:.0f} from action client",
+    "Costmap update took {:.3f}s, expected {:.3f}s",
+    "Transform from base_link to map is {:.3f}s old",
+    "Planner found path with {:.0f} poses",
+    "Battery at {:.1f}%",
+]
+
+# Share of the total session size written to each kind of file
+SHARES = {'rosout': 0.6, 'nodes': 0.3, 'master': 0.05, 'roslaunch': 0.05}
+
+class Clock:
+    """Monotonic session clock that advances a few milliseconds per line."""
+
+    def __init__(self, rng, start=1700000000.0):
+        self.rng = rng
+        self.now = start
+
+    def tick(self):
+        self.now += self.rng.uniform(0.0, 0.005)
+        return self.now
+
+    def date(self):
+        # ROS python logging format: 2023-11-14 22:13:01,123
+        moment = datetime(1970, 1, 1) + timedelta(seconds=self.tick())
+        return moment.strftime('%Y-%m-%d %H:%M:%S') + f",{moment.microsecond // 1000:03d}"
+
+def _message(rng):
+    template = rng.choice(MESSAGES)
+    return template.format(*(rng.uniform(0, 100) for _ in range(template.count('{'))))
+
+def _write_until(path, target_bytes, make_line):
+    written = 0
+    with open(path, 'w') as f:
+        while written < target_bytes:
+            line = make_line()
+            f.write(line)
+            written += len(line)
+    return written
+
+def generate_session(out_dir, size_mb=50, nodes=20, traceback_rate=0.001, seed=0):
+    """Generate master.log, rosout.log, a roslaunch-*.log and per-node logs; return bytes written."""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    node_names = [f"node_{i}" for i in range(nodes)]
+    total = 0
+
+    clock = Clock(rng)
+    total += _write_until(
+        os.path.join(out_dir, 'master.log'), target * SHARES['master'],
+        lambda: f"[rosmaster.master][{rng.choice(LEVELS)}] {clock.date()}: "
+                f"+PUB [/{rng.choice(node_names)}/cmd_vel] /{rng.choice(node_names)} http://robot:{rng.randint(30000, 60000)}/\n")
+
+    clock = Clock(rng)
+    started = [False]
+
+    def rosout_line():
+        if not started[0]:
+            # Startup marker parsed by the rosout format's startup rule
+            started[0] = True
+            return f"{clock.tick():.6f} Startup\n"
+        node = rng.choice(node_names)
+        return (f"{clock.tick():.6f} {rng.choice(LEVELS)} /{node} [{node}.py:{rng.randint(10, 400)}(callback)] "
+                f"[topics: /rosout, /{node}/cmd_vel] {_message(rng)}\n")
+    total += _write_until(os.path.join(out_dir, 'rosout.log'), target * SHARES['rosout'], rosout_line)
+
+    clock = Clock(rng)
+    total += _write_until(
+        os.path.join(out_dir, 'roslaunch-robot-12345.log'), target * SHARES['roslaunch'],
+        lambda: f"[roslaunch.pmon][{rng.choice(LEVELS)}] {clock.date()}: "
+                f"ProcessMonitor.register[{rng.choice(node_names)}-{rng.randint(1, 99)}]\n")
+
+    per_node = target * SHARES['nodes'] / max(nodes, 1)
+    for node in node_names:
+        clock = Clock(rng)
+
+        def node_line():
+            if rng.random() < traceback_rate:
+                return ("[" + clock.date() + "][ERROR] Callback raised an exception\n"
+                        "Traceback (most recent call last):\n"
+                        f'  File "/opt/ros/lib/{node}.py", line {rng.randint(1, 400)}, in callback\n'
+                        "ValueError: invalid goal\n")
+            if rng.random() < 0.3:
+                return f"[{clock.tick():.6f}][{rng.choice(LEVELS)}] /rosout: {_message(rng)}\n"
+            return f"[{clock.date()}][{rng.choice(LEVELS)}] {_message(rng)}\n"
+        total += _write_until(os.path.join(out_dir, f"{node}-{rng.randint(1, 99)}.log"), per_node, node_line)
+
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic ROS log session")
+    parser.add_argument('out_dir', help="Directory to write the session into")
+    parser.add_argument('--size-mb', type=float, default=50, help="Approximate total session size")
+    parser.add_argument('--nodes', type=int, default=20, help="Number of per-node log files")
+    parser.add_argument('--traceback-rate', type=float, default=0.001, help="Share of node log lines followed by a traceback")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    total = generate_session(args.out_dir, args.size_mb, args.nodes, args.traceback_rate, args.seed)
+    print(f"[INFO] Wrote {total / 1e6:.1f} MB to {args.out_dir}")
+
+if __name__ == "__main__":
+    main()
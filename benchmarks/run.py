@@ -0,0 +1,181 @@
+"""Benchmark rosbeat's parsers, collect_all_logs and ingestion on a synthetic session.
+
+    python -m benchmarks.run --size-mb 100 --workers 1 4 --output bench.json
+    python -m benchmarks.run --session ~/.ros/log/latest --compare bench.json
+
+Each case runs in a forked child so its peak RSS is measured in isolation.
+Ingestion cases ship to an in-process stand-in for the _bulk API.
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.fake_es import FakeElasticsearch
+from benchmarks.generate_session import generate_session
+from rosbeat.__main__ import collect_all_logs, harvest_session, session_files
+from rosbeat.parser import parse_master_log, parse_rosout_log, parse_roslaunch_log, parse_node_log
+from rosbeat.registry import Registry
+
+PARSERS = {
+    'master_log': parse_master_log,
+    'rosout': parse_rosout_log,
+    'roslaunch': parse_roslaunch_log,
+    'node_log': parse_node_log,
+}
+
+def _files_by_format(log_dir):
+    files = {name: [] for name in PARSERS}
+    for _, fpath, parse_line in session_files(log_dir):
+        files[parse_line.name].append(fpath)
+    return files
+
+def _parse_case(parse_log, paths):
+    def run():
+        return sum(1 for path in paths for _ in parse_log(path))
+    return run
+
+def _collect_case(log_dir, workers):
+    def run():
+        return sum(1 for _ in collect_all_logs(log_dir, workers))
+    return run
+
+def _ingest_case(log_dir, batch_size, incremental, max_in_flight=1, reject_rate=0.0):
+    def run():
+        from rosbeat.ingester import ElasticsearchIngester
+
+        with FakeElasticsearch(reject_rate=reject_rate) as es, tempfile.TemporaryDirectory() as state_dir:
+            ingester = ElasticsearchIngester([es.url], 'rosbeat-bench', batch_size=batch_size,
+                                             max_in_flight=max_in_flight, initial_backoff=0.01)
+            if incremental:
+                registry = Registry(os.path.join(state_dir, 'registry.json'))
+                return ingester.ingest_harvest(harvest_session(log_dir, registry), registry)
+            return ingester.ingest_logs(collect_all_logs(log_dir))
+    return run
+
+def _child(run, conn):
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        records = run()
+        seconds = time.perf_counter() - start
+    conn.send({
+        'records': records,
+        'seconds': seconds,
+        # ru_maxrss is in KiB on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    })
+    conn.close()
+
+def measure(run):
+    """Run a benchmark case in a forked child and return its timings and peak RSS."""
+    context = multiprocessing.get_context('fork')
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=_child, args=(run, child_conn))
+    process.start()
+    result = parent_conn.recv()
+    process.join()
+    return result
+
+def _count(paths):
+    lines = size = 0
+    for path in paths:
+        size += os.path.getsize(path)
+        with open(path, 'rb') as f:
+            lines += sum(1 for _ in f)
+    return lines, size
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(log_dir, workers=(1,), batch_size=500, repeat=1, max_in_flight=(1,), reject_rate=0.0):
+    files = _files_by_format(log_dir)
+    all_files = [path for paths in files.values() for path in paths]
+    cases = [(f"parse[{name}]", files[name], _parse_case(PARSERS[name], files[name])) for name in PARSERS if files[name]]
+    cases += [(f"collect_all_logs[workers={n}]", all_files, _collect_case(log_dir, n)) for n in workers]
+    for n in max_in_flight:
+        cases.append((f"ingest_logs[in_flight={n}]", all_files,
+                      _ingest_case(log_dir, batch_size, False, n, reject_rate)))
+    cases.append(("ingest_harvest", all_files, _ingest_case(log_dir, batch_size, True, max_in_flight[0], reject_rate)))
+
+    results = []
+    for name, paths, run in cases:
+        lines, size = _count(paths)
+        # Keep the fastest run; peak RSS is the same allocation pattern each time
+        best = min((measure(run) for _ in range(repeat)), key=lambda r: r['seconds'])
+        results.append({
+            'name': name,
+            'lines': lines,
+            'bytes': size,
+            'records': best['records'],
+            'seconds': round(best['seconds'], 4),
+            'lines_per_sec': round(lines / best['seconds']),
+            'mb_per_sec': round(size / 1e6 / best['seconds'], 2),
+            'peak_rss_mb': round(best['peak_rss_mb'], 1),
+        })
+        print(_format_row(results[-1]), flush=True)
+    return results
+
+def _format_row(result, previous=None):
+    row = (f"{result['name']:<28} {result['records']:>10} {result['seconds']:>8.2f} "
+           f"{result['lines_per_sec']:>11} {result['mb_per_sec']:>8.2f} {result['peak_rss_mb']:>9.1f}")
+    if previous:
+        row += f"   {result['lines_per_sec'] / previous['lines_per_sec']:>5.2f}x"
+    return row
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark rosbeat on a ROS log session")
+    parser.add_argument('--session', help="Existing session folder; a synthetic one is generated if omitted")
+    parser.add_argument('--size-mb', type=float, default=50, help="Size of the generated session")
+    parser.add_argument('--nodes', type=int, default=20, help="Per-node log files in the generated session")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1], help="Worker counts to run collect_all_logs with")
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--max-in-flight', type=int, nargs='+', default=[1], help="Concurrent bulk requests to run ingest_logs with")
+    parser.add_argument('--reject-rate', type=float, default=0.0, help="Share of bulk items the fake cluster answers with 429")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per case; the fastest is kept")
+    parser.add_argument('--output', help="Write machine-readable results to this JSON file")
+    parser.add_argument('--compare', help="Results JSON from an earlier run to show speedups against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_dir = args.session
+        if log_dir is None:
+            log_dir = os.path.join(tmp, 'session')
+            generate_session(log_dir, args.size_mb, args.nodes)
+
+        print(f"{'case':<28} {'records':>10} {'seconds':>8} {'lines/s':>11} {'MB/s':>8} {'peak MB':>9}")
+        results = run_benchmarks(log_dir, args.workers, args.batch_size, args.repeat,
+                                 args.max_in_flight, args.reject_rate)
+
+    report = {
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'session': args.session or {'size_mb': args.size_mb, 'nodes': args.nodes},
+        'results': results,
+    }
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = {r['name']: r for r in json.load(f)['results']}
+        print(f"\ncompared with {args.compare}:")
+        for result in results:
+            print(_format_row(result, previous.get(result['name'])))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Results written to {args.output}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,48 +1,40 @@
-from elasticsearch import Elasticsearch, helpers
-import json
 import os
-import time
+import argparse
+from rosbeat.config import Config
+from rosbeat.ndjson import is_ndjson, read_ndjson
+from rosbeat.outputs import Fanout, from_config
 
-# Specify the scheme (http) and host details
-es = Elasticsearch([{'host': 'elasticsearch', 'port': 9200, 'scheme': 'http'}])
+def open_outputs(config):
+    """Start the outputs configured in config.yml (Elasticsearch, NDJSON archive, HTTP collector)."""
+    ingester = None
+    if 'elasticsearch' in config.output_names:
+        # Imported only when needed; the client library is slow to load
+        from rosbeat.ingester import ElasticsearchIngester
+        ingester = ElasticsearchIngester.from_config(config)
+    return Fanout(from_config(config.outputs, ingester))
 
-# Check if Elasticsearch is available
-def check_es_connection():
-    try:
-        if es.ping():
-            print("[INFO] Elasticsearch connection successful!")
-        else:
-            print("[ERROR] Elasticsearch connection failed!")
-            exit(1)
-    except Exception as e:
-        print(f"[ERROR] Elasticsearch connection error: {e}")
-        exit(1)
-
-def bulk_index_logs(log_dir):
-    for log_file in os.listdir(log_dir):
-        if log_file.endswith(".json"):
+def bulk_index_logs(log_dir, fanout):
+    for log_file in sorted(os.listdir(log_dir)):
+        if is_ndjson(log_file):
             log_path = os.path.join(log_dir, log_file)
             try:
-                with open(log_path, 'r') as f:
-                    logs = json.load(f)
-                    actions = []
-                    for entry in logs:
-                        action = {
-                            "_op_type": "index",
-                            "_index": "ros_logs",
-                            "_source": entry
-                        }
-                        actions.append(action)
-
-                    # Bulk indexing into Elasticsearch
-                    success, failed = helpers.bulk(es, actions)
-                    if success:
-                        print(f"[INFO] Successfully ingested {log_file} into Elasticsearch.")
-                    else:
-                        print(f"[WARN] Failed to ingest some entries from {log_file}.")
+                # Records are read and queued chunk by chunk, never holding the whole file
+                fanout.ingest_logs(read_ndjson(log_path))
             except Exception as e:
                 print(f"[ERROR] Error processing file {log_file}: {e}")
 
+def main():
+    parser = argparse.ArgumentParser(description="Send NDJSON files written by parse_ros_logs.py to the configured outputs.")
+    parser.add_argument('--config', default="config.yml", help="Path to configuration YAML file")
+    parser.add_argument('log_dir', nargs='?', help="Directory of NDJSON files (default: output_directory)")
+    args = parser.parse_args()
+
+    config = Config(args.config)
+    fanout = open_outputs(config)
+    try:
+        bulk_index_logs(args.log_dir or config.output_directory, fanout)
+    finally:
+        fanout.close()
+
 if __name__ == "__main__":
-    check_es_connection()  # Ensure Elasticsearch is reachable
-    bulk_index_logs("/root/rosbeat/parsed_logs")
+    main()
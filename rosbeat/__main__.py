@@ -1,61 +1,510 @@
+"""Command-line entry point.
+
+Only what every subcommand needs is imported here. Output backends (the
+Elasticsearch client, the spool, the watcher, the local index) are imported
+by the subcommands that use them, so `rosbeat parse` run from a shutdown hook
+doesn't pay for loading the Elasticsearch client.
+"""
 import os
+import sys
+import signal
+import time
 import argparse
+import contextlib
 from rosbeat.config import Config
-from rosbeat.parser import parse_master_log, parse_rosout_log, parse_roslaunch_log, parse_node_log
-from rosbeat.ingester import ElasticsearchIngester
-
-def collect_all_logs(log_dir):
-    all_logs = []
-
-    # master.log
-    master_log = os.path.join(log_dir, 'master.log')
-    if os.path.exists(master_log):
-        print("[INFO] Parsing master.log...")
-        all_logs.extend(parse_master_log(master_log))
-
-    # rosout.log
-    rosout_log = os.path.join(log_dir, 'rosout.log')
-    if os.path.exists(rosout_log):
-        print("[INFO] Parsing rosout.log...")
-        all_logs.extend(parse_rosout_log(rosout_log))
-
-    # roslaunch-*.log
-    for fname in os.listdir(log_dir):
-        if fname.startswith('roslaunch-') and fname.endswith('.log'):
-            print(f"[INFO] Parsing {fname}...")
-            all_logs.extend(parse_roslaunch_log(os.path.join(log_dir, fname)))
-
-    # Node logs (per-node logs)
-    for fname in os.listdir(log_dir):
+from rosbeat.formats import FORMATS, EpochMillis, classify_file
+from rosbeat.metrics import METRICS, print_profile, serve_metrics
+from rosbeat.ndjson import COMPRESSION_SUFFIXES, NdjsonWriter, ndjson_path
+from rosbeat.parallel import DEFAULT_CHUNK_BYTES, harvest_files
+from rosbeat.reader import is_compressed, rotation_order
+from rosbeat.record import as_dict
+from rosbeat.registry import Registry
+from rosbeat.timeline import DEFAULT_REORDER_WINDOW, merge_files
+
+def session_files(log_dir, epoch_millis=False):
+    """Return (label, path, line_parser) for every log file of a session, in parse order.
+
+    Files are classified by the filename patterns of the registered formats:
+    master.log, then rosout.log, then roslaunch-*.log, then per-node logs.
+    Rotated and compressed files come with them, each rotation chain
+    oldest-first (rosout.log.2.gz, rosout.log.1, rosout.log). With
+    epoch_millis, records also carry a numeric "@timestamp".
+    """
+    by_format = {name: [] for name in FORMATS}
+    for fname in sorted(os.listdir(log_dir), key=rotation_order):
         fpath = os.path.join(log_dir, fname)
-        if fname.endswith('.log') and fname not in ['master.log', 'rosout.log'] and not fname.startswith('roslaunch-') and os.path.isfile(fpath):
-            print(f"[INFO] Parsing node log: {fname}...")
-            all_logs.extend(parse_node_log(fpath))
+        log_format = classify_file(fname)
+        if log_format is not None and os.path.isfile(fpath):
+            parse_line = EpochMillis(log_format) if epoch_millis else log_format
+            by_format[log_format.name].append((fname, fpath, parse_line))
 
-    print(f"[INFO] Total logs collected: {len(all_logs)}")
-    return all_logs
+    return [entry for entries in by_format.values() for entry in entries]
 
-def main():
-    parser = argparse.ArgumentParser(description="Rosbeat - Ingest ROS log files into Elasticsearch")
-    parser.add_argument('--config', default="config.yml", help="Path to configuration YAML file")
-    args = parser.parse_args()
+def read_files(files, workers, chunk_bytes, partial, filters, time_order):
+    """Harvest files in file order, or merged by timestamp when time_order is a reorder window in seconds."""
+    if time_order is not None:
+        return merge_files(files, time_order, partial, filters)
+    harvest = harvest_files(files, workers, chunk_bytes, partial)
+    return filters.apply(harvest) if filters is not None else harvest
 
-    config = Config(args.config)
+def collect_all_logs(log_dir, workers=1, chunk_bytes=DEFAULT_CHUNK_BYTES, epoch_millis=False, filters=None,
+                     rollup=None, time_order=None):
+    """Yield parsed records from every log file in a session, in file order or by timestamp."""
+    files = [
+        (label, fpath, parse_line, 0)
+        for label, fpath, parse_line in session_files(log_dir, epoch_millis)
+    ]
+    harvest = read_files(files, workers, chunk_bytes, True, filters, time_order)
+    if rollup is not None:
+        harvest = rollup.apply(harvest)
+    total = 0
+    for _, _, log in harvest:
+        total += 1
+        yield log
+
+    print(f"[INFO] Total logs collected: {total}")
+
+def harvest_session(log_dir, registry, workers=1, chunk_bytes=DEFAULT_CHUNK_BYTES, epoch_millis=False,
+                    filters=None, rollup=None, time_order=None):
+    """Yield (file_path, end_offset, record) for session data not yet committed to the registry."""
+    files = []
+    for label, fpath, parse_line in session_files(log_dir, epoch_millis):
+        offset = registry.resume_offset(fpath)
+        if registry.unread(fpath):
+            files.append((f"{label} from offset {offset}", fpath, parse_line, offset))
+
+    harvest = read_files(files, workers, chunk_bytes, False, filters, time_order)
+    if rollup is not None:
+        harvest = rollup.apply(harvest)
+    total = 0
+    last_end = {}
+    for harvested in harvest:
+        total += 1
+        last_end[harvested[0]] = harvested[1]
+        yield harvested
+
+    # The last record's end offset covers everything after it, so a compressed file
+    # read to the end needs no decompressing on later runs once that much is acknowledged
+    for _, fpath, _, offset in files:
+        if is_compressed(fpath):
+            registry.finish_stream(fpath, last_end.get(fpath, offset))
+
+    print(f"[INFO] Total new logs collected: {total}")
+
+def parse(config, args, workers):
+    """Write every record of the session to one NDJSON file (or stdout with --output -)."""
+    log_dir = config.log_directory
+    if not os.path.exists(log_dir):
+        print(f"[ERROR] Log directory does not exist: {log_dir}")
+        return
+
+    output = args.output
+    if output is None:
+        # Name the file after the run directory `latest` points at
+        session = os.path.basename(os.path.realpath(log_dir))
+        compression = args.compress or config.output_compression
+        output = ndjson_path(os.path.join(config.output_directory, f"{session}.ndjson"), compression)
+        os.makedirs(config.output_directory, exist_ok=True)
+
+    time_order = config.time_order_window
+    if args.time_order and time_order is None:
+        time_order = DEFAULT_REORDER_WINDOW
+    logs = collect_all_logs(log_dir, workers, config.parse_chunk_bytes, config.epoch_millis, config.filters,
+                            config.rollup, time_order)
+    if output == '-':
+        # Records own stdout; progress messages go to stderr
+        writer = NdjsonWriter(sys.stdout.buffer)
+        with contextlib.redirect_stdout(sys.stderr):
+            writer.write_all(logs)
+        writer.close()
+        return
+
+    print(f"[INFO] Writing parsed logs to: {output}")
+    with NdjsonWriter(output) as writer:
+        writer.write_all(logs)
+
+def index_session(config, args, workers):
+    """Add what is new in log_directory to the local SQLite index."""
+    log_dir = config.log_directory
+    if not os.path.exists(log_dir):
+        print(f"[ERROR] Log directory does not exist: {log_dir}")
+        return
+
+    from rosbeat.local_index import LocalIndex
+
+    path = args.db or config.local_index_path
+    index = LocalIndex(path)
+    try:
+        # Rollup summaries stay out of the index; it is for searching the lines themselves
+        harvest = harvest_session(log_dir, index.registry, workers, config.parse_chunk_bytes,
+                                  config.epoch_millis, config.filters)
+        count = index.add(harvest)
+        print(f"[INFO] Indexed {count} logs into {path} ({index.count()} in total).")
+    finally:
+        index.close()
+
+def query(config, args):
+    """Print records from the local index matching the command-line conditions."""
+    import itertools
+    import sqlite3
+    from rosbeat.local_index import LocalIndex, parse_time
+
+    path = args.db or config.local_index_path
+    if not os.path.exists(path):
+        print(f"[ERROR] No local index at {path}; run `rosbeat index` first.")
+        return
+
+    index = LocalIndex(path)
+    try:
+        try:
+            logs = index.query(
+                levels=args.level, min_level=args.min_level, nodes=args.node, log_types=args.type,
+                since=parse_time(args.since) if args.since else None,
+                until=parse_time(args.until) if args.until else None,
+                text=args.grep, limit=args.limit, newest=args.newest,
+            )
+            # Bad FTS syntax is only reported once the statement runs
+            logs = itertools.chain([next(logs)], logs)
+        except StopIteration:
+            return
+        except (ValueError, sqlite3.OperationalError) as e:
+            print(f"[ERROR] {e}")
+            return
+        write_records(logs, args.format)
+    finally:
+        index.close()
+
+def timeline(config, args):
+    """Print the whole session as one stream ordered by timestamp."""
+    log_dir = config.log_directory
+    if not os.path.exists(log_dir):
+        print(f"[ERROR] Log directory does not exist: {log_dir}")
+        return
+
+    window = args.window if args.window is not None else (config.time_order_window or DEFAULT_REORDER_WINDOW)
+    logs = collect_all_logs(log_dir, epoch_millis=config.epoch_millis, filters=config.filters, time_order=window)
+    write_records(logs, args.format)
+
+def write_records(logs, output_format):
+    """Write records to stdout as NDJSON or one line of text each; progress messages go to stderr."""
+    out = sys.stdout
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            if output_format == 'ndjson':
+                writer = NdjsonWriter(out.buffer)
+                writer.write_all(logs)
+                writer.close()
+                return
+            for log in logs:
+                log = as_dict(log)
+                out.write(f"{log.get('timestamp')} [{log.get('log_level')}] {log.get('node_name')}: "
+                          f"{log.get('log_message')}\n")
+            out.flush()
+    except BrokenPipeError:
+        # The reader (head, less) has gone; point stdout at /dev/null so exiting doesn't fail again
+        os.dup2(os.open(os.devnull, os.O_WRONLY), out.fileno())
+
+def open_spool(config, ingester):
+    """Open the configured spool and start its drainer thread; return (spool, thread)."""
+    import threading
+    from rosbeat.spool import Spool
+
+    spool = Spool(config.spool_directory, config.spool_segment_bytes, config.spool_max_bytes)
+    if spool.pending_bytes:
+        print(f"[INFO] Resuming {spool.pending_bytes} spooled bytes from {config.spool_directory}")
+    drainer = threading.Thread(target=spool.drain_forever, args=(ingester, config.spool_retry_interval),
+                               name='rosbeat-spool', daemon=True)
+    drainer.start()
+    return spool, drainer
 
-    ingester = ElasticsearchIngester(
-        hosts=config.elasticsearch_hosts,
-        index=config.elasticsearch_index,
+def spool_and_ship(config, ingester, harvest, registry):
+    """Spool a harvest to disk while the drainer ships it; leave what can't be shipped for the next run."""
+    from rosbeat.spool import SpoolFull
+
+    spool, drainer = open_spool(config, ingester)
+    try:
+        count = spool.append(harvest, registry, config.batch_size)
+        print(f"[INFO] Spooled {count} logs.")
+    except SpoolFull as e:
+        print(f"[WARN] {e}; the rest will be parsed on the next run.")
+    finally:
+        close_spool(config, spool, drainer)
+
+def open_outputs(config, ingester):
+    """Start a queue and worker per enabled output; return (fanout, spool, drainer).
+
+    With spool.enabled, the Elasticsearch output writes to the spool and its
+    drainer thread ships from there.
+    """
+    from rosbeat.outputs import Fanout, from_config
+
+    spool = drainer = None
+    if ingester is not None and config.spool_enabled:
+        spool, drainer = open_spool(config, ingester)
+    return Fanout(from_config(config.outputs, ingester, spool)), spool, drainer
+
+def close_spool(config, spool, drainer, timeout=None):
+    spool.close()
+    drainer.join(timeout)
+    if spool.pending_bytes:
+        print(f"[WARN] {spool.pending_bytes} bytes are still spooled in {config.spool_directory}; "
+              f"they will be shipped on the next run.")
+
+def watch(config, ingester, args):
+    """Tail log_directory and ship lines as they are written, until interrupted."""
+    from rosbeat.watch import LogWatcher
+
+    if not config.registry_file:
+        print("[ERROR] watch needs a registry_file to track what has been shipped.")
+        return
+
+    registry = Registry(config.registry_file)
+    METRICS.gauge_function('rosbeat_unshipped_bytes', registry.unshipped_bytes)
+    prepare_indices(config, ingester)
+    fanout = spool = drainer = None
+    if config.fanout:
+        fanout, spool, drainer = open_outputs(config, ingester)
+    elif config.spool_enabled:
+        spool, drainer = open_spool(config, ingester)
+    watcher = LogWatcher(
+        config.log_directory, fanout or ingester, registry,
         batch_size=config.batch_size,
-        refresh_interval=config.refresh_interval
+        linger=args.linger if args.linger is not None else config.watch_linger,
+        poll_interval=config.watch_poll_interval,
+        epoch_millis=config.epoch_millis,
+        use_inotify=config.watch_inotify and not args.poll,
+        filters=config.filters,
+        rollup=config.rollup,
+        # The fan-out feeds the spool itself, through its Elasticsearch output
+        spool=spool if fanout is None else None,
     )
+    # Exit through the watcher's cleanup so buffered records are flushed and offsets saved
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        watcher.run()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    if fanout is not None:
+        fanout.close()
+    if spool is not None:
+        # Give the drainer a moment to ship what's spooled; the rest waits on disk
+        close_spool(config, spool, drainer, timeout=10)
+    print("[INFO] Watcher stopped.")
 
+def backlog_bytes(log_dir, registry=None):
+    """Estimate how many bytes of the session are still to be shipped, by size on disk."""
+    total = 0
+    for _, fpath, _ in session_files(log_dir):
+        entry = registry.entries.get(fpath) if registry is not None else None
+        size = os.path.getsize(fpath)
+        if entry is None:
+            total += size
+        elif is_compressed(fpath):
+            # Offsets count decompressed bytes; a started archive counts whole until it is finished
+            if entry['offset'] < entry.get('stream_size', float('inf')):
+                total += size
+        else:
+            total += max(0, size - entry['offset'])
+    return total
+
+def prepare_indices(config, ingester):
+    """Install the index template; a cluster that can't be reached is reported, not fatal."""
+    if ingester is None or not config.manage_template:
+        return
+    from elasticsearch import exceptions
+
+    try:
+        ingester.install_template()
+    except (exceptions.ApiError, exceptions.ConnectionError) as e:
+        print(f"[WARN] Could not install the index template: {e}")
+
+def bulk_load_context(config, ingester, log_dir, registry, force):
+    """Return BulkLoad for a large backfill (elasticsearch.bulk_load), or a no-op context."""
+    mode = 'always' if force else config.bulk_load
+    if ingester is None or mode == 'never' or not config.manage_template:
+        return contextlib.nullcontext()
+    if mode == 'auto':
+        pending = backlog_bytes(log_dir, registry)
+        if pending < config.bulk_load_min_bytes:
+            return contextlib.nullcontext()
+        print(f"[INFO] {pending / 1e6:.0f} MB to backfill; switching indices to bulk-load settings.")
+    return ingester.bulk_load()
+
+def ingest(config, ingester, args, workers):
+    """One-shot run: ship what is new in log_directory, under bulk-load settings for large backfills."""
     log_dir = config.log_directory
     if not os.path.exists(log_dir):
         print(f"[ERROR] Log directory does not exist: {log_dir}")
         return
 
-    logs = collect_all_logs(log_dir)
-    ingester.ingest_logs(logs)
+    registry = None
+    if config.registry_file:
+        registry = Registry(config.registry_file)
+        registry.prune()
+        METRICS.gauge_function('rosbeat_unshipped_bytes', registry.unshipped_bytes)
+
+    prepare_indices(config, ingester)
+    bulk_load = bulk_load_context(config, ingester, log_dir, registry, args.bulk_load)
+    if ingester is not None:
+        from elasticsearch import exceptions
+        try:
+            bulk_load.__enter__()
+        except (exceptions.ApiError, exceptions.ConnectionError) as e:
+            print(f"[WARN] Could not apply bulk-load settings: {e}")
+            bulk_load = contextlib.nullcontext()
+    try:
+        ship(config, ingester, log_dir, registry, workers)
+    finally:
+        bulk_load.__exit__(None, None, None)
+
+def ship(config, ingester, log_dir, registry, workers):
+    """Harvest the session and send it to Elasticsearch, through the spool if one is configured.
+
+    With more outputs than Elasticsearch configured, records go to all of them through a Fanout.
+    """
+    if config.fanout:
+        from rosbeat.outputs import OutputUnavailable
+
+        fanout, spool, drainer = open_outputs(config, ingester)
+        try:
+            if registry is not None:
+                try:
+                    fanout.ingest_harvest(harvest_session(log_dir, registry, workers, config.parse_chunk_bytes,
+                                                          config.epoch_millis, config.filters, config.rollup,
+                                                          config.time_order_window), registry)
+                except OutputUnavailable:
+                    # Already reported; the registry holds back what wasn't sent for the next run
+                    pass
+            else:
+                fanout.ingest_logs(collect_all_logs(log_dir, workers, config.parse_chunk_bytes, config.epoch_millis,
+                                                    config.filters, config.rollup, config.time_order_window))
+        finally:
+            fanout.close()
+            if spool is not None:
+                close_spool(config, spool, drainer)
+        return
+
+    if registry is not None:
+        harvest = harvest_session(log_dir, registry, workers, config.parse_chunk_bytes, config.epoch_millis,
+                                  config.filters, config.rollup, config.time_order_window)
+        if config.spool_enabled:
+            spool_and_ship(config, ingester, harvest, registry)
+        else:
+            ingester.ingest_harvest(harvest, registry)
+    else:
+        logs = collect_all_logs(log_dir, workers, config.parse_chunk_bytes, config.epoch_millis, config.filters,
+                                config.rollup, config.time_order_window)
+        if config.spool_enabled:
+            spool_and_ship(config, ingester, ((None, 0, log) for log in logs), None)
+        else:
+            ingester.ingest_logs(logs)
+
+def make_ingester(config):
+    """Build the Elasticsearch ingester; the client library is only imported by commands that ship."""
+    from rosbeat.ingester import ElasticsearchIngester
+
+    return ElasticsearchIngester.from_config(config)
+
+def config_test(args):
+    """Load and validate the configuration, as every other command would, and report what it found."""
+    import yaml
+    from rosbeat.outputs import validate as validate_outputs
+
+    try:
+        config = Config(args.config)
+        if config.output_compression not in ('none', None) and config.output_compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"output_compression must be none, {', '.join(COMPRESSION_SUFFIXES)}, "
+                             f"not {config.output_compression!r}")
+        if config.bulk_load not in ('auto', 'always', 'never'):
+            raise ValueError(f"elasticsearch.bulk_load must be auto, always or never, not {config.bulk_load!r}")
+        validate_outputs(config.outputs)
+        # Validates hosts and index settings without contacting the cluster
+        make_ingester(config)
+    except (OSError, ValueError, TypeError, yaml.YAMLError) as e:
+        print(f"[ERROR] {args.config}: {e}")
+        return 1
+
+    if not os.path.exists(config.log_directory):
+        print(f"[WARN] Log directory does not exist (yet): {config.log_directory}")
+    print(f"[INFO] {args.config} is valid; outputs: {', '.join(config.output_names) or 'none'}.")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Rosbeat - Ingest ROS log files into Elasticsearch")
+    parser.add_argument('--config', default="config.yml", help="Path to configuration YAML file")
+    parser.add_argument('--workers', type=int, help="Number of parser processes (overrides parse.workers)")
+    parser.add_argument('--profile', action='store_true', help="Print per-format parse and bulk timings when a one-shot run ends")
+    parser.add_argument('--bulk-load', action='store_true', help="Use bulk-load index settings for this run (see elasticsearch.bulk_load)")
+    parser.add_argument('--metrics-port', type=int, help="Serve Prometheus metrics on this port (enables metrics.enabled)")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('ingest', help="Ship what is new in log_directory to Elasticsearch once (the default)")
+    watch_parser = subparsers.add_parser('watch', help="Tail log_directory and ship new lines as they are written")
+    watch_parser.add_argument('--linger', type=float, help="Seconds before a partial batch is flushed (overrides watch.linger)")
+    watch_parser.add_argument('--poll', action='store_true', help="Poll for changes instead of using inotify")
+    parse_parser = subparsers.add_parser('parse', help="Parse log_directory into an NDJSON file instead of ingesting it")
+    parse_parser.add_argument('--output', help="Output file, '-' for stdout; .gz/.xz/.zst suffixes are compressed "
+                                               "(default: <output_directory>/<session>.ndjson)")
+    parse_parser.add_argument('--time-order', action='store_true', help="Merge all files into one stream ordered by timestamp (see parse.time_order)")
+    parse_parser.add_argument('--compress', choices=['gzip', 'xz', 'zstd'], help="Compress the default output file (overrides output_compression)")
+    timeline_parser = subparsers.add_parser('timeline', help="Print the whole session ordered by timestamp across all files")
+    timeline_parser.add_argument('--window', type=float, help="Reorder window in seconds (overrides parse.reorder_window)")
+    timeline_parser.add_argument('--format', choices=['text', 'ndjson'], default='text', help="Output format")
+    index_parser = subparsers.add_parser('index', help="Add log_directory to the local SQLite index for offline queries")
+    index_parser.add_argument('--db', help="Index database (overrides local_index.path)")
+    query_parser = subparsers.add_parser('query', help="Search the local index built by `rosbeat index`")
+    query_parser.add_argument('--db', help="Index database (overrides local_index.path)")
+    query_parser.add_argument('--node', action='append', help="Node name, e.g. /move_base (repeatable)")
+    query_parser.add_argument('--level', action='append', type=str.upper, help="Exact log level (repeatable)")
+    query_parser.add_argument('--min-level', help="Lowest log level to include, e.g. WARN; narrows --level if both are given")
+    query_parser.add_argument('--type', action='append', help="Log type: rosout, roslaunch, master_log, node_log or rosout_node_log; "
+                              "node and master are shorthands (repeatable)")
+    query_parser.add_argument('--since', help="Start time (inclusive), ISO 8601 UTC or epoch seconds")
+    query_parser.add_argument('--until', help="End time (exclusive), ISO 8601 UTC or epoch seconds")
+    query_parser.add_argument('--grep', help="Full-text query on log_message (SQLite FTS5 syntax)")
+    query_parser.add_argument('--limit', type=int, default=100, help="Maximum records to print; 0 for all (default: 100)")
+    query_parser.add_argument('--newest', action='store_true', help="Newest records first")
+    query_parser.add_argument('--format', choices=['text', 'ndjson'], default='text', help="Output format")
+    config_parser = subparsers.add_parser('config', help="Configuration commands")
+    config_commands = config_parser.add_subparsers(dest='config_command', required=True)
+    config_commands.add_parser('test', help="Check that the configuration file loads and is valid")
+    args = parser.parse_args()
+
+    if args.command == 'config':
+        sys.exit(config_test(args))
+
+    config = Config(args.config)
+    workers = args.workers or config.parse_workers
+    if args.metrics_port is not None or config.metrics_enabled:
+        serve_metrics(config.metrics_host, args.metrics_port if args.metrics_port is not None else config.metrics_port)
+
+    started = time.perf_counter()
+    if args.command == 'parse':
+        parse(config, args, workers)
+        if args.profile:
+            print_profile(time.perf_counter() - started)
+        return
+
+    if args.command == 'index':
+        index_session(config, args, workers)
+        if args.profile:
+            print_profile(time.perf_counter() - started)
+        return
+    if args.command == 'query':
+        query(config, args)
+        return
+    if args.command == 'timeline':
+        timeline(config, args)
+        return
+
+    ingester = make_ingester(config) if 'elasticsearch' in config.output_names else None
+    if args.command == 'watch':
+        watch(config, ingester, args)
+        return
+
+    # `ingest`, or no subcommand at all
+    ingest(config, ingester, args, workers)
+    if args.profile:
+        print_profile(time.perf_counter() - started)
 
 if __name__ == "__main__":
     main()
@@ -1,5 +1,10 @@
 import yaml
 import os
+from rosbeat.filters import Filters
+from rosbeat.parallel import DEFAULT_CHUNK_BYTES
+from rosbeat.rollup import Rollup
+from rosbeat.spool import DEFAULT_MAX_BYTES, DEFAULT_SEGMENT_BYTES
+from rosbeat.timeline import DEFAULT_REORDER_WINDOW
 
 class Config:
     def __init__(self, config_file="config.yml"):
@@ -7,6 +12,10 @@ class Config:
             raise FileNotFoundError(f"Configuration file {config_file} not found.")
         with open(config_file, 'r') as f:
             self.config = yaml.safe_load(f)
+        # Compiled once here so a bad pattern or level fails at startup, not mid-run
+        self.filters = Filters.from_config(self.get('filters'))
+        # None unless rollup.mode is alongside or instead
+        self.rollup = Rollup.from_config(self.get('rollup'))
 
     def get(self, key, default=None):
         return self.config.get(key, default)
@@ -19,6 +28,11 @@ class Config:
     def output_directory(self):
         return os.path.expanduser(self.get('output_directory', './parsed_logs'))
 
+    @property
+    def output_compression(self):
+        # gzip, xz or zstd compresses what `rosbeat parse` writes; none keeps plain NDJSON
+        return self.get('output_compression', 'none')
+
     @property
     def elasticsearch_hosts(self):
         return self.get('elasticsearch', {}).get('hosts', ['http://localhost:9200'])
@@ -27,10 +41,162 @@ class Config:
     def elasticsearch_index(self):
         return self.get('elasticsearch', {}).get('index', 'rosbeat-logs')
 
+    @property
+    def outputs(self):
+        return self.get('outputs') or {}
+
+    @property
+    def output_names(self):
+        # Elasticsearch stays on unless outputs.elasticsearch.enabled is false
+        section = {'elasticsearch': {}, **self.outputs}
+        return [name for name, settings in section.items()
+                if (settings or {}).get('enabled', name == 'elasticsearch')]
+
+    @property
+    def fanout(self):
+        # Elasticsearch alone is shipped to directly; queues and workers only when there is more to feed
+        es = self.outputs.get('elasticsearch') or {}
+        return self.output_names != ['elasticsearch'] or bool(set(es) - {'enabled'})
+
+    @property
+    def rollup_index(self):
+        return self.get('rollup', {}).get('index', 'rosbeat-rollups')
+
     @property
     def batch_size(self):
         return self.get('elasticsearch', {}).get('batch_size', 500)
 
+    @property
+    def dead_letter_file(self):
+        # Documents Elasticsearch rejects for good (mapping errors, say) are written here instead of retried
+        return os.path.expanduser(self.get('elasticsearch', {}).get('dead_letter_file', './rosbeat_rejected.ndjson'))
+
     @property
     def refresh_interval(self):
         return self.get('elasticsearch', {}).get('refresh_interval', 5)
+
+    @property
+    def max_batch_bytes(self):
+        return self.get('elasticsearch', {}).get('max_batch_bytes', 5 * 1024 * 1024)
+
+    @property
+    def max_in_flight(self):
+        return self.get('elasticsearch', {}).get('max_in_flight', 1)
+
+    @property
+    def max_retries(self):
+        return self.get('elasticsearch', {}).get('max_retries', 5)
+
+    @property
+    def initial_backoff(self):
+        return self.get('elasticsearch', {}).get('initial_backoff', 0.5)
+
+    @property
+    def max_backoff(self):
+        return self.get('elasticsearch', {}).get('max_backoff', 30)
+
+    @property
+    def index_interval(self):
+        # daily writes to <index>-YYYY.MM.DD by each record's timestamp, monthly to <index>-YYYY.MM
+        return self.get('elasticsearch', {}).get('index_interval', 'none')
+
+    @property
+    def manage_template(self):
+        return self.get('elasticsearch', {}).get('manage_template', True)
+
+    @property
+    def number_of_shards(self):
+        return self.get('elasticsearch', {}).get('number_of_shards', 1)
+
+    @property
+    def number_of_replicas(self):
+        return self.get('elasticsearch', {}).get('number_of_replicas', 1)
+
+    @property
+    def bulk_load(self):
+        # auto switches to bulk-load index settings when at least bulk_load_min_bytes are to be shipped
+        return self.get('elasticsearch', {}).get('bulk_load', 'auto')
+
+    @property
+    def bulk_load_min_bytes(self):
+        return self.get('elasticsearch', {}).get('bulk_load_min_bytes', 100 * 1024 * 1024)
+
+    @property
+    def registry_file(self):
+        # Set registry_file to null to re-ship every file from byte 0 on each run
+        path = self.get('registry_file', './.rosbeat_state.json')
+        return os.path.expanduser(path) if path else None
+
+    @property
+    def parse_workers(self):
+        return self.get('parse', {}).get('workers', 1)
+
+    @property
+    def parse_chunk_bytes(self):
+        return self.get('parse', {}).get('chunk_bytes', DEFAULT_CHUNK_BYTES)
+
+    @property
+    def epoch_millis(self):
+        # Add a numeric "@timestamp" (epoch milliseconds) next to the ISO "timestamp"
+        return self.get('parse', {}).get('epoch_millis', False)
+
+    @property
+    def time_order_window(self):
+        # Reorder window in seconds when parse.time_order merges all files by timestamp; None keeps file order
+        parse = self.get('parse', {})
+        if not parse.get('time_order', False):
+            return None
+        return parse.get('reorder_window', DEFAULT_REORDER_WINDOW)
+
+    @property
+    def watch_linger(self):
+        # Seconds a partially filled batch may wait before it is flushed
+        return self.get('watch', {}).get('linger', 0.5)
+
+    @property
+    def watch_poll_interval(self):
+        return self.get('watch', {}).get('poll_interval', 1.0)
+
+    @property
+    def watch_inotify(self):
+        return self.get('watch', {}).get('inotify', True)
+
+    @property
+    def metrics_enabled(self):
+        # Serve Prometheus metrics on http://metrics.host:metrics.port/metrics
+        return self.get('metrics', {}).get('enabled', False)
+
+    @property
+    def metrics_host(self):
+        return self.get('metrics', {}).get('host', '127.0.0.1')
+
+    @property
+    def metrics_port(self):
+        return self.get('metrics', {}).get('port', 9479)
+
+    @property
+    def spool_enabled(self):
+        # Spool parsed records to disk so parsing never waits on Elasticsearch
+        return self.get('spool', {}).get('enabled', False)
+
+    @property
+    def spool_directory(self):
+        return os.path.expanduser(self.get('spool', {}).get('directory', './.rosbeat_spool'))
+
+    @property
+    def spool_segment_bytes(self):
+        return self.get('spool', {}).get('segment_bytes', DEFAULT_SEGMENT_BYTES)
+
+    @property
+    def spool_max_bytes(self):
+        return self.get('spool', {}).get('max_bytes', DEFAULT_MAX_BYTES)
+
+    @property
+    def spool_retry_interval(self):
+        # Seconds between attempts to reach Elasticsearch during an outage
+        return self.get('spool', {}).get('retry_interval', 30)
+
+    @property
+    def local_index_path(self):
+        # SQLite database built by `rosbeat index` and searched by `rosbeat query`
+        return os.path.expanduser(self.get('local_index', {}).get('path', './rosbeat_index.db'))
@@ -0,0 +1,235 @@
+"""Config-driven filtering applied to records right after parsing.
+
+Filters.from_config() validates and compiles the `filters` section once, when
+the Config is loaded: regexes are joined into one pattern per field, levels
+become ranks, and per-node decisions are cached, so the per-record cost is a
+few dict lookups. Only the stages that are configured run.
+"""
+import inspect
+import re
+from collections import deque
+from rosbeat.metrics import METRICS
+from rosbeat.record import LogRecord
+from rosbeat.timestamps import iso_to_millis
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARN': 30, 'WARNING': 30, 'ERROR': 40, 'FATAL': 50, 'CRITICAL': 50}
+
+def _rank(level, where):
+    rank = LEVELS.get(str(level).upper())
+    if rank is None:
+        raise ValueError(f"Unknown log level {level!r} in {where}; expected one of {', '.join(LEVELS)}")
+    return rank
+
+def _pattern(patterns, where):
+    """Compile a list of regexes into one, or None when the list is empty."""
+    if not patterns:
+        return None
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    try:
+        return re.compile('|'.join(f'(?:{p})' for p in patterns))
+    except re.error as e:
+        raise ValueError(f"Invalid regex in {where}: {e}")
+
+def _field(log, name):
+    return getattr(log, name) if isinstance(log, LogRecord) else log.get(name)
+
+class Filters:
+    """Level thresholds, include/exclude patterns, per-node rate limits and duplicate collapsing.
+
+    Level thresholds come from min_level_by_node, then min_level_by_log_type,
+    then min_level; records with levels outside LEVELS are kept. Rate limits
+    are token buckets per node in each file (every node's /rosout lines share
+    the node name "rosout"), refilled by the records' own timestamps so a
+    backfill is limited the same way as a live run. When a bucket sees time go
+    backwards it restarts its clock there rather than waiting to catch up.
+    """
+
+    def __init__(self, min_level=None, min_level_by_log_type=None, min_level_by_node=None,
+                 include_nodes=None, exclude_nodes=None, include_messages=None, exclude_messages=None,
+                 rate_limit=0, rate_burst=None, collapse_duplicates=False, collapse_window=5):
+        self.min_level = _rank(min_level, 'filters.min_level') if min_level else None
+        self.by_log_type = {k: _rank(v, 'filters.min_level_by_log_type')
+                            for k, v in (min_level_by_log_type or {}).items()}
+        self.by_node = {k: _rank(v, 'filters.min_level_by_node') for k, v in (min_level_by_node or {}).items()}
+        self.include_nodes = _pattern(include_nodes, 'filters.include_nodes')
+        self.exclude_nodes = _pattern(exclude_nodes, 'filters.exclude_nodes')
+        self.include_messages = _pattern(include_messages, 'filters.include_messages')
+        self.exclude_messages = _pattern(exclude_messages, 'filters.exclude_messages')
+        if rate_limit < 0:
+            raise ValueError("filters.rate_limit must not be negative")
+        self.rate_limit = rate_limit
+        self.rate_burst = rate_burst if rate_burst is not None else max(rate_limit, 1)
+        self.collapse_duplicates = collapse_duplicates
+        if collapse_window <= 0:
+            raise ValueError("filters.collapse_window must be positive")
+        self.collapse_window = collapse_window
+
+        self.levels = self.min_level is not None or bool(self.by_log_type) or bool(self.by_node)
+        self.enabled = (self.levels or self.include_nodes is not None or self.exclude_nodes is not None
+                        or self.include_messages is not None or self.exclude_messages is not None
+                        or rate_limit > 0 or collapse_duplicates)
+
+        self._thresholds = {}
+        self._nodes = {}
+        # (file_path, node) -> [tokens, millis of last refill]; kept across calls so `watch` limits continuously
+        self._buckets = {}
+
+    @classmethod
+    def from_config(cls, section):
+        section = dict(section or {})
+        unknown = set(section) - set(inspect.signature(cls).parameters)
+        if unknown:
+            raise ValueError(f"Unknown filters option(s): {', '.join(sorted(unknown))}")
+        return cls(**section)
+
+    def _threshold(self, log_type, node):
+        key = (log_type, node)
+        threshold = self._thresholds.get(key)
+        if threshold is None:
+            threshold = self.by_node.get(node, self.by_log_type.get(log_type, self.min_level or 0))
+            self._thresholds[key] = threshold
+        return threshold
+
+    def _node_allowed(self, node):
+        allowed = self._nodes.get(node)
+        if allowed is None:
+            name = node or ''
+            allowed = ((self.include_nodes is None or self.include_nodes.search(name) is not None)
+                       and (self.exclude_nodes is None or self.exclude_nodes.search(name) is None))
+            self._nodes[node] = allowed
+        return allowed
+
+    def _take(self, key, timestamp):
+        millis = iso_to_millis(timestamp)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.rate_burst, millis]
+        elif millis is not None and bucket[1] is not None and millis > bucket[1]:
+            bucket[0] = min(self.rate_burst, bucket[0] + (millis - bucket[1]) * self.rate_limit / 1000)
+            bucket[1] = millis
+        elif millis is not None:
+            # First timestamp, or time went backwards (clock step, a file's records out of order)
+            bucket[1] = millis
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def _keep(self, node, level, log_type, message, dropped):
+        if self.levels:
+            rank = LEVELS.get(level)
+            if rank is not None and rank < self._threshold(log_type, node):
+                dropped['level'] += 1
+                return False
+        if not self._node_allowed(node):
+            dropped['node'] += 1
+            return False
+        if self.include_messages is not None or self.exclude_messages is not None:
+            message = message or ''
+            if (self.include_messages is not None and self.include_messages.search(message) is None) \
+                    or (self.exclude_messages is not None and self.exclude_messages.search(message) is not None):
+                dropped['message'] += 1
+                return False
+        return True
+
+    def _limited(self, file_path, node, log, dropped):
+        if self.rate_limit and not self._take((file_path, node), _field(log, 'timestamp')):
+            dropped['rate_limit'] += 1
+            return True
+        return False
+
+    def apply(self, harvest):
+        """Filter (file_path, end_offset, record) triples, keeping each file's order.
+
+        Duplicates are collapsed per node in each file, so a node repeating
+        itself is folded even when other nodes log in between. A run is
+        yielded as its first record, where that record was, with repeat_count
+        set; it ends when the node logs something else or the file's log time
+        is collapse_window seconds past its first record, so later records of
+        the file wait at most that long behind it. A run counts as one record
+        against the node's rate limit. End offsets never pass a record that is
+        still waiting. Dropped records are counted in rosbeat_filtered_total by
+        reason.
+        """
+        if not self.enabled:
+            yield from harvest
+            return
+
+        dropped = {'level': 0, 'node': 0, 'message': 0, 'rate_limit': 0, 'duplicate': 0}
+        collapse = self.collapse_duplicates
+        window = self.collapse_window * 1000
+        # file_path -> runs in the order of their first record; a run is
+        # [file_path, end, log, (node, level, message), repeats, start, limited, first millis, open]
+        runs = {}
+        # (file_path, node) -> the node's open run in that file
+        pending = {}
+        # file_path -> end offset of the last record read from it, where the next one starts
+        ends = {}
+        try:
+            for file_path, end, log in harvest:
+                if isinstance(log, LogRecord):
+                    node, level, log_type, message = log.node_name, log.log_level, log.log_type, log.log_message
+                else:
+                    node, level, log_type, message = (log.get('node_name'), log.get('log_level'),
+                                                      log.get('log_type'), log.get('log_message'))
+                if not collapse:
+                    if self._keep(node, level, log_type, message, dropped) \
+                            and not self._limited(file_path, node, log, dropped):
+                        yield file_path, end, log
+                    continue
+
+                start = ends.get(file_path, 0)
+                ends[file_path] = end
+                queue = runs.get(file_path)
+                if queue is None:
+                    queue = runs[file_path] = deque()
+                millis = iso_to_millis(_field(log, 'timestamp'))
+                if millis is not None and queue:
+                    yield from self._release(queue, pending, millis - window)
+                if not self._keep(node, level, log_type, message, dropped):
+                    continue
+                key = (file_path, node)
+                run = pending.get(key)
+                if run is not None and run[3] == (node, level, message):
+                    run[1] = end
+                    run[4] += 1
+                    dropped['duplicate'] += 1
+                    continue
+                if run is not None:
+                    run[8] = False
+                limited = self._limited(file_path, node, log, dropped)
+                run = pending[key] = [file_path, end, log, (node, level, message), 1, start, limited, millis, True]
+                queue.append(run)
+                yield from self._release(queue, pending)
+            for queue in runs.values():
+                yield from self._release(queue, pending, float('inf'))
+        finally:
+            for reason, count in dropped.items():
+                if count:
+                    METRICS.inc('rosbeat_filtered_total', count, reason=reason)
+
+    @staticmethod
+    def _release(queue, pending, expired=None):
+        """Yield the finished runs at the head of a file's queue; open runs first seen by expired end too."""
+        while queue:
+            run = queue[0]
+            file_path, end, log, (node, _, _), repeats, _, limited, first, is_open = run
+            if is_open:
+                if expired is None or (first is not None and first > expired):
+                    return
+                run[8] = False
+                if pending.get((file_path, node)) is run:
+                    del pending[(file_path, node)]
+            queue.popleft()
+            if limited:
+                continue
+            if repeats > 1:
+                if isinstance(log, LogRecord):
+                    log.repeat_count = repeats
+                else:
+                    log["repeat_count"] = repeats
+            # Committing past a record still waiting would lose it if the process stopped now
+            if queue and queue[0][5] < end:
+                end = queue[0][5]
+            yield file_path, end, log
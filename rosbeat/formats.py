@@ -0,0 +1,347 @@
+import fnmatch
+import os
+import re
+from functools import lru_cache
+from sys import intern
+from time import perf_counter
+from rosbeat.metrics import METRICS
+from rosbeat.reader import block_lines, read_blocks, read_lines, split_log_name
+from rosbeat.record import LogRecord
+from rosbeat.timestamps import date_to_iso, epoch_to_iso, iso_to_millis
+
+# Registered formats, in the order session files are classified and parsed
+FORMATS = {}
+
+# Caps on what multiline appends to one record, like Filebeat's multiline.max_lines and max_bytes;
+# further continuation lines are dropped so one runaway traceback can't grow a record without bound
+MAX_CONTINUATION_LINES = 500
+MAX_CONTINUATION_BYTES = 256 * 1024
+
+# Unindented lines that still continue a record: a traceback's header, chained-exception
+# banners and its closing "SomeError: message" line. Indented lines always continue one.
+CONTINUATION = re.compile(r'Traceback \(most recent call last\)|During handling of the above exception'
+                          r'|The above exception was the direct cause'
+                          r'|[A-Za-z_][\w.]*(?:Error|Exception|Warning|Interrupt|Exit)(?::|$)')
+
+class _HarvestStats:
+    """Adds one block's counts to METRICS, labelled by format and file name."""
+
+    def __init__(self, format_name, file_path):
+        self.labels = {'format': format_name, 'file': os.path.basename(file_path)}
+
+    def add(self, size, lines, records, continued, no_match, rejected, orphans, truncated, seconds):
+        labels = self.labels
+        METRICS.inc('rosbeat_bytes_read_total', size, **labels)
+        METRICS.inc('rosbeat_lines_read_total', lines, **labels)
+        METRICS.inc('rosbeat_records_total', records, **labels)
+        METRICS.inc('rosbeat_parse_seconds_total', seconds, **labels)
+        if continued:
+            METRICS.inc('rosbeat_continuation_lines_total', continued, **labels)
+        for reason, count in (('no_match', no_match), ('rejected', rejected), ('orphan', orphans),
+                              ('truncated', truncated)):
+            if count:
+                METRICS.inc('rosbeat_lines_dropped_total', count, **labels)
+                METRICS.inc('rosbeat_parse_errors_total', count, format=labels['format'], reason=reason)
+
+def _append_lines(log, lines):
+    message = '\n'.join([log.log_message if isinstance(log, LogRecord) else log["log_message"]] + lines)
+    if isinstance(log, LogRecord):
+        log.log_message = message
+    else:
+        log["log_message"] = message
+
+class LogFormat:
+    """Line rules for one kind of ROS log file.
+
+    Patterns are compiled once at registration. Each line is dispatched on its
+    first character ('[' or a digit) so only the rules that can possibly match
+    it are tried.
+
+    With multiline, a line no rule matches but that continues a record (an
+    indented line, or the header and last line of a traceback) is appended to
+    the message of the record before it instead of being dropped, up to
+    max_lines lines and max_bytes characters per record. A format is itself a
+    line parser: format(line, file_path) is format.parse_line.
+    """
+
+    def __init__(self, name, filenames, strip=True, multiline=False, max_lines=MAX_CONTINUATION_LINES,
+                 max_bytes=MAX_CONTINUATION_BYTES):
+        self.name = name
+        self.filenames = filenames
+        self.strip = strip
+        self.multiline = multiline
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.rules = {}
+
+    def rule(self, first, pattern):
+        """Register a builder for lines starting with `first` ('[' or '0' for any digit).
+
+        The builder is called as build(match, file_path) and returns a
+        LogRecord (or a plain dict), or None to drop the line.
+        """
+        regex = re.compile(pattern)
+        # Key every digit separately so dispatch is a single dict lookup on line[0]
+        keys = '0123456789' if first == '0' else first
+
+        def register(build):
+            for key in keys:
+                self.rules.setdefault(key, []).append((regex.match, build))
+            return build
+        return register
+
+    def __call__(self, line, file_path):
+        return self.parse_line(line, file_path)
+
+    def __reduce__(self):
+        # Ship formats to worker processes by name rather than by their compiled rules
+        return get_format, (self.name,)
+
+    def matches_file(self, fname):
+        return any(fnmatch.fnmatchcase(fname, pattern) for pattern in self.filenames)
+
+    def parse_line(self, line, file_path):
+        # Unstripped formats keep a message's spaces, but not the line ending
+        line = line.strip() if self.strip else line.rstrip('\r\n')
+        if not line:
+            return None
+
+        rules = self.rules.get(line[0])
+        if rules is None:
+            return None
+        for match_line, build in rules:
+            match = match_line(line)
+            if match:
+                return build(match, file_path)
+        return None
+
+    def is_record_start(self, line):
+        """Whether a raw line (bytes) begins a new record rather than continuing one."""
+        if not self.multiline:
+            return True
+        line = line.decode('utf-8', errors='replace').strip()
+        if not line:
+            return False
+        return any(match_line(line) for match_line, _ in self.rules.get(line[0], ()))
+
+    def harvest(self, file_path, offset=0, partial=True, stop=None):
+        """Yield (end_offset, record) for a file, read through a memory map.
+
+        The file is decoded a block at a time and each line is matched in
+        place, so no per-line string is built for the usual ASCII log.
+        Compressed files are streamed instead. A record is yielded once the
+        next record starts (or the file ends), and its end offset covers the
+        lines after it that start no record: continuation lines with
+        multiline, skipped ones otherwise.
+        """
+        rules = self.rules
+        strip = self.strip
+        multiline = self.multiline
+        continues = CONTINUATION.match
+        max_lines = self.max_lines
+        max_bytes = self.max_bytes
+        pending = None
+        extra = []
+        extra_bytes = 0
+        stats = _HarvestStats(self.name, file_path)
+        for data, base in read_blocks(file_path, offset, partial, stop):
+            # Records are yielded after each block so its parse time excludes the consumer's
+            started = perf_counter()
+            out = []
+            lines = continued = no_match = rejected = orphans = truncated = 0
+            for text, start, end, following in block_lines(data):
+                if start == end:
+                    continue
+                first = start
+                if strip and (text[start].isspace() or text[end - 1].isspace()):
+                    line = text[start:end]
+                    start += len(line) - len(line.lstrip())
+                    end -= len(line) - len(line.rstrip())
+                    if start >= end:
+                        continue
+                lines += 1
+
+                for match_line, build in rules.get(text[start], ()):
+                    match = match_line(text, start, end)
+                    if match:
+                        break
+                else:
+                    if not multiline or not (text[first].isspace() or continues(text, start, end)):
+                        no_match += 1
+                    elif pending is None:
+                        orphans += 1
+                    elif len(extra) >= max_lines or extra_bytes + end - first > max_bytes:
+                        truncated += 1
+                    else:
+                        # Keep the continuation's indentation; drop only the line ending
+                        extra.append(text[first:end].rstrip())
+                        extra_bytes += end - first + 1
+                        continued += 1
+                    if pending is not None:
+                        pending[0] = base + following
+                    continue
+
+                log = build(match, file_path)
+                if pending is not None:
+                    if extra:
+                        _append_lines(pending[1], extra)
+                        extra = []
+                        extra_bytes = 0
+                    out.append((pending[0], pending[1]))
+                # A matched line its builder rejects still ends the previous record
+                if log is None:
+                    rejected += 1
+                    pending = None
+                else:
+                    pending = [base + following, log]
+
+            stats.add(len(data), lines, len(out), continued, no_match, rejected, orphans, truncated,
+                      perf_counter() - started)
+            yield from out
+
+        if pending is not None:
+            if extra:
+                _append_lines(pending[1], extra)
+            stats.add(0, 0, 1, 0, 0, 0, 0, 0, 0.0)
+            yield pending[0], pending[1]
+
+def register_format(log_format):
+    FORMATS[log_format.name] = log_format
+    return log_format
+
+def get_format(name):
+    return FORMATS[name]
+
+def classify_file(fname):
+    """Return the first registered format whose filename patterns match fname.
+
+    Rotated and compressed files (rosout.log.1, talker-1.log.gz) are
+    classified by the name of the live file they came from.
+    """
+    base = split_log_name(fname)[0]
+    for log_format in FORMATS.values():
+        if log_format.matches_file(base):
+            return log_format
+    return None
+
+def harvest_log(file_path, parse_line, offset=0, partial=True, stop=None):
+    """Yield (end_offset, record) for every record of file_path that parse_line accepts.
+
+    Parsers with a harvest method (LogFormat, EpochMillis) read the file
+    through it; any other callable is fed one decoded line at a time.
+    """
+    harvest = getattr(parse_line, 'harvest', None)
+    if harvest is not None:
+        yield from harvest(file_path, offset, partial, stop)
+        return
+    for end, line in read_lines(file_path, offset, partial, stop):
+        log = parse_line(line, file_path)
+        if log is not None:
+            yield end, log
+
+def is_record_start(parse_line, line):
+    check = getattr(parse_line, 'is_record_start', None)
+    return True if check is None else check(line)
+
+def _stamp(log):
+    if isinstance(log, LogRecord):
+        log.epoch_millis = iso_to_millis(log.timestamp)
+    elif log is not None:
+        log["@timestamp"] = iso_to_millis(log["timestamp"])
+    return log
+
+class EpochMillis:
+    """Wrap a line parser to add a numeric "@timestamp" in epoch milliseconds."""
+
+    def __init__(self, parse_line):
+        self.parse_line = parse_line
+
+    def __call__(self, line, file_path):
+        return _stamp(self.parse_line(line, file_path))
+
+    @property
+    def multiline(self):
+        return getattr(self.parse_line, 'multiline', False)
+
+    def harvest(self, file_path, offset=0, partial=True, stop=None):
+        for end, log in harvest_log(file_path, self.parse_line, offset, partial, stop):
+            yield end, _stamp(log)
+
+    def is_record_start(self, line):
+        return is_record_start(self.parse_line, line)
+
+def parser_for(fname, epoch_millis=False):
+    """Return the line parser for a file name, or None if no format claims it."""
+    log_format = classify_file(fname)
+    if log_format is None:
+        return None
+    return EpochMillis(log_format) if epoch_millis else log_format
+
+@lru_cache(maxsize=1024)
+def node_name_from_path(file_path):
+    return os.path.basename(file_path).split('-')[0]
+
+DATE = r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}'
+
+# master.log: [rosmaster.master][INFO] 2023-11-14 22:13:01,123: message
+MASTER = register_format(LogFormat('master_log', ['master.log'], strip=False))
+
+@MASTER.rule('[', r'\[([^\]]+)\]\[([^\]]+)\]\s+(' + DATE + r'): (.*)')
+def _master(match, file_path):
+    module, log_level, timestamp_str, message = match.groups()
+    return LogRecord(date_to_iso(timestamp_str), intern(log_level), intern(module), message,
+                     "master_log", file_path)
+
+# rosout.log: topic lines, plus a bare "<epoch> <word>" line written at startup
+ROSOUT = register_format(LogFormat('rosout', ['rosout.log']))
+
+@ROSOUT.rule('0', r'(\d+\.\d+)\s+(\w+)\s+(/\S+)\s+\[([^\]]+)\]\s+\[topics: ([^\]]+)\]\s+(.+)$')
+def _rosout(match, file_path):
+    timestamp = epoch_to_iso(match.group(1))
+    if timestamp is None:
+        return None
+    level, node, source_code, topics, message = match.group(2, 3, 4, 5, 6)
+    return LogRecord(timestamp, intern(level), intern(node), message, "rosout", file_path,
+                     intern(topics), intern(source_code))
+
+@ROSOUT.rule('0', r'(\d+\.\d+)\s+([^ ]*)$')
+def _rosout_startup(match, file_path):
+    timestamp = epoch_to_iso(match.group(1))
+    if timestamp is None:
+        return None
+    return LogRecord(timestamp, "INFO", "startup", match.group(2), "rosout", file_path)
+
+# roslaunch-*.log: [roslaunch.pmon][INFO] 2023-11-14 22:13:01,123: message, plus tracebacks
+ROSLAUNCH = register_format(LogFormat('roslaunch', ['roslaunch-*.log'], strip=False, multiline=True))
+
+@ROSLAUNCH.rule('[', r'\[([\w\.]+)\]\[(\w+)\] (' + DATE + r'): (.*)')
+def _roslaunch(match, file_path):
+    module, log_level, timestamp_str, message = match.groups()
+    # node_name is the logger module, e.g. roslaunch, roslaunch.pmon
+    return LogRecord(date_to_iso(timestamp_str), intern(log_level), intern(module), message.strip(),
+                     "roslaunch", file_path)
+
+# A node's captured stdout (output="log"): mostly print() output, which is not a record and must
+# not be glued onto the one before it, so only its logger lines are kept, one line each
+NODE_STDOUT = register_format(LogFormat('node_stdout', ['*-stdout.log']))
+
+# Per-node logs, plus tracebacks; anything else ending in .log, so this format is registered last
+NODE = register_format(LogFormat('node_log', ['*.log'], multiline=True))
+
+@NODE_STDOUT.rule('[', r'\[(' + DATE + r')\]\[([^\]]+)\]\s+(.+)')
+@NODE.rule('[', r'\[(' + DATE + r')\]\[([^\]]+)\]\s+(.+)')
+def _node(match, file_path):
+    timestamp_str, log_level, message = match.groups()
+    return LogRecord(date_to_iso(timestamp_str), intern(log_level), node_name_from_path(file_path), message,
+                     "node_log", file_path)
+
+# /rosout entries that nodes echo into their own log, stamped with epoch seconds
+@NODE_STDOUT.rule('[', r'\[(\d+\.\d+)\]\[(\w+)\]\s+(.+)')
+@NODE.rule('[', r'\[(\d+\.\d+)\]\[(\w+)\]\s+(.+)')
+def _node_rosout(match, file_path):
+    timestamp = epoch_to_iso(match.group(1))
+    if timestamp is None:
+        return None
+    # node_name "rosout" is a special tag for rosout messages
+    return LogRecord(timestamp, intern(match.group(2)), "rosout", match.group(3),
+                     "rosout_node_log", file_path)
@@ -0,0 +1,122 @@
+"""Index template, mappings and bulk-load settings for the indices rosbeat writes.
+
+Fields get explicit types instead of Elasticsearch's dynamic mapping, which
+would index every string twice (text plus keyword) and guess "@timestamp"
+(epoch milliseconds) as a long. Fields of custom formats fall back to keyword.
+"""
+from elasticsearch import exceptions
+
+TEMPLATE_NAME = 'rosbeat'
+
+KEYWORD = {"type": "keyword", "ignore_above": 1024}
+
+MAPPINGS = {
+    "dynamic_templates": [
+        {"strings_as_keywords": {"match_mapping_type": "string", "mapping": KEYWORD}},
+    ],
+    "properties": {
+        "@timestamp": {"type": "date", "format": "epoch_millis"},
+        "timestamp": {"type": "date", "format": "strict_date_optional_time"},
+        "log_level": {"type": "keyword"},
+        "node_name": {"type": "keyword"},
+        "log_type": {"type": "keyword"},
+        "source_file": {"type": "keyword"},
+        "topics": {"type": "keyword"},
+        "source_code": {"type": "keyword"},
+        "log_message": {"type": "text", "fields": {"raw": KEYWORD}},
+        "repeat_count": {"type": "integer"},
+        # Rollup summaries
+        "window_end": {"type": "date", "format": "strict_date_optional_time"},
+        "window_seconds": {"type": "float"},
+        "source_log_type": {"type": "keyword"},
+        "count": {"type": "long"},
+        "first_timestamp": {"type": "date", "format": "strict_date_optional_time"},
+        "last_timestamp": {"type": "date", "format": "strict_date_optional_time"},
+        "distinct_messages": {"type": "long"},
+        "top_messages": {
+            "properties": {
+                "message": KEYWORD,
+                "count": {"type": "long"},
+                "error": {"type": "long"},
+            },
+        },
+    },
+}
+
+# Settings while backfilling: no refreshes and no replicas to copy every document to
+BULK_LOAD_SETTINGS = {"refresh_interval": "-1", "number_of_replicas": 0}
+
+def index_settings(shards, replicas, refresh_interval):
+    return {"number_of_shards": shards, "number_of_replicas": replicas, "refresh_interval": refresh_interval}
+
+def install_template(es, patterns, settings):
+    """Create or replace the rosbeat index template for indices matching patterns."""
+    es.indices.put_index_template(
+        name=TEMPLATE_NAME,
+        index_patterns=patterns,
+        priority=100,
+        template={"settings": {"index": settings}, "mappings": MAPPINGS},
+    )
+
+class BulkLoad:
+    """Context manager that switches the indices a backfill writes to bulk-load settings and back.
+
+    Nothing changes on entry: the ingester calls prepare() the first time it
+    writes to an index, so indices of other dates, and other robots' loads,
+    are left alone. An existing index gets its own refresh_interval and
+    number_of_replicas back afterwards; one created during the load gets the
+    template's. An index already at refresh -1 is someone else's load (or a
+    crashed one) and isn't touched either way.
+    """
+
+    def __init__(self, es, settings):
+        self.es = es
+        self.settings = settings
+        self.active = False
+        # index -> settings to put back on exit
+        self.previous = {}
+
+    def __enter__(self):
+        self.active = True
+        return self
+
+    def prepare(self, index):
+        """Apply bulk-load settings to index before its first document is sent."""
+        normal = {"refresh_interval": self.settings["refresh_interval"],
+                  "number_of_replicas": self.settings["number_of_replicas"]}
+        try:
+            try:
+                # The template supplies the mappings and everything else
+                self.es.indices.create(index=index, settings={"index": BULK_LOAD_SETTINGS})
+                self.previous[index] = normal
+                return
+            except exceptions.BadRequestError as e:
+                if e.error != 'resource_already_exists_exception':
+                    raise
+            response = self.es.indices.get_settings(index=index, flat_settings=True)
+            current = next(iter(response.values()), {}).get('settings', {})
+            if current.get('index.refresh_interval') == BULK_LOAD_SETTINGS['refresh_interval']:
+                return
+            self.es.indices.put_settings(index=index, settings={"index": BULK_LOAD_SETTINGS})
+            self.previous[index] = {
+                # None puts Elasticsearch's default back
+                "refresh_interval": current.get('index.refresh_interval'),
+                "number_of_replicas": current.get('index.number_of_replicas'),
+            }
+        except (exceptions.ApiError, exceptions.ConnectionError) as e:
+            print(f"[WARN] Could not apply bulk-load settings to {index}: {e}")
+
+    def __exit__(self, *exc):
+        self.active = False
+        if not self.previous:
+            return
+        indices = sorted(self.previous)
+        try:
+            for index in indices:
+                self.es.indices.put_settings(index=index, settings={"index": self.previous.pop(index)})
+            self.es.indices.refresh(index=indices)
+        except (exceptions.ApiError, exceptions.ConnectionError) as e:
+            print(f"[WARN] Could not restore index settings after bulk load: {e}; "
+                  f"refresh_interval and replicas must be set back on {', '.join(indices)}.")
+            return
+        print(f"[INFO] Restored index settings on {len(indices)} indices.")
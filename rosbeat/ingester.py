@@ -1,33 +1,384 @@
-from elasticsearch import Elasticsearch, helpers
+from elasticsearch import Elasticsearch, exceptions
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from rosbeat.indices import BulkLoad, index_settings, install_template
+from rosbeat.metrics import METRICS
+from rosbeat.ndjson import append_rejected
+from rosbeat.record import as_dict
+from rosbeat.rollup import is_summary
+from rosbeat.timestamps import iso_to_millis
+import json
+import random
+import threading
 import time
 
+# Per-item and per-request statuses that mean "cluster is busy, try again later"
+RETRY_STATUSES = (429,)
+
+# Leading characters of a record's ISO timestamp used as its index's date suffix
+INDEX_INTERVALS = {'none': 0, 'daily': 10, 'monthly': 7}
+
 class ElasticsearchIngester:
-    def __init__(self, hosts, index, batch_size=500, refresh_interval=5):
-        self.es = Elasticsearch(hosts)
+    def __init__(self, hosts, index, batch_size=500, refresh_interval=5,
+                 max_batch_bytes=5 * 1024 * 1024, max_in_flight=1,
+                 max_retries=5, initial_backoff=0.5, max_backoff=30, rollup_index=None,
+                 index_interval='none', shards=1, replicas=1, dead_letter=None):
+        # 429s are handled below with backoff and smaller batches, not retried blindly by the transport
+        self.es = Elasticsearch(hosts, retry_on_status=(502, 503, 504))
         self.index = index
+        # Rollup summaries go to their own index so dashboards can query them without raw lines
+        self.rollup_index = rollup_index or index
+        if index_interval not in INDEX_INTERVALS:
+            raise ValueError(f"index_interval must be one of {', '.join(INDEX_INTERVALS)}, not {index_interval!r}")
+        # Characters of the ISO timestamp that name a record's index: 10 for daily, 7 for monthly
+        self._date_chars = INDEX_INTERVALS[index_interval]
+        self.settings = index_settings(shards, replicas, f"{refresh_interval}s")
+        # Serialized action line per (base index, date) and every index written to
+        self._actions = {}
+        self.indices = set()
+        # BulkLoad to prepare each index with before its first document, while a backfill runs
+        self._bulk_load = None
         self.batch_size = batch_size
         self.refresh_interval = refresh_interval
+        self.max_batch_bytes = max_batch_bytes
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        # NDJSON file for documents rejected for good; None only counts them
+        self.dead_letter = dead_letter
+
+        # Adaptive batch size: halved when the cluster pushes back, regrown as requests succeed
+        self._batch_docs = batch_size
+        self._lock = threading.Lock()
+        self.throttled = 0
+        # Timestamp of the newest record Elasticsearch has acknowledged, for the lag gauge
+        self._newest_acked = None
+
+    @classmethod
+    def from_config(cls, config):
+        """Build an ingester from the `elasticsearch` and `rollup` settings of a Config."""
+        return cls(
+            hosts=config.elasticsearch_hosts,
+            index=config.elasticsearch_index,
+            batch_size=config.batch_size,
+            refresh_interval=config.refresh_interval,
+            max_batch_bytes=config.max_batch_bytes,
+            max_in_flight=config.max_in_flight,
+            max_retries=config.max_retries,
+            initial_backoff=config.initial_backoff,
+            max_backoff=config.max_backoff,
+            rollup_index=config.rollup_index,
+            index_interval=config.index_interval,
+            shards=config.number_of_shards,
+            replicas=config.number_of_replicas,
+            dead_letter=config.dead_letter_file,
+        )
+
+    @staticmethod
+    def is_retryable(error):
+        """Whether a failed item may be accepted if sent again: throttled, or failed on the cluster's side.
+
+        Anything else (a mapping or parsing error, say) fails the same way every time.
+        """
+        status = error.get("status", 500) if isinstance(error, dict) else 500
+        return status in RETRY_STATUSES or status >= 500
+
+    def reject(self, log, error):
+        """Set a document Elasticsearch refused for good aside in the dead-letter file."""
+        if self.dead_letter is not None:
+            append_rejected(self.dead_letter, log, error)
+
+    def _action_line(self, doc):
+        base = self.rollup_index if is_summary(doc) else self.index
+        date = None
+        if self._date_chars:
+            timestamp = doc.get("timestamp")
+            # "2023-11-14T22:13:01Z" -> "2023-11-14"; records without a usable date stay in the base index
+            if isinstance(timestamp, str) and len(timestamp) > 10 and timestamp[4] == '-':
+                date = timestamp[:self._date_chars]
+        key = (base, date)
+        action = self._actions.get(key)
+        if action is None:
+            index = base if date is None else f"{base}-{date.replace('-', '.')}"
+            if self._bulk_load is not None and self._bulk_load.active:
+                self._bulk_load.prepare(index)
+            action = self._actions[key] = json.dumps({"index": {"_index": index}})
+            self.indices.add(index)
+        return action
+
+    @property
+    def index_label(self):
+        return f"{self.index}-*" if self._date_chars else self.index
+
+    def index_patterns(self):
+        return sorted({f"{self.index}*", f"{self.rollup_index}*"})
+
+    def install_template(self):
+        """Install the index template with rosbeat's mappings and settings for its indices."""
+        install_template(self.es, self.index_patterns(), self.settings)
+        print(f"[INFO] Installed index template for {', '.join(self.index_patterns())}")
+
+    def bulk_load(self):
+        """Context manager that disables refresh and replicas on the indices a backfill writes to."""
+        self._bulk_load = BulkLoad(self.es, self.settings)
+        return self._bulk_load
+
+    def _batches(self, items):
+        """Group (meta, record) pairs into serialized batches capped by document count and bytes."""
+        batch = []
+        size = 0
+        for meta, log in items:
+            doc = as_dict(log)
+            action = self._action_line(doc)
+            source = json.dumps(doc)
+            batch.append((meta, action, source, doc.get("timestamp")))
+            size += len(action) + len(source) + 2
+            if len(batch) >= self._batch_docs or size >= self.max_batch_bytes:
+                yield batch
+                batch = []
+                size = 0
+        if batch:
+            yield batch
+
+    def _acked(self, timestamp):
+        with self._lock:
+            if self._newest_acked is not None and timestamp <= self._newest_acked:
+                return
+            self._newest_acked = timestamp
+        millis = iso_to_millis(timestamp)
+        if millis is not None:
+            METRICS.set('rosbeat_ingest_lag_seconds', max(0.0, time.time() - millis / 1000))
+
+    def _throttled(self):
+        with self._lock:
+            # Don't collapse to single-document requests; that costs the cluster more
+            self._batch_docs = max(self.batch_size // 16, 1, self._batch_docs // 2)
+
+    def _recovered(self):
+        with self._lock:
+            if self._batch_docs < self.batch_size:
+                self._batch_docs = min(self.batch_size, self._batch_docs * 5 // 4 + 1)
+
+    def _report_throttling(self):
+        if self.throttled:
+            print(f"[WARN] Elasticsearch throttled {self.throttled} batches; "
+                  f"batch size is now {self._batch_docs} documents.")
+            self.throttled = 0
+
+    def _report_rejected(self, rejected):
+        if rejected:
+            where = f"; see {self.dead_letter}" if self.dead_letter is not None else ""
+            print(f"[WARN] Elasticsearch rejected {rejected} logs for good{where}.")
+
+    def _backoff(self, attempt):
+        delay = min(self.max_backoff, self.initial_backoff * (2 ** attempt))
+        time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def _send(self, batch):
+        """Send one batch, retrying only throttled items. Returns [(meta, ok, error)] in batch order."""
+        results = [None] * len(batch)
+        todo = list(range(len(batch)))
+        attempt = 0
+        while True:
+            retry = []
+            step = self._batch_docs
+            # After throttling, resend the remainder in pieces of the reduced batch size
+            for start in range(0, len(todo), step):
+                piece = todo[start:start + step]
+                operations = []
+                for i in piece:
+                    operations.append(batch[i][1])
+                    operations.append(batch[i][2])
+                METRICS.inc('rosbeat_bulk_bytes_total', sum(len(line) + 1 for line in operations))
+                started = time.perf_counter()
+                try:
+                    response = self.es.bulk(operations=operations)
+                except exceptions.ApiError as e:
+                    METRICS.observe('rosbeat_bulk_request_seconds', time.perf_counter() - started)
+                    throttled = e.status_code in RETRY_STATUSES
+                    METRICS.inc('rosbeat_bulk_requests_total', outcome='throttled' if throttled else 'error')
+                    if not throttled or attempt >= self.max_retries:
+                        METRICS.inc('rosbeat_bulk_failures_total', reason=f'http_{e.status_code}')
+                        raise
+                    METRICS.inc('rosbeat_bulk_documents_total', len(piece), result='retried')
+                    retry.extend(piece)
+                    continue
+                except (exceptions.ConnectionError, exceptions.ConnectionTimeout):
+                    METRICS.observe('rosbeat_bulk_request_seconds', time.perf_counter() - started)
+                    METRICS.inc('rosbeat_bulk_requests_total', outcome='error')
+                    if attempt >= self.max_retries:
+                        METRICS.inc('rosbeat_bulk_failures_total', reason='connection')
+                        raise
+                    METRICS.inc('rosbeat_bulk_documents_total', len(piece), result='retried')
+                    retry.extend(piece)
+                    continue
+                METRICS.observe('rosbeat_bulk_request_seconds', time.perf_counter() - started)
+
+                indexed = retried = 0
+                newest = None
+                for i, item in zip(piece, response["items"]):
+                    result = next(iter(item.values()))
+                    status = result.get("status", 500)
+                    if 200 <= status < 300:
+                        results[i] = (batch[i][0], True, None)
+                        indexed += 1
+                        timestamp = batch[i][3]
+                        if timestamp and (newest is None or timestamp > newest):
+                            newest = timestamp
+                    elif status in RETRY_STATUSES and attempt < self.max_retries:
+                        retry.append(i)
+                        retried += 1
+                    else:
+                        error = result.get("error")
+                        # The item's status travels with its error so callers can tell throttling from a bad document
+                        error = dict(error, status=status) if isinstance(error, dict) else {"status": status, "reason": error}
+                        results[i] = (batch[i][0], False, error)
+                        reason = error.get("type", status)
+                        METRICS.inc('rosbeat_bulk_failures_total', reason=str(reason))
+                        METRICS.inc('rosbeat_bulk_documents_total', result='failed')
+
+                METRICS.inc('rosbeat_bulk_requests_total', outcome='throttled' if retried else 'ok')
+                METRICS.inc('rosbeat_bulk_documents_total', indexed, result='indexed')
+                if retried:
+                    METRICS.inc('rosbeat_bulk_documents_total', retried, result='retried')
+                if newest is not None:
+                    self._acked(newest)
+
+            if not retry:
+                if attempt == 0:
+                    self._recovered()
+                return results
+            self.throttled += 1
+            self._throttled()
+            self._backoff(attempt)
+            attempt += 1
+            todo = retry
+
+    def bulk(self, items):
+        """Yield (meta, ok, error) for each (meta, record) pair, in input order.
+
+        Up to max_in_flight batches are sent concurrently. Results are consumed
+        oldest-first, so a slow cluster stalls the producer instead of letting
+        batches pile up in memory.
+        """
+        if self.max_in_flight <= 1:
+            for batch in self._batches(items):
+                started = time.perf_counter()
+                results = self._send(batch)
+                METRICS.inc('rosbeat_bulk_wait_seconds_total', time.perf_counter() - started)
+                for result in results:
+                    yield result
+            return
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            in_flight = deque()
+            for batch in self._batches(items):
+                in_flight.append(pool.submit(self._send, batch))
+                METRICS.set('rosbeat_queue_depth', len(in_flight), queue='bulk_in_flight')
+                if len(in_flight) < self.max_in_flight:
+                    continue
+                for result in self._wait(in_flight):
+                    yield result
+            while in_flight:
+                for result in self._wait(in_flight):
+                    yield result
+            METRICS.set('rosbeat_queue_depth', 0, queue='bulk_in_flight')
+
+    def _wait(self, in_flight):
+        """Block on the oldest in-flight batch and return its results."""
+        started = time.perf_counter()
+        results = in_flight.popleft().result()
+        METRICS.inc('rosbeat_bulk_wait_seconds_total', time.perf_counter() - started)
+        return results
 
     def ingest_logs(self, logs):
-        if not logs:
+        """Stream logs into Elasticsearch, holding at most max_in_flight batches in memory."""
+        print(f"[INFO] Ingesting logs into Elasticsearch index '{self.index_label}'...")
+        count = failed = rejected = 0
+        for log, ok, error in self.bulk((log, log) for log in logs):
+            if ok:
+                count += 1
+                continue
+            if failed + rejected == 0:
+                print(f"[WARN] Failed to index a record: {error}")
+            if self.is_retryable(error):
+                failed += 1
+            else:
+                rejected += 1
+                self.reject(log, error)
+
+        self._report_throttling()
+        self._report_rejected(rejected)
+        if failed:
+            print(f"[WARN] {failed} logs failed to index.")
+        if not count:
             print("[INFO] No logs to ingest.")
-            return
-        
-        actions = [
-            {
-                "_index": self.index,
-                "_source": log
-            }
-            for log in logs
-        ]
-
-        print(f"[INFO] Ingesting {len(actions)} logs into Elasticsearch index '{self.index}'...")
-        helpers.bulk(self.es, actions)
-        print(f"[INFO] Successfully ingested {len(actions)} logs.")
-
-    def continuous_ingest(self, log_generator_func):
+            return 0
+        print(f"[INFO] Successfully ingested {count} logs.")
+        return count
+
+    def ingest_harvest(self, harvest, registry, quiet=False):
+        """Stream (file_path, end_offset, record) triples into Elasticsearch.
+
+        A file's registry offset only moves forward once every record before it
+        has been acknowledged or rejected for good; rejected documents go to the
+        dead-letter file. After an item that may succeed later (throttled past
+        max_retries, or a cluster-side error) the file's offset is held back so
+        the next run retries from there. quiet drops the per-call [INFO] lines
+        for callers that flush many small batches.
+        """
+        blocked = set()
+        items = (((file_path, end, log), log) for file_path, end, log in harvest)
+
+        if not quiet:
+            print(f"[INFO] Ingesting new logs into Elasticsearch index '{self.index_label}'...")
+        count = failed = rejected = 0
+        try:
+            for (file_path, end, log), ok, error in self.bulk(items):
+                if not ok and self.is_retryable(error):
+                    failed += 1
+                    if file_path not in blocked:
+                        print(f"[WARN] Failed to index a record from {file_path}: {error}")
+                        blocked.add(file_path)
+                    continue
+                if ok:
+                    count += 1
+                else:
+                    if not rejected:
+                        print(f"[WARN] Elasticsearch rejected a record from {file_path}: {error}")
+                    rejected += 1
+                    self.reject(log, error)
+                if file_path not in blocked:
+                    registry.advance(file_path, end)
+                if (count + rejected) % self.batch_size == 0:
+                    registry.save()
+        finally:
+            registry.save()
+
+        self._report_throttling()
+        self._report_rejected(rejected)
+        if failed:
+            print(f"[WARN] {failed} logs failed to index and will be retried on the next run.")
+        if quiet:
+            return count
+        if not count:
+            print("[INFO] No new logs to ingest.")
+            return 0
+        print(f"[INFO] Successfully ingested {count} logs.")
+        return count
+
+    def continuous_ingest(self, log_generator_func, registry=None):
+        """Ingest on a fixed interval.
+
+        With a registry, log_generator_func must return a harvest of
+        (file_path, end_offset, record) triples, so each tick only ships new data.
+        """
         print(f"[INFO] Starting continuous ingestion loop (every {self.refresh_interval}s)...")
         while True:
             logs = log_generator_func()
-            self.ingest_logs(logs)
+            if registry is None:
+                self.ingest_logs(logs)
+            else:
+                self.ingest_harvest(logs, registry)
             time.sleep(self.refresh_interval)
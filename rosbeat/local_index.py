@@ -0,0 +1,180 @@
+"""Offline SQLite index of parsed sessions, for searching logs without Elasticsearch.
+
+Records go into one table with indexes on (node_name, log_level, ts),
+(node_name, ts), (log_level, ts), (log_type, ts) and ts, plus an FTS5 table over log_message, so a query such as
+"ERRORs from /move_base in a five-minute window" touches only matching rows.
+Each file's indexed offset is kept in a registry next to the database, so
+re-running `rosbeat index` only adds what was written since.
+"""
+import os
+import sqlite3
+from datetime import datetime, timezone
+from rosbeat.filters import LEVELS
+from rosbeat.record import LogRecord
+from rosbeat.registry import Registry
+from rosbeat.timestamps import EPOCH, iso_to_millis
+
+# Rows inserted per transaction; the registry is saved after each commit
+COMMIT_ROWS = 20000
+
+# Shorthands for the log_type values records are stored with
+LOG_TYPE_ALIASES = {
+    'node': ['node_log', 'rosout_node_log'],
+    'master': ['master_log'],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER,
+    timestamp TEXT,
+    log_level TEXT,
+    node_name TEXT,
+    log_type TEXT,
+    source_file TEXT,
+    log_message TEXT,
+    topics TEXT,
+    source_code TEXT,
+    repeat_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS logs_ts ON logs (ts);
+CREATE INDEX IF NOT EXISTS logs_node_ts ON logs (node_name, ts);
+CREATE INDEX IF NOT EXISTS logs_node_level_ts ON logs (node_name, log_level, ts);
+CREATE INDEX IF NOT EXISTS logs_level_ts ON logs (log_level, ts);
+CREATE INDEX IF NOT EXISTS logs_type_ts ON logs (log_type, ts);
+CREATE VIRTUAL TABLE IF NOT EXISTS logs_fts USING fts5 (log_message, content='logs', content_rowid='id');
+"""
+
+COLUMNS = ('timestamp', 'log_level', 'node_name', 'log_type', 'source_file', 'log_message',
+           'topics', 'source_code', 'repeat_count')
+
+def _row(log):
+    if isinstance(log, LogRecord):
+        ts = log.epoch_millis if log.epoch_millis is not None else iso_to_millis(log.timestamp)
+        return (ts, log.timestamp, log.log_level, log.node_name, log.log_type, log.source_file,
+                log.log_message, log.topics, log.source_code, log.repeat_count)
+    ts = log.get('@timestamp')
+    if ts is None:
+        ts = iso_to_millis(log.get('timestamp'))
+    return (ts,) + tuple(log.get(column) for column in COLUMNS)
+
+def parse_time(value):
+    """Epoch milliseconds for '2023-11-14 22:13:00', an ISO 8601 timestamp or epoch seconds.
+
+    Times without an offset are UTC, like the records' timestamps.
+    """
+    try:
+        return int(float(value) * 1000)
+    except ValueError:
+        pass
+    try:
+        moment = datetime.fromisoformat(value.rstrip('Z').replace(' ', 'T'))
+    except ValueError:
+        raise ValueError(f"Unrecognized time {value!r}; use e.g. 2023-11-14T22:13:00 or epoch seconds")
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return (moment - EPOCH) // _MILLISECOND
+
+_MILLISECOND = datetime(1970, 1, 1, 0, 0, 0, 1000) - EPOCH
+
+class LocalIndex:
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        # WAL lets `rosbeat query` read while `rosbeat index` is adding a session
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.registry = Registry(path + '.state.json')
+
+    def add(self, harvest):
+        """Insert (file_path, end_offset, record) triples, committing every COMMIT_ROWS rows.
+
+        A file's offset is saved only after the rows before it are committed.
+        """
+        count = 0
+        rows = []
+        offsets = {}
+        for file_path, end, log in harvest:
+            rows.append(_row(log))
+            offsets[file_path] = end
+            if len(rows) >= COMMIT_ROWS:
+                count += self._commit(rows, offsets)
+                rows = []
+                offsets = {}
+        if rows:
+            count += self._commit(rows, offsets)
+        self.registry.save()
+        return count
+
+    def _commit(self, rows, offsets):
+        with self.db:
+            start = self.db.execute("SELECT COALESCE(MAX(id), 0) FROM logs").fetchone()[0]
+            self.db.executemany(
+                "INSERT INTO logs (ts, timestamp, log_level, node_name, log_type, source_file, log_message,"
+                " topics, source_code, repeat_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.execute("INSERT INTO logs_fts (rowid, log_message) SELECT id, log_message FROM logs WHERE id > ?",
+                            (start,))
+        for file_path, end in offsets.items():
+            self.registry.advance(file_path, end)
+        self.registry.save()
+        return len(rows)
+
+    def query(self, levels=None, min_level=None, nodes=None, log_types=None, since=None, until=None,
+              text=None, limit=100, newest=False):
+        """Yield matching records as dicts, oldest first (or newest first with newest=True).
+
+        levels, nodes and log_types are lists of exact values, except that the
+        log types in LOG_TYPE_ALIASES stand for theirs; with both levels and
+        min_level, a record must match both. since and until are epoch
+        milliseconds; text is an FTS5 query on log_message, e.g.
+        'timeout OR "no path"'.
+        """
+        where = []
+        params = []
+        if min_level is not None:
+            threshold = LEVELS.get(min_level.upper())
+            if threshold is None:
+                raise ValueError(f"Unknown log level {min_level!r}; expected one of {', '.join(LEVELS)}")
+            allowed = [level for level, rank in LEVELS.items() if rank >= threshold]
+            levels = [level for level in levels if level in allowed] if levels else allowed
+            if not levels:
+                return
+        if log_types:
+            log_types = [stored for log_type in log_types for stored in LOG_TYPE_ALIASES.get(log_type, [log_type])]
+        for column, values in (('log_level', levels), ('node_name', nodes), ('log_type', log_types)):
+            if values:
+                where.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        if since is not None:
+            where.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("ts < ?")
+            params.append(until)
+        if text:
+            where.append("id IN (SELECT rowid FROM logs_fts WHERE logs_fts MATCH ?)")
+            params.append(text)
+
+        sql = "SELECT ts, " + ', '.join(COLUMNS) + " FROM logs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        order = "DESC" if newest else "ASC"
+        sql += f" ORDER BY ts {order}, id {order}"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        for row in self.db.execute(sql, params):
+            log = {column: value for column, value in zip(COLUMNS, row[1:]) if value is not None}
+            if row[0] is not None:
+                log["@timestamp"] = row[0]
+            yield log
+
+    def count(self):
+        return self.db.execute("SELECT COUNT(*) FROM logs").fetchone()[0]
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,102 @@
+"""Streaming newline-delimited JSON, optionally gzip-, xz- or zstd-compressed.
+
+Records are written and read one line at a time, so parse-then-ingest runs in
+constant memory. orjson and zstandard are used when installed
+(pip install rosbeat[fast,zstd]); the standard library covers the rest.
+"""
+import gzip
+import json
+import lzma
+from rosbeat.reader import open_log, require_zstandard, zstandard
+from rosbeat.record import as_dict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'xz': '.xz', 'zstd': '.zst'}
+
+if orjson is not None:
+    def encode(log):
+        return orjson.dumps(as_dict(log)) + b'\n'
+
+    decode = orjson.loads
+else:
+    def encode(log):
+        return json.dumps(as_dict(log), ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+    decode = json.loads
+
+def open_binary(path, mode):
+    """Open path for binary 'rb'/'wb'/'ab', compressing or decompressing by its suffix.
+
+    Appending to a compressed file adds a new gzip member, xz stream or zstd
+    frame, which readers decompress as one.
+    """
+    if 'w' not in mode and 'a' not in mode:
+        return open_log(path)
+    if path.endswith('.gz'):
+        # Level 6 trades a little size for a lot of speed over the default 9
+        return gzip.open(path, mode, compresslevel=6)
+    if path.endswith('.xz'):
+        return lzma.open(path, mode)
+    if path.endswith('.zst'):
+        require_zstandard()
+        return zstandard.ZstdCompressor().stream_writer(open(path, mode), closefd=True)
+    return open(path, mode)
+
+def ndjson_path(path, compression=None):
+    """Append the suffix for compression ('gzip', 'xz', 'zstd' or None) to path."""
+    if compression in (None, 'none'):
+        return path
+    return path + COMPRESSION_SUFFIXES[compression]
+
+class NdjsonWriter:
+    """Append records to an NDJSON file (or an open binary stream) one line at a time."""
+
+    def __init__(self, target):
+        self._owns = isinstance(target, str)
+        self.stream = open_binary(target, 'wb') if self._owns else target
+        self.count = 0
+
+    def write(self, log):
+        self.stream.write(encode(log))
+        self.count += 1
+
+    def write_all(self, logs):
+        for log in logs:
+            self.write(log)
+        return self.count
+
+    def close(self):
+        if self._owns:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_ndjson(logs, path):
+    """Write records to path and return how many were written."""
+    with NdjsonWriter(path) as writer:
+        return writer.write_all(logs)
+
+def append_rejected(path, log, error):
+    """Append a record a destination refused for good, with the reason, to a dead-letter NDJSON file."""
+    with open(path, 'ab') as f:
+        f.write(encode({"error": error if isinstance(error, (dict, int)) else str(error), "record": as_dict(log)}))
+
+def read_ndjson(path):
+    """Yield one dict per non-empty line of an NDJSON file."""
+    with open_binary(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                yield decode(line)
+
+def is_ndjson(fname):
+    return fname.endswith(('.ndjson', '.ndjson.gz', '.ndjson.xz', '.ndjson.zst'))
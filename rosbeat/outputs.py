@@ -0,0 +1,453 @@
+"""Send one parsed stream to several outputs, each with its own queue and worker.
+
+Records are parsed once and handed to every configured output (Elasticsearch,
+an NDJSON archive, an HTTP collector) through a bounded queue per output. A
+worker thread per output batches and sends what its queue holds, so a slow
+sink only slows itself down. What a full queue does is the output's on_full
+policy: `block` holds up parsing until that output catches up, `drop` keeps
+parsing at the pace of the other outputs and counts what it discards.
+
+Registry offsets advance past a record once every `block` output has
+acknowledged it or rejected it for good; `drop` outputs are best effort and
+never hold offsets back. Rejected records go to the output's dead_letter file.
+When a `block` output fails, it stops sending for the rest of the harvest and
+ingest_harvest raises OutputUnavailable once the acknowledged offsets are
+committed; the caller reads the rest again later, which the other outputs may
+then receive twice.
+"""
+import abc
+import gzip
+import inspect
+import os
+import queue
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from rosbeat.metrics import METRICS
+from rosbeat.ndjson import NdjsonWriter, append_rejected, encode, open_binary
+
+POLICIES = ('block', 'drop')
+
+# Records handed to the output queues at a time, so the queues are locked per chunk, not per record
+CHUNK = 256
+
+# Queued after a harvest so workers send what they hold without waiting for linger
+FLUSH = ()
+
+class OutputUnavailable(RuntimeError):
+    """Raised by Fanout.ingest_harvest when a `block` output failed to send part of the harvest."""
+
+class Output(abc.ABC):
+    """Base class: subclasses implement send(batch) and may override close()."""
+
+    name = 'output'
+
+    def __init__(self, queue_size=10000, batch_size=500, linger=1.0, on_full='block', dead_letter=None):
+        if on_full not in POLICIES:
+            raise ValueError(f"outputs.{self.name}.on_full must be one of {', '.join(POLICIES)}, not {on_full!r}")
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.linger = linger
+        self.on_full = on_full
+        self.dead_letter = os.path.expanduser(dead_letter) if dead_letter else None
+
+    @abc.abstractmethod
+    def send(self, batch):
+        """Deliver a list of (meta, record) pairs; yield (meta, ok, error) for each, in order.
+
+        ok=False means the record was rejected for good. Failures that may
+        pass on a later run (the sink is down or busy) are raised instead.
+        """
+
+    def reject(self, log, error):
+        if self.dead_letter is not None:
+            append_rejected(self.dead_letter, log, error)
+
+    def close(self):
+        pass
+
+    def describe(self):
+        return self.name
+
+class ElasticsearchOutput(Output):
+    """Ship through an ElasticsearchIngester, or into the disk spool whose drainer ships it."""
+
+    name = 'elasticsearch'
+
+    def __init__(self, ingester, spool=None, **options):
+        # Enough for the ingester to keep max_in_flight bulk requests going within one batch
+        options.setdefault('batch_size', ingester.batch_size * ingester.max_in_flight)
+        options.setdefault('dead_letter', ingester.dead_letter)
+        super().__init__(**options)
+        self.ingester = ingester
+        self.spool = spool
+
+    def send(self, batch):
+        if self.spool is None:
+            for meta, ok, error in self.ingester.bulk(batch):
+                if not ok and self.ingester.is_retryable(error):
+                    raise RuntimeError(f"Elasticsearch did not accept a record: {error}")
+                yield meta, ok, error
+            return
+        # Spooled records count as delivered once fsynced; SpoolFull fails the batch
+        self.spool.append(((None, 0, log) for _, log in batch), batch_size=self.batch_size)
+        for meta, _ in batch:
+            yield meta, True, None
+
+    def describe(self):
+        target = f"index '{self.ingester.index_label}'"
+        return f"{self.name} ({target} via spool)" if self.spool is not None else f"{self.name} ({target})"
+
+class NdjsonOutput(Output):
+    """Append records to an NDJSON archive, compressed by its suffix (.gz, .xz, .zst).
+
+    Each batch is flushed and fsynced before it counts as delivered. xz keeps
+    its last block in memory until the file is closed, so archives written by
+    `watch` are better off as .gz or .zst.
+    """
+
+    name = 'ndjson'
+
+    def __init__(self, path, **options):
+        super().__init__(**options)
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.stream = open_binary(self.path, 'ab')
+        self.writer = NdjsonWriter(self.stream)
+
+    def send(self, batch):
+        for _, log in batch:
+            self.writer.write(log)
+        self.stream.flush()
+        fileno = getattr(self.stream, 'fileno', None)
+        if fileno is not None:
+            try:
+                os.fsync(fileno())
+            except (OSError, ValueError):
+                # Compressed writers may not expose a real descriptor
+                pass
+        for meta, _ in batch:
+            yield meta, True, None
+
+    def close(self):
+        self.stream.close()
+
+    def describe(self):
+        return f"{self.name} ({self.path})"
+
+class HttpOutput(Output):
+    """POST batches as NDJSON to an HTTP collector, retrying 429s, 5xx and connection errors.
+
+    Any other 4xx answer rejects the batch for good.
+    """
+
+    name = 'http'
+
+    def __init__(self, url, headers=None, timeout=10, compress=False, max_retries=3, initial_backoff=0.5,
+                 max_backoff=10, **options):
+        super().__init__(**options)
+        self.url = url
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self.compress = compress
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+    def send(self, batch):
+        body = b''.join(encode(log) for _, log in batch)
+        headers = dict(self.headers, **{'Content-Type': 'application/x-ndjson'})
+        if self.compress:
+            body = gzip.compress(body, compresslevel=6)
+            headers['Content-Encoding'] = 'gzip'
+        attempt = 0
+        while True:
+            request = urllib.request.Request(self.url, data=body, headers=headers, method='POST')
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    response.read()
+                break
+            except urllib.error.HTTPError as e:
+                if e.code != 429 and e.code < 500:
+                    for meta, _ in batch:
+                        yield meta, False, f"HTTP {e.code}"
+                    return
+                if attempt >= self.max_retries:
+                    raise
+            except OSError:
+                # URLError, timeouts and refused connections
+                if attempt >= self.max_retries:
+                    raise
+            delay = min(self.max_backoff, self.initial_backoff * (2 ** attempt))
+            time.sleep(delay * random.uniform(0.5, 1.0))
+            attempt += 1
+        for meta, _ in batch:
+            yield meta, True, None
+
+    def describe(self):
+        return f"{self.name} ({self.url})"
+
+class _Worker:
+    """One output's bounded queue and the thread that drains it."""
+
+    def __init__(self, output):
+        self.output = output
+        # Chunks, so queue_size counts records
+        self.queue = queue.Queue(maxsize=max(1, output.queue_size // CHUNK))
+        # file_path -> end offset of the last record delivered or rejected for good
+        self.acked = {}
+        self.sent = self.failed = self.dropped = 0
+        self.error = None
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name=f'rosbeat-output-{output.name}', daemon=True)
+        self.thread.start()
+
+    def put(self, chunk):
+        """Queue a chunk; with on_full: drop, a full queue discards it instead of waiting."""
+        if self.output.on_full == 'block':
+            self.queue.put(chunk)
+        else:
+            try:
+                self.queue.put_nowait(chunk)
+            except queue.Full:
+                if chunk is FLUSH:
+                    return
+                self.dropped += len(chunk)
+                METRICS.inc('rosbeat_output_records_total', len(chunk), output=self.output.name, result='dropped')
+                return
+        METRICS.set('rosbeat_queue_depth', self.queue.qsize() * CHUNK, queue=f'output_{self.output.name}')
+
+    def _batches(self):
+        """Yield (records, chunks taken) once batch_size records are queued, linger has passed or FLUSH arrives.
+
+        Chunks are marked done only after their batch is sent, so joining the
+        queue waits for delivery.
+        """
+        batch = []
+        taken = 0
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                chunk = self.queue.get(timeout=timeout)
+                taken += 1
+            except queue.Empty:
+                chunk = FLUSH
+            if chunk is None:
+                yield batch, taken
+                return
+            if chunk is not FLUSH:
+                batch.extend(chunk)
+                if deadline is None:
+                    deadline = time.monotonic() + self.output.linger
+                if len(batch) < self.output.batch_size:
+                    continue
+            yield batch, taken
+            batch = []
+            taken = 0
+            deadline = None
+
+    def _run(self):
+        size = self.output.batch_size
+        for batch, taken in self._batches():
+            try:
+                # Chunks can take a batch past batch_size; send it in pieces of at most that many
+                for start in range(0, len(batch), size):
+                    # Once the output is down, keep draining so producers never wait on it
+                    if self.error is None:
+                        self._send(batch[start:start + size])
+            finally:
+                for _ in range(taken):
+                    self.queue.task_done()
+                METRICS.set('rosbeat_queue_depth', self.queue.qsize() * CHUNK, queue=f'output_{self.output.name}')
+
+    def _send(self, batch):
+        name = self.output.name
+        started = time.perf_counter()
+        try:
+            results = list(self.output.send([((file_path, end), log) for file_path, end, log in batch]))
+        except Exception as e:
+            self.error = e
+            print(f"[ERROR] Output {self.output.describe()} failed: {e}; its records are not acknowledged.")
+            return
+        METRICS.observe('rosbeat_output_batch_seconds', time.perf_counter() - started)
+        failed = 0
+        for (file_path, _, log), (_, ok, error) in zip(batch, results):
+            if not ok:
+                if not self.failed and not failed:
+                    print(f"[WARN] {name} rejected a record from {file_path}: {error}")
+                failed += 1
+                self.output.reject(log, error)
+        # Rejected records are set aside, so they don't hold their file's offset back
+        with self.lock:
+            for file_path, end, _ in batch:
+                if file_path is not None:
+                    self.acked[file_path] = end
+        sent = len(batch) - failed
+        self.sent += sent
+        self.failed += failed
+        METRICS.inc('rosbeat_output_records_total', sent, output=name, result='sent')
+        if failed:
+            METRICS.inc('rosbeat_output_records_total', failed, output=name, result='failed')
+
+class Fanout:
+    """Feed a harvest to several outputs at once; a drop-in for ElasticsearchIngester's ingest methods."""
+
+    def __init__(self, outputs):
+        if not outputs:
+            raise ValueError("no outputs are enabled")
+        self.outputs = outputs
+        self.workers = [_Worker(output) for output in outputs]
+        self._blocking = [worker for worker in self.workers if worker.output.on_full == 'block']
+        # file_path -> end offset of the last record queued; used when no output holds offsets back
+        self._queued = {}
+
+    def _feed(self, harvest, registry):
+        # Every harvest gives an output that failed before another try
+        for worker in self.workers:
+            worker.error = None
+        count = 0
+        chunk = []
+        for triple in harvest:
+            chunk.append(triple)
+            if len(chunk) >= CHUNK:
+                count += self._put(chunk, registry)
+                chunk = []
+        if chunk:
+            count += self._put(chunk, registry)
+        for worker in self.workers:
+            worker.put(FLUSH)
+        # Everything queued for a blocking output must be acknowledged before offsets are final
+        for worker in self._blocking:
+            worker.queue.join()
+        if registry is not None:
+            self._commit(registry)
+        return count
+
+    def _put(self, chunk, registry):
+        for worker in self.workers:
+            worker.put(chunk)
+        for file_path, end, _ in chunk:
+            self._queued[file_path] = end
+        if registry is not None:
+            self._commit(registry)
+        return len(chunk)
+
+    def _commit(self, registry):
+        """Advance each file to the offset every blocking output has acknowledged."""
+        if not self._blocking:
+            committed = dict(self._queued)
+        else:
+            committed = None
+            for worker in self._blocking:
+                with worker.lock:
+                    acked = dict(worker.acked)
+                if committed is None:
+                    committed = acked
+                else:
+                    committed = {path: min(end, acked[path]) for path, end in committed.items() if path in acked}
+        for file_path, end in committed.items():
+            if file_path is not None:
+                registry.advance(file_path, end)
+
+    def ingest_harvest(self, harvest, registry, quiet=False):
+        """Queue (file_path, end_offset, record) triples for every output and commit acknowledged offsets.
+
+        Raises OutputUnavailable if a `block` output failed, after committing
+        what every `block` output acknowledged before it did.
+        """
+        if not quiet:
+            print(f"[INFO] Shipping new logs to {', '.join(output.describe() for output in self.outputs)}...")
+        try:
+            count = self._feed(harvest, registry)
+        finally:
+            registry.save()
+        if not quiet:
+            self._report(count)
+        failed = [worker for worker in self._blocking if worker.error is not None]
+        if failed:
+            raise OutputUnavailable('; '.join(f"{worker.output.describe()}: {worker.error}" for worker in failed))
+        return count
+
+    def ingest_logs(self, logs):
+        """Queue records without registry tracking."""
+        print(f"[INFO] Shipping logs to {', '.join(output.describe() for output in self.outputs)}...")
+        count = self._feed(((None, 0, log) for log in logs), None)
+        self._report(count)
+        return count
+
+    def _report(self, count):
+        if not count:
+            print("[INFO] No new logs to ship.")
+            return
+        print(f"[INFO] Queued {count} logs.")
+        for worker in self.workers:
+            if worker.error is not None and worker.output.on_full == 'block':
+                print(f"[WARN] {worker.output.name} is unavailable; the next run sends these logs again.")
+            if worker.failed:
+                where = f"; see {worker.output.dead_letter}" if worker.output.dead_letter else ""
+                print(f"[WARN] {worker.output.name}: {worker.failed} logs were rejected for good{where}.")
+            if worker.dropped:
+                print(f"[WARN] {worker.output.name}: dropped {worker.dropped} logs while its queue was full.")
+
+    def close(self, timeout=10):
+        """Let every output finish its queue and close it; drop outputs get `timeout` seconds."""
+        for worker in self.workers:
+            if worker.output.on_full == 'block':
+                worker.queue.put(None)
+                worker.thread.join()
+            else:
+                try:
+                    worker.queue.put(None, timeout=timeout)
+                except queue.Full:
+                    pass
+                worker.thread.join(timeout)
+            if worker.thread.is_alive():
+                print(f"[WARN] {worker.output.describe()} did not finish within {timeout}s; "
+                      f"{worker.queue.qsize() * CHUNK} queued logs are dropped.")
+                continue
+            worker.output.close()
+            print(f"[INFO] {worker.output.describe()}: {worker.sent} logs sent.")
+
+def _options(name):
+    """Settings an output accepts: its own arguments plus the queue settings of Output."""
+    options = set(inspect.signature(Output).parameters)
+    options.update(inspect.signature(OUTPUTS[name]).parameters)
+    return options - {'ingester', 'spool', 'options'}
+
+def validate(section):
+    """Raise ValueError for unknown outputs, unknown settings or a bad on_full policy."""
+    for name, settings in (section or {}).items():
+        if name not in OUTPUTS:
+            raise ValueError(f"Unknown output {name!r}; expected one of {', '.join(OUTPUTS)}")
+        settings = dict(settings or {})
+        settings.pop('enabled', None)
+        unknown = set(settings) - _options(name)
+        if unknown:
+            raise ValueError(f"Unknown outputs.{name} option(s): {', '.join(sorted(unknown))}")
+        if settings.get('on_full', 'block') not in POLICIES:
+            raise ValueError(f"outputs.{name}.on_full must be one of {', '.join(POLICIES)}, "
+                             f"not {settings['on_full']!r}")
+
+def from_config(section, ingester=None, spool=None):
+    """Build the enabled outputs of the `outputs` config section.
+
+    The Elasticsearch output's connection and batching settings stay in the
+    `elasticsearch` section; the caller builds ingester from them.
+    """
+    validate(section)
+    outputs = []
+    for name, settings in {'elasticsearch': {}, **(section or {})}.items():
+        settings = dict(settings or {})
+        # Elasticsearch stays on unless turned off explicitly
+        if not settings.pop('enabled', name == 'elasticsearch'):
+            continue
+        if name == 'elasticsearch':
+            outputs.append(ElasticsearchOutput(ingester, spool, **settings))
+        else:
+            outputs.append(OUTPUTS[name](**settings))
+    return outputs
+
+OUTPUTS = {'elasticsearch': ElasticsearchOutput, 'ndjson': NdjsonOutput, 'http': HttpOutput}
@@ -0,0 +1,157 @@
+import os
+import pickle
+import queue
+from collections import deque
+from rosbeat.formats import harvest_log, is_record_start
+from rosbeat.metrics import METRICS
+from rosbeat.reader import is_compressed
+
+# Large files are cut into chunks of roughly this size so one rosout.log can use every core
+DEFAULT_CHUNK_BYTES = 4 * 1024 * 1024
+
+# Records an archive's worker sends back at a time, and how many such batches may wait unread
+ARCHIVE_BATCH = 1000
+ARCHIVE_QUEUE = 4
+
+def split_file(file_path, start, stop, chunk_bytes=DEFAULT_CHUNK_BYTES, parse_line=None):
+    """Split the byte range [start, stop) of a file into chunks that end on line boundaries.
+
+    Given the file's line parser, a chunk never ends before a continuation
+    line, so a multi-line record stays in one chunk.
+    """
+    ranges = []
+    with open(file_path, 'rb') as f:
+        while start < stop:
+            cut = start + chunk_bytes
+            if cut < stop:
+                f.seek(cut)
+                f.readline()
+                cut = f.tell()
+                while parse_line is not None and cut < stop:
+                    line = f.readline()
+                    if is_record_start(parse_line, line):
+                        break
+                    cut = f.tell()
+            cut = min(cut, stop)
+            ranges.append((start, cut))
+            start = cut
+    return ranges
+
+def _harvest_chunk(task):
+    file_path, parse_line, start, stop, partial = task
+    records = list(harvest_log(file_path, parse_line, start, partial, stop))
+    # Worker counters travel back with the chunk and are merged into the parent's METRICS
+    return records, METRICS.drain()
+
+def _harvest_archive(task, results, cancelled):
+    """Parse a compressed file in a worker, sending its records back in batches through results."""
+    file_path, parse_line, start, _, partial = task
+
+    def put(item):
+        # A bounded queue: wait for the parent to catch up, unless it has stopped reading
+        while not cancelled.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    batch = []
+    for record in harvest_log(file_path, parse_line, start, partial):
+        batch.append(record)
+        if len(batch) >= ARCHIVE_BATCH:
+            # Pickled here so the manager process only passes bytes along
+            if not put(pickle.dumps(batch, pickle.HIGHEST_PROTOCOL)):
+                return METRICS.drain()
+            batch = []
+    if batch:
+        put(pickle.dumps(batch, pickle.HIGHEST_PROTOCOL))
+    put(None)
+    return METRICS.drain()
+
+def _chunk_tasks(files, chunk_bytes, partial):
+    for label, file_path, parse_line, offset in files:
+        print(f"[INFO] Parsing {label}...")
+        if is_compressed(file_path):
+            # A compressed stream can't be entered mid-way; no stop means one worker streams it whole
+            yield file_path, parse_line, offset, None, partial
+            continue
+        for start, stop in split_file(file_path, offset, os.path.getsize(file_path), chunk_bytes, parse_line):
+            yield file_path, parse_line, start, stop, partial
+
+def _results(future, results):
+    """Yield (end, record) for a task: its chunk's records, or an archive's batches as they arrive."""
+    if results is not None:
+        while True:
+            try:
+                batch = results.get(timeout=0.1)
+            except queue.Empty:
+                if future.done():
+                    # Raises if the worker failed; otherwise its last batches are still on the way
+                    future.result()
+                continue
+            if batch is None:
+                break
+            yield from pickle.loads(batch)
+        METRICS.merge(future.result())
+        return
+    records, counts = future.result()
+    METRICS.merge(counts)
+    yield from records
+
+def harvest_files(files, workers=1, chunk_bytes=DEFAULT_CHUNK_BYTES, partial=True):
+    """Yield (file_path, end_offset, record) for (label, path, line_parser, offset) entries.
+
+    With more than one worker, chunks are parsed in a process pool. Results are
+    still yielded in file and line order, and at most two chunks per worker are
+    held in memory at a time. Compressed files can't be chunked: each is
+    streamed by one worker, so independent archives decompress in parallel,
+    and sent back in batches of ARCHIVE_BATCH records, at most ARCHIVE_QUEUE
+    batches ahead of this process, so memory stays bounded however large the
+    archive.
+    """
+    if workers <= 1:
+        for label, file_path, parse_line, offset in files:
+            print(f"[INFO] Parsing {label}...")
+            for end, log in harvest_log(file_path, parse_line, offset, partial):
+                yield file_path, end, log
+        return
+
+    # Imported here so single-process runs don't pay for multiprocessing at startup
+    from concurrent.futures import ProcessPoolExecutor
+    manager = cancelled = None
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=METRICS.reset) as pool:
+            try:
+                in_flight = deque()
+                for task in _chunk_tasks(files, chunk_bytes, partial):
+                    if task[3] is None:
+                        if manager is None:
+                            # Queues a pool task can be handed; started only for sessions with archives
+                            from multiprocessing import Manager
+                            manager = Manager()
+                            cancelled = manager.Event()
+                        results = manager.Queue(ARCHIVE_QUEUE)
+                        future = pool.submit(_harvest_archive, task, results, cancelled)
+                    else:
+                        results = None
+                        future = pool.submit(_harvest_chunk, task)
+                    in_flight.append((task[0], future, results))
+                    if len(in_flight) < workers * 2:
+                        continue
+                    file_path, future, results = in_flight.popleft()
+                    for end, log in _results(future, results):
+                        yield file_path, end, log
+
+                while in_flight:
+                    file_path, future, results = in_flight.popleft()
+                    for end, log in _results(future, results):
+                        yield file_path, end, log
+            finally:
+                if cancelled is not None:
+                    # Lets archive workers blocked on a full queue return if we stopped early
+                    cancelled.set()
+    finally:
+        if manager is not None:
+            manager.shutdown()
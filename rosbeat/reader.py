@@ -0,0 +1,242 @@
+import gzip
+import io
+import lzma
+import mmap
+import os
+import re
+import threading
+from queue import Empty, Full, Queue
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Bytes of a file mapped at a time; keeps multi-GB logs mappable on 32-bit robots
+MMAP_WINDOW = 64 * 1024 * 1024
+# Bytes decoded at a time; lines are matched in place inside each decoded block
+BLOCK_BYTES = 1024 * 1024
+# Decompressed blocks read ahead of the parser by the background thread
+PREFETCH_BLOCKS = 4
+
+COMPRESSED_SUFFIXES = ('.gz', '.xz', '.zst')
+
+# rosout.log, rosout.log.3, talker-1.log.gz, rosout.log.2.xz, ...
+_LOG_NAME = re.compile(r'(.*?)(?:\.(\d+))?(\.gz|\.xz|\.zst)?$')
+
+def split_log_name(fname):
+    """Split a file name into (base name, rotation generation, compression suffix).
+
+    The live file is generation 0; rosout.log.1 is the most recently rotated.
+    """
+    base, generation, compression = _LOG_NAME.match(fname).groups()
+    return base, int(generation or 0), compression or ''
+
+def rotation_order(fname):
+    """Sort key that lists each rotation chain oldest-first, ending with the live file."""
+    base, generation, _ = split_log_name(fname)
+    return base, -generation
+
+def is_compressed(file_path):
+    return file_path.endswith(COMPRESSED_SUFFIXES)
+
+def require_zstandard():
+    if zstandard is None:
+        raise RuntimeError("zstd compression needs the 'zstandard' package (pip install rosbeat[zstd])")
+
+def open_log(file_path):
+    """Open a file for binary reading, decompressing .gz, .xz and .zst transparently."""
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, 'rb')
+    if file_path.endswith('.xz'):
+        return lzma.open(file_path, 'rb')
+    if file_path.endswith('.zst'):
+        require_zstandard()
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'), closefd=True))
+    return open(file_path, 'rb')
+
+def read_lines(file_path, offset=0, partial=True, stop=None):
+    """Yield (end_offset, line) pairs from a file, starting at a byte offset.
+
+    With partial=False a trailing line without a newline is left for the next
+    read, so offsets only ever point at line boundaries. Reading ends at the
+    first line boundary at or after stop, if given.
+    """
+    with open_log(file_path) as f:
+        f.seek(offset)
+        for raw in f:
+            if stop is not None and offset >= stop:
+                break
+            if not partial and not raw.endswith(b'\n'):
+                break
+            offset += len(raw)
+            yield offset, raw.decode('utf-8', errors='replace')
+
+def mapped_blocks(file_path, offset=0, partial=True, stop=None, block=BLOCK_BYTES, window=MMAP_WINDOW):
+    """Yield (data, base) blocks of whole lines from a memory-mapped file.
+
+    data is the bytes at file offset base, ending on a line boundary; only the
+    file's last block may end mid-line, and only with partial=True. The file
+    is mapped window bytes at a time. Offsets, partial and stop behave as in
+    read_lines.
+    """
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if stop is None or stop > size:
+            stop = size
+        pos = offset
+        while pos < stop:
+            # Map offsets must be multiples of the allocation granularity
+            base = pos - pos % mmap.ALLOCATIONGRANULARITY
+            length = min(size - base, window)
+            with mmap.mmap(f.fileno(), length, access=mmap.ACCESS_READ, offset=base) as buf:
+                if hasattr(buf, 'madvise'):
+                    buf.madvise(mmap.MADV_SEQUENTIAL)
+                start = pos - base
+                limit = stop - base
+                while start < limit:
+                    cut = buf.rfind(b'\n', start, min(start + block, limit, length))
+                    if cut >= 0:
+                        cut += 1
+                    else:
+                        cut = buf.find(b'\n', start)
+                        if cut >= 0:
+                            cut += 1
+                        elif base + length < size:
+                            # The line runs past this window; remap from its start
+                            break
+                        elif partial:
+                            cut = length
+                        else:
+                            return
+                    yield buf[start:cut], base + start
+                    start = cut
+            if base + start == pos:
+                # One line longer than the whole window; map a bigger one
+                window *= 2
+            pos = base + start
+
+def stream_blocks(file_path, offset=0, partial=True, stop=None, block=BLOCK_BYTES):
+    """Yield (data, base) blocks of whole lines from a compressed file, as mapped_blocks does.
+
+    Offsets count decompressed bytes; reaching offset means decompressing
+    everything before it.
+    """
+    with open_log(file_path) as f:
+        remaining = offset
+        while remaining > 0:
+            skipped = f.read(min(remaining, block))
+            if not skipped:
+                return
+            remaining -= len(skipped)
+
+        pos = offset
+        carry = b''
+        while stop is None or pos < stop:
+            chunk = f.read(block)
+            if not chunk:
+                if carry and partial:
+                    yield carry, pos
+                return
+            data = carry + chunk
+            cut = data.rfind(b'\n') + 1
+            if stop is not None and pos + cut > stop:
+                # End at the first line boundary at or after stop
+                cut = data.find(b'\n', stop - pos - 1) + 1
+            if cut == 0:
+                carry = data
+                continue
+            yield data[:cut], pos
+            pos += cut
+            carry = data[cut:]
+
+def prefetch(blocks, depth=PREFETCH_BLOCKS):
+    """Pull from an iterator in a background thread, up to depth items ahead of the consumer.
+
+    zlib, lzma and zstd release the GIL while decompressing, so this moves
+    decompression off the core that parses.
+    """
+    queue = Queue(depth)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in blocks:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except BaseException as e:
+            put((done, e))
+        finally:
+            blocks.close()
+
+    thread = threading.Thread(target=produce, name='rosbeat-prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            try:
+                item, error = queue.get(timeout=0.1)
+            except Empty:
+                if not thread.is_alive():
+                    return
+                continue
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stopped.set()
+        thread.join()
+
+def read_blocks(file_path, offset=0, partial=True, stop=None):
+    """Yield (data, base) blocks of whole lines: mapped for plain files, streamed for compressed ones."""
+    if is_compressed(file_path):
+        # Compressed files are finished archives, so a last line without a newline is complete
+        return prefetch(stream_blocks(file_path, offset, True, stop))
+    return mapped_blocks(file_path, offset, partial, stop)
+
+def block_lines(data):
+    """Yield (text, start, end, following) for each line of a block from mapped_blocks.
+
+    text[start:end] is the decoded line without its line ending (\\n or \\r\\n)
+    and following is the byte offset within data just past it. ASCII blocks
+    (the usual case) are decoded once and every line is a span of the same
+    string; otherwise each line is decoded on its own so byte offsets stay
+    exact.
+    """
+    text = data.decode('utf-8', errors='replace')
+    if text.isascii():
+        find = text.find
+        size = len(text)
+        start = 0
+        while start < size:
+            end = find('\n', start)
+            following = size if end < 0 else end + 1
+            if end < 0:
+                end = size
+            if end > start and text[end - 1] == '\r':
+                end -= 1
+            yield text, start, end, following
+            start = following
+        return
+
+    following = 0
+    for raw in data.split(b'\n'):
+        if following == len(data):
+            return
+        following = min(following + len(raw) + 1, len(data))
+        if raw.endswith(b'\r'):
+            raw = raw[:-1]
+        line = raw.decode('utf-8', errors='replace')
+        yield line, 0, len(line), following
@@ -0,0 +1,65 @@
+class LogRecord:
+    """One parsed log line.
+
+    Uses __slots__ instead of a per-line dict, and the parsers intern the
+    fields that repeat across lines (levels, node names, topics), so a record
+    costs a fixed small object plus its own message and timestamp. It only
+    becomes a dict when serialized, via to_dict().
+    """
+
+    __slots__ = ('timestamp', 'log_level', 'node_name', 'log_message', 'log_type',
+                 'source_file', 'topics', 'source_code', 'epoch_millis', 'repeat_count')
+
+    def __init__(self, timestamp, log_level, node_name, log_message, log_type, source_file,
+                 topics=None, source_code=None, epoch_millis=None, repeat_count=None):
+        self.timestamp = timestamp
+        self.log_level = log_level
+        self.node_name = node_name
+        self.log_message = log_message
+        self.log_type = log_type
+        self.source_file = source_file
+        self.topics = topics
+        self.source_code = source_code
+        self.epoch_millis = epoch_millis
+        # Set by the duplicate-collapsing filter on the first record of a run of repeats
+        self.repeat_count = repeat_count
+
+    def to_dict(self):
+        # Key order matches the dicts the parsers used to build, so JSON output is unchanged
+        if self.topics is not None:
+            log = {
+                "timestamp": self.timestamp,
+                "log_level": self.log_level,
+                "node_name": self.node_name,
+                "log_message": self.log_message,
+                "source_file": self.source_file,
+                "log_type": self.log_type,
+                "topics": self.topics,
+                "source_code": self.source_code,
+            }
+        else:
+            log = {
+                "timestamp": self.timestamp,
+                "log_level": self.log_level,
+                "node_name": self.node_name,
+                "log_message": self.log_message,
+                "log_type": self.log_type,
+                "source_file": self.source_file,
+            }
+        if self.epoch_millis is not None:
+            log["@timestamp"] = self.epoch_millis
+        if self.repeat_count is not None:
+            log["repeat_count"] = self.repeat_count
+        return log
+
+    def __eq__(self, other):
+        if not isinstance(other, LogRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"LogRecord({self.to_dict()!r})"
+
+def as_dict(log):
+    """Serialize a LogRecord; dicts from custom formats pass through unchanged."""
+    return log.to_dict() if isinstance(log, LogRecord) else log
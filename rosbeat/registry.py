@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+from rosbeat.reader import is_compressed, open_log
+
+# Number of head bytes hashed to tell a rotated or replaced file from the one we saw last
+FINGERPRINT_BYTES = 1024
+
+def file_fingerprint(file_path, length=FINGERPRINT_BYTES):
+    # Compressed files are fingerprinted by their decompressed head, so an archived copy matches the original
+    with open_log(file_path) as f:
+        return hashlib.sha1(f.read(length)).hexdigest()
+
+def _head_size(file_path, stat):
+    if not is_compressed(file_path):
+        return min(stat.st_size, FINGERPRINT_BYTES)
+    with open_log(file_path) as f:
+        return len(f.read(FINGERPRINT_BYTES))
+
+class Registry:
+    """Filebeat-style registry of per-file harvest state, persisted as JSON.
+
+    Each entry records the file's inode, device, size, a fingerprint of its
+    head bytes and the last offset Elasticsearch has acknowledged. Offsets in
+    compressed files count decompressed bytes, and since their decompressed
+    size is only known once read, they also record stream_size when done.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.entries = json.load(f).get('files', {})
+
+    def _matches(self, entry, stat, file_path):
+        length = entry.get('fingerprint_size', 0)
+        if stat.st_size < length and not is_compressed(file_path):
+            return False
+        if file_fingerprint(file_path, length) != entry.get('fingerprint'):
+            return False
+        same_inode = entry.get('inode') == stat.st_ino and entry.get('device') == stat.st_dev
+        # A full-length fingerprint identifies content even if the file was copied
+        return same_inode or length == FINGERPRINT_BYTES
+
+    def _find_moved(self, stat, file_path):
+        # A rotated file keeps its inode under a new name, e.g. rosout.log -> rosout.log.1;
+        # a compressed archive of it (rosout.log.1.gz) only keeps its content
+        content = file_fingerprint(file_path) if is_compressed(file_path) else None
+        for path, entry in self.entries.items():
+            if path == file_path:
+                continue
+            if entry.get('inode') == stat.st_ino and entry.get('device') == stat.st_dev \
+                    and self._matches(entry, stat, file_path):
+                return entry
+            if content is not None and entry.get('fingerprint_size') == FINGERPRINT_BYTES \
+                    and entry.get('fingerprint') == content:
+                return entry
+        return None
+
+    def resume_offset(self, file_path):
+        """Return the byte offset to resume file_path from, and start tracking it."""
+        stat = os.stat(file_path)
+        entry = self.entries.get(file_path)
+        if entry is None or not self._matches(entry, stat, file_path):
+            entry = self._find_moved(stat, file_path)
+
+        offset = entry['offset'] if entry else 0
+        if offset > stat.st_size and not is_compressed(file_path):
+            # Truncated in place (copytruncate): start again from the top
+            offset = 0
+
+        length = _head_size(file_path, stat)
+        self.entries[file_path] = {
+            'inode': stat.st_ino,
+            'device': stat.st_dev,
+            'size': stat.st_size,
+            'fingerprint': file_fingerprint(file_path, length),
+            'fingerprint_size': length,
+            'offset': offset,
+        }
+        if entry and 'stream_size' in entry and is_compressed(file_path):
+            self.entries[file_path]['stream_size'] = entry['stream_size']
+        return offset
+
+    def unread(self, file_path):
+        """Whether file_path, already passed to resume_offset, has data past its committed offset."""
+        entry = self.entries[file_path]
+        if is_compressed(file_path):
+            return entry['offset'] < entry.get('stream_size', float('inf'))
+        return entry['offset'] < entry['size']
+
+    def finish_stream(self, file_path, stream_size):
+        """Record that a compressed file holds nothing to ship past stream_size."""
+        self.entries[file_path]['stream_size'] = stream_size
+
+    def advance(self, file_path, offset):
+        """Move the committed offset forward once the data before it is acknowledged."""
+        entry = self.entries[file_path]
+        if offset > entry['offset']:
+            entry['offset'] = offset
+            entry['size'] = max(entry['size'], offset)
+
+    def unshipped_bytes(self):
+        """Bytes written to tracked plain files past their committed offsets.
+
+        Growing while logs are being written means ingestion is falling behind.
+        """
+        total = 0
+        # Copied because the metrics endpoint calls this from its own thread
+        for path, entry in list(self.entries.items()):
+            if is_compressed(path):
+                continue
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            total += max(0, size - entry['offset'])
+        return total
+
+    def prune(self):
+        """Forget files that no longer exist."""
+        for path in [p for p in self.entries if not os.path.exists(p)]:
+            del self.entries[path]
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': 1, 'files': self.entries}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,202 @@
+"""Per-window summaries of parsed records, for dashboards that don't need every line.
+
+Records are grouped by source file, time window (by log timestamp), log type,
+node and level. Each group keeps a count, its first and last timestamps, a
+bounded top-N of messages (Space-Saving) and a distinct-message estimate
+(k minimum values), so memory depends on the number of nodes and levels, not
+on the number of lines. Files are harvested one after another, so a file's
+groups are emitted as soon as that file moves past their window.
+
+Summaries are dicts with log_type "rollup"; the ingester sends them to the
+rollup index. Each carries the end offset of its last record, held back to
+where the oldest group of its file still open starts, so with mode "instead"
+the registry only moves past lines whose summary was shipped, even when a late
+record reopens an old window.
+"""
+import heapq
+from rosbeat.record import LogRecord
+from rosbeat.timestamps import epoch_to_iso, iso_to_millis
+
+MODES = ('off', 'alongside', 'instead')
+
+# Hash values compared by the distinct-message sketch
+_HASH_SPACE = 1 << 64
+
+class Summary:
+    __slots__ = ('count', 'first', 'last', 'begin', 'end', 'top', 'overcount', 'capacity', 'hashes', 'seen', 'k')
+
+    def __init__(self, top_n, k, begin=0):
+        self.count = 0
+        self.first = self.last = None
+        # Offset where the group's first record starts, and the end of its last one
+        self.begin = begin
+        self.end = 0
+        self.top = {}
+        # How much of each top count may belong to messages it evicted
+        self.overcount = {}
+        self.capacity = top_n * 4
+        # Max-heap (negated) of the k smallest message hashes seen, and the same values as a set
+        self.hashes = []
+        self.seen = set()
+        self.k = k
+
+    def add(self, timestamp, message, end):
+        self.count += 1
+        if self.first is None or timestamp < self.first:
+            self.first = timestamp
+        if self.last is None or timestamp > self.last:
+            self.last = timestamp
+        self.end = end
+
+        top = self.top
+        if message in top:
+            top[message] += 1
+        elif len(top) < self.capacity:
+            top[message] = 1
+        else:
+            # Space-Saving: the new message inherits the smallest counter, bounding its overestimate
+            smallest = min(top, key=top.get)
+            self.overcount.pop(smallest, None)
+            self.overcount[message] = floor = top.pop(smallest)
+            top[message] = floor + 1
+
+        h = hash(message) % _HASH_SPACE
+        if h in self.seen:
+            return
+        if len(self.hashes) < self.k:
+            heapq.heappush(self.hashes, -h)
+            self.seen.add(h)
+        elif h < -self.hashes[0]:
+            self.seen.discard(-heapq.heappushpop(self.hashes, -h))
+            self.seen.add(h)
+
+    def distinct(self):
+        if len(self.hashes) < self.k:
+            return len(self.hashes)
+        return round((self.k - 1) * _HASH_SPACE / -self.hashes[0])
+
+class Rollup:
+    """Turn a harvest into per-window summaries, alongside the raw records or instead of them."""
+
+    def __init__(self, mode='alongside', window=60, top_n=5, sketch_size=256):
+        if mode not in MODES:
+            raise ValueError(f"rollup.mode must be one of {', '.join(MODES)}, not {mode!r}")
+        if window <= 0:
+            raise ValueError("rollup.window must be positive")
+        self.mode = mode
+        self.window = window
+        self.window_ms = int(window * 1000)
+        self.top_n = top_n
+        self.sketch_size = sketch_size
+        # file_path -> {(window start, log_type, node, level): Summary}, and each file's newest window
+        self._open = {}
+        self._current = {}
+        # file_path -> end offset of the last record read, where the next one starts
+        self._ends = {}
+
+    @classmethod
+    def from_config(cls, section):
+        """Return a Rollup for the `rollup` config section, or None when it is off."""
+        section = dict(section or {})
+        section.pop('index', None)
+        # YAML reads a bare `off` as False
+        if section.get('mode') in (None, False, 'off'):
+            return None
+        return cls(**section)
+
+    def apply(self, harvest, flush=True):
+        """Summarize (file_path, end_offset, record) triples and yield triples for the output.
+
+        With flush=False, groups still open at the end stay open for the next
+        call (as `watch` does) and are emitted by a later record or expire().
+        """
+        alongside = self.mode == 'alongside'
+        window_ms = self.window_ms
+        for file_path, end, log in harvest:
+            if alongside:
+                yield file_path, end, log
+            if isinstance(log, LogRecord):
+                timestamp, log_type, node, level, message = (log.timestamp, log.log_type, log.node_name,
+                                                             log.log_level, log.log_message)
+            else:
+                timestamp, log_type, node, level, message = (log.get('timestamp'), log.get('log_type'),
+                                                             log.get('node_name'), log.get('log_level'),
+                                                             log.get('log_message'))
+            millis = iso_to_millis(timestamp)
+            begin = self._ends.get(file_path, 0)
+            self._ends[file_path] = end
+            current = self._current.get(file_path)
+            if millis is None:
+                if current is None:
+                    continue
+                start = current
+            else:
+                start = millis - millis % window_ms
+                if current is None or start > current:
+                    if current is not None:
+                        yield from self._close(file_path, start)
+                    self._current[file_path] = start
+
+            groups = self._open.setdefault(file_path, {})
+            key = (start, log_type, node, level)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = Summary(self.top_n, self.sketch_size, begin)
+            group.add(millis if millis is not None else start, message, end)
+
+        if flush:
+            yield from self.flush()
+
+    def _close(self, file_path, before):
+        """Emit the file's groups whose window starts before `before`, in offset order."""
+        groups = self._open.get(file_path, {})
+        done = [key for key in groups if key[0] < before]
+        closed = sorted(((key, groups.pop(key)) for key in done), key=lambda item: item[1].end)
+        for i, (key, summary) in enumerate(closed):
+            # Committing past the first record of a group not shipped yet would lose it if the process stopped now
+            waiting = [other.begin for _, other in closed[i + 1:]] + [other.begin for other in groups.values()]
+            end = min([summary.end] + waiting)
+            yield file_path, end, self._document(file_path, key, summary)
+        if not groups:
+            self._open.pop(file_path, None)
+
+    def flush(self):
+        """Emit every open group."""
+        for file_path in list(self._open):
+            yield from self._close(file_path, float('inf'))
+        self._current = {}
+        self._ends = {}
+
+    def expire(self, now):
+        """Emit groups whose window ended at least one window before now (epoch seconds)."""
+        cutoff = int(now * 1000) - self.window_ms * 2
+        for file_path in list(self._open):
+            yield from self._close(file_path, cutoff + 1)
+
+    def _document(self, file_path, key, summary):
+        start, log_type, node, level = key
+        top = sorted(summary.top.items(), key=lambda item: -item[1])[:self.top_n]
+        return {
+            "timestamp": _iso(start),
+            "window_end": _iso(start + self.window_ms),
+            "window_seconds": self.window,
+            "log_type": "rollup",
+            "source_log_type": log_type,
+            "node_name": node,
+            "log_level": level,
+            "source_file": file_path,
+            "count": summary.count,
+            "first_timestamp": _iso(summary.first),
+            "last_timestamp": _iso(summary.last),
+            "distinct_messages": summary.distinct(),
+            # count is an upper bound; count - error is a lower bound
+            "top_messages": [{"message": message, "count": count, "error": summary.overcount.get(message, 0)}
+                             for message, count in top],
+            "@timestamp": start,
+        }
+
+def _iso(millis):
+    return epoch_to_iso(f"{millis // 1000}.{millis % 1000:03d}")
+
+def is_summary(doc):
+    return doc.get("log_type") == "rollup"
@@ -0,0 +1,253 @@
+"""Durable on-disk queue between parsing and Elasticsearch.
+
+Parsed records are appended to NDJSON segment files in a spool directory and
+fsynced in batches; only then does the registry offset of their source file
+move forward, so parsing runs at disk speed whether or not the cluster is
+reachable. A drainer thread ships segments oldest-first and persists how far
+Elasticsearch has acknowledged after every batch. Fully shipped segments are
+deleted; the total size of unshipped segments is capped at max_bytes.
+"""
+import json
+import os
+import threading
+from rosbeat.metrics import METRICS
+from rosbeat.ndjson import append_rejected, decode, encode
+
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+class SpoolFull(Exception):
+    """Raised when a batch doesn't fit and the spool isn't draining."""
+
+class Spool:
+    def __init__(self, directory, segment_bytes=DEFAULT_SEGMENT_BYTES, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self._cond = threading.Condition()
+        self._closed = False
+        # Set while the drainer can't reach the cluster; a full spool then stops parsing instead of waiting
+        self.outage = False
+
+        self._state_path = os.path.join(directory, 'state.json')
+        self._head = (0, 0)
+        if os.path.exists(self._state_path):
+            with open(self._state_path, 'r') as f:
+                state = json.load(f)
+            self._head = (state['segment'], state['offset'])
+
+        segments = self._segments()
+        for seq in segments:
+            if seq < self._head[0]:
+                os.remove(self._segment_path(seq))
+        self._write_seq = max(segments + [self._head[0]])
+        self._write_size = self._recover(self._write_seq)
+        # Sizes of the finished segments still on disk, oldest first
+        self._sizes = {seq: os.path.getsize(self._segment_path(seq))
+                       for seq in segments if self._head[0] <= seq < self._write_seq}
+        self._writer = None
+        self._update_size()
+
+    def _segment_path(self, seq):
+        return os.path.join(self.directory, f"{seq:012d}.ndjson")
+
+    def _segments(self):
+        return sorted(int(fname[:-7]) for fname in os.listdir(self.directory)
+                      if fname.endswith('.ndjson') and fname[:-7].isdigit())
+
+    def _recover(self, seq):
+        """Cut a line torn by a crash off the end of the newest segment; return its size."""
+        path = self._segment_path(seq)
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'rb+') as f:
+            data = f.read()
+            size = data.rfind(b'\n') + 1
+            if size < len(data):
+                f.truncate(size)
+        return size
+
+    def _update_size(self):
+        # Bytes not yet acknowledged; called with the condition held or before threads start
+        self.pending_bytes = sum(self._sizes.values()) - self._head[1] + self._write_size
+        METRICS.set('rosbeat_spool_bytes', self.pending_bytes)
+
+    def append(self, harvest, registry=None, batch_size=500):
+        """Spool (file_path, end_offset, record) triples and return how many were spooled.
+
+        Every batch_size records are fsynced before the registry commits their
+        source offsets. When the spool is full this waits for the drainer, or
+        raises SpoolFull during an outage; batches already spooled stay
+        committed and the rest is read again on the next run.
+        """
+        count = 0
+        lines = []
+        offsets = {}
+        for file_path, end, log in harvest:
+            lines.append(encode(log))
+            offsets[file_path] = end
+            if len(lines) >= batch_size:
+                count += self._commit(lines, offsets, registry)
+                lines = []
+                offsets = {}
+        if lines:
+            count += self._commit(lines, offsets, registry)
+        if registry is not None:
+            registry.save()
+        return count
+
+    def _commit(self, lines, offsets, registry):
+        data = b''.join(lines)
+        with self._cond:
+            while self.pending_bytes and self.pending_bytes + len(data) > self.max_bytes:
+                if self.outage:
+                    raise SpoolFull(f"spool {self.directory} is full ({self.pending_bytes} bytes)")
+                self._cond.wait(1.0)
+
+            if self._writer is not None and self._write_size and self._write_size + len(data) > self.segment_bytes:
+                self._writer.close()
+                self._writer = None
+                self._sizes[self._write_seq] = self._write_size
+                self._write_seq += 1
+                self._write_size = 0
+            if self._writer is None:
+                self._writer = open(self._segment_path(self._write_seq), 'ab')
+            self._writer.write(data)
+            self._writer.flush()
+            os.fsync(self._writer.fileno())
+            self._write_size += len(data)
+            self._update_size()
+            self._cond.notify_all()
+
+        if registry is not None:
+            for file_path, end in offsets.items():
+                registry.advance(file_path, end)
+            registry.save()
+        return len(lines)
+
+    def _entries(self, follow):
+        """Yield ((segment, end_offset, line), record) from the acknowledged position onwards."""
+        seq, offset = self._head
+        while True:
+            with self._cond:
+                while True:
+                    if seq < self._write_seq:
+                        limit = self._sizes.get(seq, 0)
+                        break
+                    limit = self._write_size
+                    if offset < limit or not follow or self._closed:
+                        break
+                    self._cond.wait()
+            if offset >= limit:
+                if seq < self._write_seq:
+                    seq += 1
+                    offset = 0
+                    continue
+                return
+
+            with open(self._segment_path(seq), 'rb') as f:
+                f.seek(offset)
+                while offset < limit:
+                    line = f.readline()
+                    offset += len(line)
+                    if line.strip():
+                        yield (seq, offset, line), decode(line)
+
+    def _ack(self, seq, offset):
+        with self._cond:
+            self._head = (seq, offset)
+            self._update_size()
+            self._cond.notify_all()
+
+    def _save_state(self):
+        with self._cond:
+            seq, offset = self._head
+            # Segments the drainer has moved past are no longer needed
+            for done in [done for done in self._sizes if done < seq]:
+                del self._sizes[done]
+                os.remove(self._segment_path(done))
+            while seq < self._write_seq:
+                if offset < self._sizes.get(seq, 0):
+                    break
+                if self._sizes.pop(seq, None) is not None:
+                    os.remove(self._segment_path(seq))
+                seq, offset = seq + 1, 0
+            self._head = (seq, offset)
+            self._update_size()
+
+        tmp_path = self._state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'segment': seq, 'offset': offset}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._state_path)
+
+    def drain(self, ingester, follow=False):
+        """Ship spooled records to Elasticsearch, saving the acknowledged position after every batch.
+
+        Returns the number shipped once the spool is empty; with follow, waits
+        for more records until close() is called. Records Elasticsearch rejects
+        for good are moved to rejected.ndjson so they don't block the queue.
+        Errors reaching the cluster, and records it still refuses after the
+        ingester's retries, propagate; the acknowledged position stays before them.
+        """
+        count = failed = 0
+        try:
+            for (seq, end, line), ok, error in ingester.bulk(self._entries(follow)):
+                if ok:
+                    count += 1
+                elif ingester.is_retryable(error):
+                    raise RuntimeError(f"Elasticsearch did not accept a spooled record: {error}")
+                else:
+                    failed += 1
+                    self._reject(line, error)
+                self._ack(seq, end)
+                if (count + failed) % ingester.batch_size == 0:
+                    self._save_state()
+                    with self._cond:
+                        self.outage = False
+        finally:
+            self._save_state()
+        if failed:
+            print(f"[WARN] {failed} spooled logs were rejected; see {os.path.join(self.directory, 'rejected.ndjson')}")
+        return count
+
+    def _reject(self, line, error):
+        append_rejected(os.path.join(self.directory, 'rejected.ndjson'), decode(line), error)
+
+    def drain_forever(self, ingester, retry_interval=30):
+        """Drainer thread body: ship records as they are spooled, riding out cluster outages.
+
+        Returns once close() has been called and everything is shipped, or
+        when the cluster is unreachable after close(); what's left stays on
+        disk for the next run.
+        """
+        shipped = 0
+        while True:
+            try:
+                shipped += self.drain(ingester, follow=True)
+                break
+            except Exception as e:
+                with self._cond:
+                    if not self.outage:
+                        print(f"[WARN] Elasticsearch unavailable ({e}); spooling to {self.directory} "
+                              f"and retrying every {retry_interval}s.")
+                    self.outage = True
+                    self._cond.notify_all()
+                    if self._closed:
+                        break
+                    self._cond.wait(retry_interval)
+        if shipped:
+            print(f"[INFO] Shipped {shipped} spooled logs.")
+        return shipped
+
+    def close(self):
+        """Stop accepting records; a following drainer finishes what is spooled and returns."""
+        with self._cond:
+            self._closed = True
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            self._cond.notify_all()
@@ -0,0 +1,92 @@
+"""Merge every file of a session into one stream ordered by log timestamp.
+
+Each log file is already close to time order, so instead of sorting the
+session the files are merged with a heap: every file holds back only the
+records inside a short reorder window, which puts slightly out-of-order lines
+right, and the merge holds one record per file. Memory depends on the number
+of files and the window, not on the number of lines.
+"""
+import heapq
+import itertools
+from rosbeat.formats import harvest_log
+from rosbeat.metrics import METRICS
+from rosbeat.record import LogRecord
+from rosbeat.timestamps import iso_to_millis
+
+# Seconds a line may lag behind newer lines of the same file and still be put in order
+DEFAULT_REORDER_WINDOW = 2.0
+
+def _millis(log):
+    if isinstance(log, LogRecord):
+        return log.epoch_millis if log.epoch_millis is not None else iso_to_millis(log.timestamp)
+    return iso_to_millis(log.get('timestamp'))
+
+def _reorder(index, file_path, offset, harvest, window_ms):
+    """Yield (millis, index, seq, (file_path, end_offset, record)) for one file, in timestamp order.
+
+    A record is released once the file has reached a timestamp window_ms past
+    it. One that arrives later than the last released record is counted in
+    rosbeat_timeline_late_total and released with that record's timestamp, so
+    the stream stays sorted for the merge. Records without a timestamp follow
+    the record before them.
+
+    Records can leave in a different order than they were read, so the end
+    offset carried with each one is the end of the longest run of records,
+    from the start, that has been released: a registry or spool that commits
+    it never skips a record still held back here.
+    """
+    held = []
+    newest = last = 0
+    seq = released = 0
+    # End offsets of records released ahead of an older one still held, by sequence number
+    early = {}
+    safe = offset
+    late = 0
+    # The trailing None releases everything still held
+    for item in itertools.chain(harvest, (None,)):
+        if item is None:
+            newest = float('inf')
+        else:
+            end, log = item
+            millis = _millis(log)
+            if millis is None:
+                millis = newest
+            elif millis < last:
+                late += 1
+                millis = last
+            heapq.heappush(held, (millis, seq, end, log))
+            seq += 1
+            if millis > newest:
+                newest = millis
+        while held and held[0][0] <= newest - window_ms:
+            last, done, end, log = heapq.heappop(held)
+            if done == released:
+                safe = end
+                released += 1
+                while released in early:
+                    safe = early.pop(released)
+                    released += 1
+            else:
+                early[done] = end
+            yield last, index, done, (file_path, safe, log)
+    if late:
+        METRICS.inc('rosbeat_timeline_late_total', late)
+
+def merge_files(files, window=DEFAULT_REORDER_WINDOW, partial=True, filters=None):
+    """Yield (file_path, end_offset, record) for (label, path, line_parser, offset) entries in timestamp order.
+
+    Ties keep the order of files, then of lines. Filters run on each file
+    before the merge, so duplicate runs are collapsed within their own file.
+    Every file is read in this process; parse.workers does not apply.
+    """
+    window_ms = int(window * 1000)
+    streams = []
+    for index, (label, file_path, parse_line, offset) in enumerate(files):
+        print(f"[INFO] Merging {label}...")
+        harvest = ((file_path, end, log) for end, log in harvest_log(file_path, parse_line, offset, partial))
+        if filters is not None:
+            harvest = filters.apply(harvest)
+        harvest = ((end, log) for _, end, log in harvest)
+        streams.append(_reorder(index, file_path, offset, harvest, window_ms))
+    for _, _, _, harvested in heapq.merge(*streams):
+        yield harvested
@@ -0,0 +1,81 @@
+"""Timestamp conversion shared by all log formats.
+
+Consecutive log lines almost always fall in the same second, so the
+formatted "YYYY-MM-DDTHH:MM:SS" prefix is cached and only the sub-second
+part is formatted per line. The output is byte-identical to
+datetime.isoformat() + "Z" as the parsers produced it before.
+"""
+import math
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+ONE_SECOND = timedelta(seconds=1)
+
+# One-entry caches of (key, cached value)
+_epoch_cache = (None, None)
+_date_cache = (None, None)
+_iso_cache = (None, None)
+
+def _fraction(micros):
+    # isoformat() omits the fraction entirely when it is zero
+    return f".{micros:06d}Z" if micros else "Z"
+
+def epoch_to_iso(value):
+    """Convert an epoch-seconds string such as '1700000000.123456' to ISO 8601."""
+    global _epoch_cache
+    try:
+        frac, whole = math.modf(float(value))
+        # Same round-half-even step datetime.utcfromtimestamp() uses
+        micros = round(frac * 1e6)
+        seconds = int(whole)
+        if micros >= 1000000:
+            seconds += 1
+            micros -= 1000000
+        elif micros < 0:
+            seconds -= 1
+            micros += 1000000
+
+        cached_seconds, prefix = _epoch_cache
+        if seconds != cached_seconds:
+            prefix = (EPOCH + timedelta(seconds=seconds)).isoformat()
+            _epoch_cache = (seconds, prefix)
+    except (ValueError, OverflowError, OSError):
+        return None
+    return prefix + _fraction(micros)
+
+def date_to_iso(value):
+    """Convert a ROS 'YYYY-MM-DD HH:MM:SS,mmm' timestamp to ISO 8601."""
+    global _date_cache
+    if len(value) != 23 or value[19] != ',' or not (value[20:].isdigit() and value.isascii()):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d %H:%M:%S,%f').isoformat() + "Z"
+        except ValueError:
+            return None
+
+    key = value[:19]
+    cached_key, prefix = _date_cache
+    if key != cached_key:
+        try:
+            prefix = datetime.strptime(key, '%Y-%m-%d %H:%M:%S').isoformat()
+        except ValueError:
+            return None
+        _date_cache = (key, prefix)
+    millis = value[20:]
+    return prefix + ("Z" if millis == "000" else f".{millis}000Z")
+
+def iso_to_millis(value):
+    """Convert an ISO 8601 timestamp produced above to integer epoch milliseconds."""
+    global _iso_cache
+    if not value or len(value) < 20:
+        return None
+    key = value[:19]
+    cached_key, seconds = _iso_cache
+    if key != cached_key:
+        try:
+            # fromisoformat is implemented in C and far cheaper than strptime on a cache miss
+            seconds = (datetime.fromisoformat(key) - EPOCH) // ONE_SECOND
+        except ValueError:
+            return None
+        _iso_cache = (key, seconds)
+    fraction = value[20:23] if value[19] == '.' else ''
+    return seconds * 1000 + (int(fraction) if fraction else 0)
@@ -0,0 +1,324 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from rosbeat.formats import harvest_log, parser_for
+from rosbeat.metrics import METRICS
+from rosbeat.reader import is_compressed
+from rosbeat.spool import SpoolFull
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+# Seconds before re-reading after a batch couldn't be shipped, doubled per failure up to the maximum
+RETRY_BACKOFF = 1.0
+MAX_RETRY_BACKOFF = 60.0
+
+SESSION_EVENTS = IN_MODIFY | IN_CLOSE_WRITE | IN_CREATE | IN_MOVED_TO
+LINK_EVENTS = IN_CREATE | IN_DELETE | IN_MOVED_TO | IN_MOVED_FROM
+
+_EVENT = struct.Struct('iIII')
+
+class Inotify:
+    """Minimal ctypes binding to Linux inotify; no third-party dependency needed on the robot."""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        libc = ctypes.CDLL(libc_name, use_errno=True) if libc_name else None
+        if libc is None or not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify is not available on this platform")
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path, mask):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        return wd
+
+    def rm_watch(self, wd):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def wait(self, timeout):
+        """Block until events arrive or timeout (None blocks forever); return [(wd, mask, name)]."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size
+            name = os.fsdecode(data[pos:pos + length].rstrip(b'\0'))
+            pos += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+class LogWatcher:
+    """Tail a ROS log directory and ship appended lines as they are written.
+
+    The directory is usually ~/.ros/log/latest; when roslaunch repoints that
+    symlink at a new run, the watcher follows it. Records are flushed to the
+    ingester when batch_size is reached or linger seconds after the first
+    buffered record, and the registry offset only advances once they are
+    acknowledged. Uses inotify when available and falls back to polling.
+    With a spool, batches go to disk instead and offsets advance once they
+    are written; the spool's drainer ships them.
+
+    Without a spool, a batch the ingester can't ship (the cluster is down
+    past its retries) is not fatal: the files it came from are read again
+    from their committed offsets after a backoff.
+
+    In multiline formats the last record of a file may still be followed by
+    a traceback that hasn't been written yet, so it is held back (and read
+    again) until the next record starts or it is linger seconds old.
+    """
+
+    def __init__(self, log_dir, ingester, registry, batch_size=500, linger=0.5,
+                 poll_interval=1.0, epoch_millis=False, use_inotify=True, spool=None, filters=None,
+                 rollup=None, retry_backoff=RETRY_BACKOFF, max_retry_backoff=MAX_RETRY_BACKOFF):
+        self.log_dir = os.path.abspath(log_dir)
+        self.ingester = ingester
+        self.registry = registry
+        self.batch_size = batch_size
+        self.linger = linger
+        self.poll_interval = poll_interval
+        self.epoch_millis = epoch_millis
+        self.spool = spool
+        self.filters = filters
+        self.rollup = rollup
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        # Consecutive failed flushes, and the monotonic time reading resumes after the last one
+        self._failures = 0
+        self._retry_at = None
+
+        self.session_dir = None
+        self.positions = {}
+        # path -> (start offset, monotonic time first held) of a trailing multiline record
+        self.held = {}
+        self.buffer = []
+        self.first_buffered = None
+
+        self.inotify = None
+        self._session_wd = None
+        if use_inotify:
+            try:
+                self.inotify = Inotify()
+                # Watch the parent so a repointed `latest` symlink is noticed
+                self.inotify.add_watch(os.path.dirname(self.log_dir), LINK_EVENTS)
+            except OSError as e:
+                print(f"[WARN] inotify unavailable ({e}); polling every {poll_interval}s instead.")
+                self.inotify = None
+
+    def _follow_session(self):
+        """Switch to the directory log_dir currently points at; return True if it changed."""
+        target = os.path.realpath(self.log_dir)
+        if target == self.session_dir or not os.path.isdir(target):
+            return False
+
+        if self.session_dir is not None and os.path.isdir(self.session_dir):
+            # Pick up whatever the previous run wrote before it was replaced; nothing more is coming
+            self._scan()
+            self._release_held(force=True)
+        self.flush()
+        print(f"[INFO] Watching session {target}")
+        self.session_dir = target
+        self.positions = {}
+        self.held = {}
+        if self.inotify is not None:
+            if self._session_wd is not None:
+                self.inotify.rm_watch(self._session_wd)
+            self._session_wd = self.inotify.add_watch(target, SESSION_EVENTS)
+        self._scan()
+        return True
+
+    def _scan(self):
+        for fname in sorted(os.listdir(self.session_dir)):
+            self._tail(fname)
+
+    def _tail(self, fname, release=False):
+        """Buffer what was appended to fname; release ships a held trailing record even if it is young."""
+        parse_line = parser_for(fname, self.epoch_millis)
+        path = os.path.join(self.session_dir, fname)
+        # Archives aren't written to; they are picked up by a one-off run instead
+        if parse_line is None or is_compressed(fname) or not os.path.isfile(path):
+            self.held.pop(path, None)
+            return
+        if self._retry_at is not None:
+            # Backing off after a failed flush; everything is rescanned once it is over
+            return
+
+        position = self.positions.get(path)
+        size = os.path.getsize(path)
+        if position is None or size < position:
+            # First sight of the file, or it was truncated: ask the registry where to start
+            position = self.registry.resume_offset(path)
+            self.held.pop(path, None)
+        if size == position:
+            self.positions[path] = position
+            return
+
+        read_to = [position]
+        held = self.held.get(path)
+
+        def harvest():
+            last = None
+            for end, log in harvest_log(path, parse_line, position, partial=False):
+                if last is not None:
+                    read_to[0] = last[0]
+                    yield path, last[0], last[1]
+                last = (end, log)
+            if last is None:
+                return
+            start = read_to[0]
+            since = held[1] if held is not None and held[0] == start else time.monotonic()
+            if parse_line.multiline and not release and time.monotonic() - since < self.linger:
+                # Read again from its start next time, with whatever continues it by then
+                self.held[path] = (start, since)
+                return
+            self.held.pop(path, None)
+            read_to[0] = last[0]
+            yield path, last[0], last[1]
+
+        records = harvest() if self.filters is None else self.filters.apply(harvest())
+        if self.rollup is not None:
+            # Windows stay open across ticks; _expire_rollups ships them once they are over
+            records = self.rollup.apply(records, flush=False)
+        self._buffer(records)
+        # Past any trailing records the filters dropped, so they aren't read again
+        self.positions[path] = read_to[0]
+        METRICS.set('rosbeat_queue_depth', len(self.buffer), queue='watch_buffer')
+
+    def _buffer(self, records):
+        for record in records:
+            if not self.buffer:
+                self.first_buffered = time.monotonic()
+            self.buffer.append(record)
+            if len(self.buffer) >= self.batch_size:
+                self.flush()
+
+    def _release_held(self, force=False):
+        """Ship trailing multiline records that have waited linger seconds (or all of them, with force)."""
+        now = time.monotonic()
+        for path, (_, since) in list(self.held.items()):
+            if force or now - since >= self.linger:
+                self._tail(os.path.basename(path), release=force)
+
+    def _expire_rollups(self):
+        if self.rollup is not None:
+            self._buffer(self.rollup.expire(time.time()))
+
+    def flush(self):
+        if not self.buffer:
+            return
+        batch, self.buffer = self.buffer, []
+        METRICS.set('rosbeat_queue_depth', 0, queue='watch_buffer')
+        if self.spool is None:
+            try:
+                self.ingester.ingest_harvest(batch, self.registry, quiet=True)
+            except Exception as e:
+                self._failures += 1
+                delay = min(self.max_retry_backoff, self.retry_backoff * 2 ** (self._failures - 1))
+                print(f"[WARN] Could not ship {len(batch)} logs ({e}); re-reading them in {delay:.0f}s.")
+                self._retry_at = time.monotonic() + delay
+                self._forget(batch)
+                return
+            self._failures = 0
+            return
+        try:
+            self.spool.append(batch, self.registry, self.batch_size)
+        except SpoolFull as e:
+            print(f"[WARN] {e}; will re-read unspooled lines once it drains.")
+            self._forget(batch)
+
+    def _forget(self, batch):
+        """Forget read positions so the batch's files resume from their committed offsets."""
+        for path, _, _ in batch:
+            self.positions.pop(path, None)
+            self.held.pop(path, None)
+
+    def _retry(self):
+        if self._retry_at is not None and time.monotonic() >= self._retry_at:
+            self._retry_at = None
+            if self.session_dir is not None:
+                self._scan()
+
+    def _timeout(self, idle):
+        now = time.monotonic()
+        deadlines = [since + self.linger for _, since in self.held.values()]
+        if self.buffer:
+            deadlines.append(self.first_buffered + self.linger)
+        if self._retry_at is not None:
+            deadlines.append(self._retry_at)
+        if not deadlines:
+            return idle
+        remaining = min(deadlines) - now
+        return max(0.0, remaining) if idle is None else max(0.0, min(idle, remaining))
+
+    def _poll_once(self):
+        changed = self._follow_session()
+        if not changed and self.session_dir is not None:
+            self._scan()
+
+    def _inotify_once(self):
+        rescan = relink = False
+        # A burst of writes produces many IN_MODIFY events; tail each file once
+        modified = {}
+        # With rollups, wake up at least once a window to ship the ones that are over
+        idle = None if self.rollup is None else self.rollup.window
+        for wd, mask, name in self.inotify.wait(self._timeout(idle)):
+            if mask & IN_Q_OVERFLOW:
+                rescan = True
+            elif wd == self._session_wd:
+                modified[name] = True
+            elif name == os.path.basename(self.log_dir):
+                relink = True
+
+        for name in modified:
+            self._tail(name)
+        if relink or rescan:
+            if not self._follow_session() and rescan and self.session_dir is not None:
+                self._scan()
+
+    def run(self):
+        print(f"[INFO] Watching {self.log_dir} ({'inotify' if self.inotify else 'polling'})...")
+        try:
+            self._follow_session()
+            while True:
+                if self.inotify is not None:
+                    self._inotify_once()
+                else:
+                    time.sleep(self._timeout(self.poll_interval))
+                    self._poll_once()
+                self._retry()
+                self._release_held()
+                self._expire_rollups()
+                if self.buffer and time.monotonic() - self.first_buffered >= self.linger:
+                    self.flush()
+        finally:
+            if self.rollup is not None:
+                self._buffer(self.rollup.flush())
+            self.flush()
+            self.registry.save()
+            if self.inotify is not None:
+                self.inotify.close()
@@ -0,0 +1,31 @@
+import pytest
+import yaml
+from benchmarks.generate_session import generate_session
+
+@pytest.fixture(scope='session')
+def small_session(tmp_path_factory):
+    """A 2 MB synthetic session shared by tests that only read it."""
+    path = str(tmp_path_factory.mktemp('session'))
+    generate_session(path, size_mb=2, nodes=4, seed=1)
+    return path
+
+@pytest.fixture
+def write_config(tmp_path):
+    """Write a config.yml into tmp_path from keyword sections and return its path."""
+    def write(**sections):
+        path = str(tmp_path / 'config.yml')
+        with open(path, 'w') as f:
+            yaml.safe_dump(sections, f)
+        return path
+    return write
+
+@pytest.fixture
+def write_session(tmp_path):
+    """Write a session directory holding one node log with a record per line; return (session, log path)."""
+    def write(lines):
+        session = tmp_path / 'session'
+        session.mkdir()
+        log = session / 'talker-1.log'
+        log.write_text(''.join(f"[2023-11-14 22:13:01,123][INFO] {line}\n" for line in lines))
+        return str(session), str(log)
+    return write
@@ -0,0 +1,35 @@
+"""`rosbeat parse` must stay cheap enough to run from a roslaunch shutdown hook."""
+import json
+import os
+import subprocess
+import sys
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Backends `rosbeat parse` has no use for; importing any of them is most of the start-up time
+UNUSED_MODULES = ['elasticsearch', 'urllib3', 'sqlite3', 'concurrent']
+
+# Seconds for a whole run on the 2 MB session, interpreter start-up included; about 0.25s here
+BUDGET = 2.0
+
+CHILD = """
+import json, runpy, sys
+sys.argv = ['rosbeat'] + sys.argv[1:]
+try:
+    runpy.run_module('rosbeat', run_name='__main__', alter_sys=True)
+except SystemExit:
+    pass
+print(json.dumps(sorted(name for name in %r if name in sys.modules)))
+""" % (UNUSED_MODULES,)
+
+def test_parse_imports_no_backends(small_session, tmp_path, write_config):
+    config = write_config(log_directory=small_session, output_directory=str(tmp_path / 'out'),
+                          parse={'workers': 1})
+    started = time.monotonic()
+    result = subprocess.run([sys.executable, '-c', CHILD, '--config', config, 'parse'],
+                            cwd=REPO, capture_output=True, text=True, check=True)
+    elapsed = time.monotonic() - started
+    assert json.loads(result.stdout.splitlines()[-1]) == []
+    assert os.listdir(tmp_path / 'out')
+    assert elapsed < BUDGET, f"rosbeat parse took {elapsed:.2f}s"
@@ -0,0 +1,49 @@
+from rosbeat.__main__ import collect_all_logs
+from rosbeat.filters import Filters
+from rosbeat.timestamps import iso_to_millis
+
+def _log(node, second, message='tick', level='INFO'):
+    return {'node_name': node, 'log_level': level, 'log_type': 'rosout_node_log', 'log_message': message,
+            'timestamp': f'2023-11-14T22:13:{second:02d}.000Z'}
+
+def _messages(filters, harvest):
+    return [(path, log['log_message']) for path, _, log in filters.apply(harvest)]
+
+def test_rate_limit_is_per_file():
+    filters = Filters(rate_limit=1)
+    # Every node log's /rosout lines carry node "rosout"; one file must not use up another's budget
+    harvest = [('talker.log', 1, _log('rosout', 10, 'a')), ('talker.log', 2, _log('rosout', 10, 'b')),
+               ('listener.log', 1, _log('rosout', 10, 'c'))]
+    assert _messages(filters, harvest) == [('talker.log', 'a'), ('listener.log', 'c')]
+
+def test_rate_limit_refills_after_time_goes_backwards():
+    filters = Filters(rate_limit=1)
+    harvest = [('rosout.log', i + 1, _log('talker', second, str(i)))
+               for i, second in enumerate([50, 50, 10, 11, 12])]
+    assert [message for _, message in _messages(filters, harvest)] == ['0', '3', '4']
+
+def test_interleaved_duplicates_are_collapsed_in_place(tmp_path):
+    filters = Filters(collapse_duplicates=True)
+    harvest = [('rosout.log', end, _log(node, 10, f'{node} waiting'))
+               for end, node in enumerate(['talker', 'listener'] * 3 + ['talker'], 1)]
+    harvest.append(('rosout.log', 8, _log('listener', 11, 'listener done')))
+    records = list(filters.apply(harvest))
+    assert [(log['log_message'], log.get('repeat_count')) for _, _, log in records] == [
+        ('talker waiting', 4), ('listener waiting', 3), ('listener done', None)]
+    # A run's offset never passes the runs still waiting behind it
+    assert [end for _, end, _ in records] == [1, 6, 8]
+
+def test_runs_end_after_collapse_window():
+    filters = Filters(collapse_duplicates=True, collapse_window=5)
+    harvest = [('rosout.log', end, _log('talker', second, 'waiting'))
+               for end, second in enumerate([0, 1, 2, 6, 7], 1)]
+    harvest.append(('rosout.log', 6, _log('listener', 7, 'hello')))
+    records = list(filters.apply(harvest))
+    assert [(log['timestamp'][17:19], log.get('repeat_count')) for _, _, log in records] == [
+        ('00', 3), ('06', 2), ('07', None)]
+
+def test_collapsed_timeline_stays_in_order(small_session):
+    logs = list(collect_all_logs(small_session, filters=Filters(collapse_duplicates=True), time_order=2.0))
+    assert any(log.repeat_count for log in logs)
+    timestamps = [iso_to_millis(log.timestamp) for log in logs]
+    assert timestamps == sorted(timestamps)
@@ -0,0 +1,73 @@
+import pytest
+from rosbeat.formats import MASTER, MAX_CONTINUATION_LINES, NODE, classify_file
+
+RECORD = "[2023-11-14 22:13:01,123][ERROR] Callback raised an exception\n"
+TRACEBACK = ("Traceback (most recent call last):\n"
+             '  File "/opt/ros/lib/talker.py", line 12, in callback\n'
+             "    raise ValueError('invalid goal')\n"
+             "ValueError: invalid goal\n")
+NEXT = "[2023-11-14 22:13:02,000][INFO] Next record\n"
+
+def _harvest(tmp_path, text, name='talker-1.log'):
+    path = tmp_path / name
+    path.write_text(text)
+    return list(classify_file(name).harvest(str(path)))
+
+def test_traceback_is_appended_to_its_record(tmp_path):
+    records = _harvest(tmp_path, RECORD + TRACEBACK + NEXT)
+    assert [log.log_message for _, log in records] == [
+        "Callback raised an exception\n" + TRACEBACK.rstrip('\n'), "Next record"]
+    assert records[0][0] == len(RECORD + TRACEBACK)
+
+def test_chained_tracebacks_stay_together(tmp_path):
+    chained = TRACEBACK + "\nDuring handling of the above exception, another exception occurred:\n\n" + TRACEBACK
+    records = _harvest(tmp_path, RECORD + chained)
+    assert records[0][1].log_message.count("Traceback") == 2
+    assert "During handling" in records[0][1].log_message
+
+def test_unrelated_lines_are_not_appended(tmp_path):
+    records = _harvest(tmp_path, RECORD + "hello from print()\n" * 1000 + NEXT)
+    assert [log.log_message for _, log in records] == ["Callback raised an exception", "Next record"]
+    # The dropped lines are still covered by the record's end offset
+    assert records[0][0] == len(RECORD) + len("hello from print()\n") * 1000
+
+def test_continuation_is_capped(tmp_path):
+    records = _harvest(tmp_path, RECORD + "  frame\n" * (MAX_CONTINUATION_LINES * 3))
+    assert records[0][1].log_message.count('\n') == MAX_CONTINUATION_LINES
+    assert records[0][0] == len(RECORD) + len("  frame\n") * MAX_CONTINUATION_LINES * 3
+
+def test_continuation_is_capped_by_size(tmp_path):
+    frame = "  " + "x" * 10000 + "\n"
+    records = _harvest(tmp_path, RECORD + frame * 100)
+    assert len(records[0][1].log_message) <= NODE.max_bytes + len(RECORD)
+
+def test_stdout_logs_are_not_multiline(tmp_path):
+    assert classify_file('talker-1-stdout.log').name == 'node_stdout'
+    assert classify_file('talker-1.log') is NODE
+    records = _harvest(tmp_path, RECORD + "    indented print output\n" * 100 + NEXT, 'talker-1-stdout.log')
+    assert [log.log_message for _, log in records] == ["Callback raised an exception", "Next record"]
+
+MASTER_LINES = ("[rosmaster.master][INFO] 2023-11-14 22:13:01,123: Master initialized: port[11311]\n"
+                "[rosmaster.master][INFO] 2023-11-14 22:13:02,000: +PUB [/rosout_agg] /rosout  \n"
+                "\n"
+                "[rosmaster.master][WARN] 2023-11-14 22:13:03,500: shutdown requested\n")
+
+@pytest.mark.parametrize('suffix', ['', 'é'], ids=['ascii', 'utf8'])
+def test_crlf_line_endings_are_not_kept(tmp_path, suffix):
+    text = MASTER_LINES.replace('requested', 'requested' + suffix)
+    path = tmp_path / 'master.log'
+    path.write_bytes(text.replace('\n', '\r\n').encode('utf-8'))
+    records = list(classify_file('master.log').harvest(str(path)))
+    # master.log is not stripped, so a message keeps its trailing spaces but not the \r
+    assert [log.log_message for _, log in records] == [
+        "Master initialized: port[11311]", "+PUB [/rosout_agg] /rosout  ", "shutdown requested" + suffix]
+    assert records[-1][0] == path.stat().st_size
+    assert MASTER.parse_line(text.splitlines(True)[0].replace('\n', '\r\n'), str(path)).log_message == \
+        "Master initialized: port[11311]"
+
+def test_crlf_tracebacks(tmp_path):
+    path = tmp_path / 'talker-1.log'
+    path.write_bytes((RECORD + TRACEBACK + NEXT).replace('\n', '\r\n').encode('utf-8'))
+    records = list(classify_file('talker-1.log').harvest(str(path)))
+    assert [log.log_message for _, log in records] == [
+        "Callback raised an exception\n" + TRACEBACK.rstrip('\n'), "Next record"]
@@ -0,0 +1,54 @@
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+from elasticsearch import exceptions
+from rosbeat.ingester import ElasticsearchIngester
+
+class IndicesStub:
+    """Keeps each index's refresh_interval and number_of_replicas like the indices API."""
+
+    def __init__(self, indices):
+        self.indices = self
+        self.settings = {index: dict(settings) for index, settings in indices.items()}
+        self.refreshed = []
+
+    def create(self, index, settings):
+        if index in self.settings:
+            meta = ApiResponseMeta(400, '1.1', HttpHeaders(), 0.0, NodeConfig('http', 'localhost', 9200))
+            raise exceptions.BadRequestError('resource_already_exists_exception', meta, {})
+        self.settings[index] = dict(settings['index'])
+
+    def get_settings(self, index, flat_settings):
+        return {index: {"settings": {f"index.{key}": value for key, value in self.settings[index].items()}}}
+
+    def put_settings(self, index, settings):
+        self.settings[index].update(settings['index'])
+
+    def refresh(self, index):
+        self.refreshed.extend(index)
+
+def _doc(day):
+    return {"timestamp": f"2023-11-{day}T22:13:01.123Z", "log_message": "tick"}
+
+def test_bulk_load_only_touches_indices_it_writes():
+    normal = {"refresh_interval": "5s", "number_of_replicas": 1}
+    ingester = ElasticsearchIngester(['http://127.0.0.1:9'], 'rosbeat-logs', refresh_interval=5,
+                                     index_interval='daily', replicas=1)
+    ingester.es = IndicesStub({
+        'rosbeat-logs-2023.11.13': normal,
+        'rosbeat-logs-2023.11.14': {"refresh_interval": "30s", "number_of_replicas": 2},
+        # Another robot's backfill in progress
+        'rosbeat-logs-2023.11.16': {"refresh_interval": "-1", "number_of_replicas": 0},
+    })
+    with ingester.bulk_load():
+        for day in (14, 15, 16, 14):
+            ingester._action_line(_doc(day))
+        assert ingester.es.settings['rosbeat-logs-2023.11.14'] == {"refresh_interval": "-1", "number_of_replicas": 0}
+        assert ingester.es.settings['rosbeat-logs-2023.11.15'] == {"refresh_interval": "-1", "number_of_replicas": 0}
+        assert ingester.es.settings['rosbeat-logs-2023.11.13'] == normal
+
+    assert ingester.es.settings == {
+        'rosbeat-logs-2023.11.13': normal,
+        'rosbeat-logs-2023.11.14': {"refresh_interval": "30s", "number_of_replicas": 2},
+        'rosbeat-logs-2023.11.15': normal,
+        'rosbeat-logs-2023.11.16': {"refresh_interval": "-1", "number_of_replicas": 0},
+    }
+    assert ingester.es.refreshed == ['rosbeat-logs-2023.11.14', 'rosbeat-logs-2023.11.15']
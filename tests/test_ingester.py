@@ -0,0 +1,105 @@
+import json
+import os
+from benchmarks.fake_es import FakeElasticsearch
+from rosbeat.__main__ import harvest_session
+from rosbeat.ingester import ElasticsearchIngester
+from rosbeat.ndjson import read_ndjson
+from rosbeat.registry import Registry
+
+class BulkStub:
+    """Answers _bulk like Elasticsearch, failing documents whose message contains a marker."""
+
+    def __init__(self, failures):
+        # marker -> (status, error type)
+        self.failures = failures
+        self.indexed = 0
+
+    def bulk(self, operations):
+        items = []
+        for source in operations[1::2]:
+            message = json.loads(source)["log_message"]
+            failure = next((failure for marker, failure in self.failures.items() if marker in message), None)
+            if failure is None:
+                self.indexed += 1
+                items.append({"index": {"status": 201}})
+            else:
+                status, kind = failure
+                items.append({"index": {"status": status, "error": {"type": kind, "reason": message}}})
+        return {"errors": any("error" in item["index"] for item in items), "items": items}
+
+def _ingester(tmp_path, failures):
+    ingester = ElasticsearchIngester(['http://127.0.0.1:9'], 'rosbeat-logs', batch_size=10, max_retries=1,
+                                     initial_backoff=0, dead_letter=str(tmp_path / 'rejected.ndjson'))
+    ingester.es = BulkStub(failures)
+    return ingester
+
+def _run(session, tmp_path, ingester):
+    registry = Registry(str(tmp_path / 'state.json'))
+    ingester.ingest_harvest(harvest_session(session, registry), registry, quiet=True)
+    return registry
+
+def test_rejected_documents_do_not_hold_offsets_back(tmp_path, write_session):
+    lines = [f"message {i}" for i in range(100)]
+    lines[3] = "bad mapping"
+    session, log = write_session(lines)
+    ingester = _ingester(tmp_path, {"bad": (400, "mapper_parsing_exception")})
+
+    registry = _run(session, tmp_path, ingester)
+    assert registry.entries[log]['offset'] == os.path.getsize(log)
+    assert ingester.es.indexed == 99
+    rejected = list(read_ndjson(str(tmp_path / 'rejected.ndjson')))
+    assert [entry["record"]["log_message"] for entry in rejected] == ["bad mapping"]
+    assert rejected[0]["error"]["type"] == "mapper_parsing_exception"
+
+    _run(session, tmp_path, ingester)
+    assert ingester.es.indexed == 99
+
+def test_retryable_failures_hold_offsets_back(tmp_path, write_session):
+    lines = [f"message {i}" for i in range(20)]
+    lines[5] = "busy shard"
+    session, log = write_session(lines)
+    ingester = _ingester(tmp_path, {"busy": (503, "unavailable_shards_exception")})
+
+    registry = _run(session, tmp_path, ingester)
+    line = len("[2023-11-14 22:13:01,123][INFO] message 0\n")
+    assert registry.entries[log]['offset'] == line * 5
+    assert not os.path.exists(tmp_path / 'rejected.ndjson')
+
+def _fake_ingester(tmp_path, fake, **options):
+    options = dict({'batch_size': 100, 'max_retries': 10, 'initial_backoff': 0, 'max_in_flight': 1}, **options)
+    return ElasticsearchIngester([fake.url], 'rosbeat-logs', dead_letter=str(tmp_path / 'rejected.ndjson'),
+                                 **options)
+
+def test_throttled_items_are_retried_until_indexed(tmp_path, write_session):
+    session, log = write_session([f"message {i}" for i in range(300)])
+    with FakeElasticsearch(reject_rate=0.3) as fake:
+        registry = _run(session, tmp_path, _fake_ingester(tmp_path, fake))
+    assert fake.throttled > 0
+    assert fake.docs == 300
+    assert registry.entries[log]['offset'] == os.path.getsize(log)
+
+def test_rejected_requests_shrink_the_batch(tmp_path, write_session):
+    session, log = write_session([f"message {i}" for i in range(300)])
+    with FakeElasticsearch(max_request_docs=40) as fake:
+        registry = _run(session, tmp_path, _fake_ingester(tmp_path, fake))
+    assert fake.docs == 300
+    # The first batch is refused at 100 and 50 documents and fits at 25
+    assert fake.throttled >= 100 + 50
+    assert registry.entries[log]['offset'] == os.path.getsize(log)
+
+def test_batches_are_cut_by_bytes(tmp_path, write_session):
+    session, log = write_session([f"message {i} " + "x" * 200 for i in range(100)])
+    with FakeElasticsearch() as fake:
+        _run(session, tmp_path, _fake_ingester(tmp_path, fake, max_batch_bytes=4096))
+    assert fake.docs == 100
+    # Each document is about 300 bytes with its action line, so about 14 fit in a request
+    assert fake.bulk_requests >= 100 * 300 // (4096 + 300)
+    assert fake.bytes_received / fake.bulk_requests <= 4096 + 400
+
+def test_items_still_throttled_after_retries_are_not_dead_lettered(tmp_path, write_session):
+    session, log = write_session([f"message {i}" for i in range(20)])
+    with FakeElasticsearch(reject_rate=1.0) as fake:
+        registry = _run(session, tmp_path, _fake_ingester(tmp_path, fake, max_retries=1))
+    assert fake.docs == 0
+    assert registry.entries[log]['offset'] == 0
+    assert not os.path.exists(tmp_path / 'rejected.ndjson')
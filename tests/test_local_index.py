@@ -0,0 +1,29 @@
+from collections import Counter
+import pytest
+from rosbeat.__main__ import harvest_session
+from rosbeat.local_index import LocalIndex, parse_time
+
+def _index(small_session, tmp_path):
+    index = LocalIndex(str(tmp_path / 'index.db'))
+    index.add(harvest_session(small_session, index.registry))
+    return index
+
+def test_type_shorthands_match_stored_log_types(small_session, tmp_path):
+    index = _index(small_session, tmp_path)
+    stored = Counter(log['log_type'] for log in index.query(limit=0))
+    assert stored['node_log'] and stored['master_log']
+    assert sum(1 for _ in index.query(log_types=['node'], limit=0)) == stored['node_log'] + stored['rosout_node_log']
+    assert sum(1 for _ in index.query(log_types=['master'], limit=0)) == stored['master_log']
+    assert sum(1 for _ in index.query(log_types=['rosout'], limit=0)) == stored['rosout']
+
+def test_min_level_narrows_levels(small_session, tmp_path):
+    index = _index(small_session, tmp_path)
+    assert {log['log_level'] for log in index.query(levels=['INFO', 'ERROR'], min_level='WARN', limit=0)} == {'ERROR'}
+    assert list(index.query(levels=['INFO'], min_level='WARN')) == []
+
+@pytest.mark.parametrize('value', [
+    '2023-11-14 22:13:00', '2023-11-14T22:13:00Z', '2023-11-14T22:13:00+00:00',
+    '2023-11-15T00:13:00+02:00', '2023-11-14T17:13:00-05:00', '2023-11-15T03:43:00.000+05:30', '1699999980',
+])
+def test_parse_time_converts_offsets_to_utc(value):
+    assert parse_time(value) == 1699999980000
@@ -0,0 +1,53 @@
+"""Peak memory of a full parse must not grow with the size of the session."""
+import os
+import subprocess
+import sys
+import pytest
+from benchmarks.generate_session import generate_session
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Parses a session to /dev/null and prints its peak anonymous RSS in kB. Mapped
+# log pages are page cache, not the parser's memory, but count toward
+# ru_maxrss; so RssAnon is sampled instead.
+CHILD = """
+import os, sys, threading
+from rosbeat.__main__ import collect_all_logs
+from rosbeat.ndjson import NdjsonWriter
+
+def rss_anon():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('RssAnon:'):
+                return int(line.split()[1])
+
+peak = [rss_anon()]
+done = threading.Event()
+
+def sample():
+    while not done.wait(0.005):
+        peak[0] = max(peak[0], rss_anon())
+
+threading.Thread(target=sample, daemon=True).start()
+with NdjsonWriter(os.devnull) as writer:
+    writer.write_all(collect_all_logs(sys.argv[1]))
+done.set()
+print(max(peak[0], rss_anon()))
+"""
+
+# Allowed growth from the small to the large session; holding the large
+# session's records would take hundreds of MB
+MAX_GROWTH_KB = 16 * 1024
+
+def _peak_rss(session):
+    result = subprocess.run([sys.executable, '-c', CHILD, session], cwd=REPO, capture_output=True, text=True,
+                            check=True)
+    return int(result.stdout.split()[-1])
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/status'), reason="needs /proc/self/status")
+def test_peak_rss_is_flat(tmp_path):
+    small, large = str(tmp_path / 'small'), str(tmp_path / 'large')
+    generate_session(small, size_mb=8, nodes=5)
+    generate_session(large, size_mb=48, nodes=5)
+    growth = _peak_rss(large) - _peak_rss(small)
+    assert growth < MAX_GROWTH_KB, f"peak RSS grew by {growth} kB from an 8 MB to a 48 MB session"
@@ -0,0 +1,82 @@
+import os
+import pytest
+from rosbeat.__main__ import session_files
+from rosbeat.metrics import METRICS, Metrics
+from rosbeat.parallel import harvest_files
+
+def _metrics():
+    metrics = Metrics()
+    metrics.describe('jobs_total', 'counter', "Jobs run.")
+    metrics.describe('queue_depth', 'gauge', "Items waiting.")
+    metrics.describe('request_seconds', 'histogram', "Request latency.", buckets=(0.1, 1))
+    return metrics
+
+def test_render_text_format():
+    metrics = _metrics()
+    metrics.inc('jobs_total', result='ok')
+    metrics.inc('jobs_total', 2, result='ok')
+    metrics.inc('jobs_total', file='a "quoted"\\path\n', result='failed')
+    metrics.set('queue_depth', 0.5)
+    for seconds in (0.05, 0.1, 0.5, 3):
+        metrics.observe('request_seconds', seconds, host='es1')
+    metrics.gauge_function('queue_depth', lambda: 7)
+
+    assert metrics.render() == '\n'.join([
+        '# HELP jobs_total Jobs run.',
+        '# TYPE jobs_total counter',
+        'jobs_total{file="a \\"quoted\\"\\\\path\\n",result="failed"} 1',
+        'jobs_total{result="ok"} 3',
+        '# HELP queue_depth Items waiting.',
+        '# TYPE queue_depth gauge',
+        'queue_depth 7',
+        '# HELP request_seconds Request latency.',
+        '# TYPE request_seconds histogram',
+        'request_seconds_bucket{host="es1",le="0.1"} 2',
+        'request_seconds_bucket{host="es1",le="1"} 3',
+        'request_seconds_bucket{host="es1",le="+Inf"} 4',
+        'request_seconds_sum{host="es1"} 3.65',
+        'request_seconds_count{host="es1"} 4',
+    ]) + '\n'
+
+def test_drain_and_merge():
+    worker, parent = _metrics(), _metrics()
+    parent.inc('jobs_total', 5, result='ok')
+    parent.observe('request_seconds', 0.5)
+    worker.inc('jobs_total', 2, result='ok')
+    worker.inc('jobs_total', result='failed')
+    worker.set('queue_depth', 3)
+    worker.observe('request_seconds', 0.05)
+    worker.observe('request_seconds', 2)
+
+    drained = worker.drain()
+    # Gauges describe the worker's own state and stay behind; counters start over
+    assert ('queue_depth', ()) not in drained
+    assert worker.series('jobs_total') == {}
+    parent.merge(drained)
+    assert parent.series('jobs_total') == {(('result', 'ok'),): 7, (('result', 'failed'),): 1}
+    assert parent.series('request_seconds') == {(): [[1, 1, 1], pytest.approx(2.55), 3]}
+
+    # Merging a second drain adds to the first rather than sharing its lists
+    worker.observe('request_seconds', 0.05)
+    parent.merge(worker.drain())
+    assert parent.series('request_seconds') == {(): [[2, 1, 1], pytest.approx(2.6), 4]}
+
+def _counts(session, workers):
+    METRICS.reset()
+    files = [(label, path, parse_line, 0) for label, path, parse_line in session_files(session)]
+    for _ in harvest_files(files, workers, chunk_bytes=64 * 1024):
+        pass
+    series = {}
+    for name in ('rosbeat_lines_read_total', 'rosbeat_records_total', 'rosbeat_bytes_read_total'):
+        for labels, value in METRICS.series(name).items():
+            labels = dict(labels)
+            series[name, os.path.basename(labels['file'])] = value
+    return series
+
+def test_worker_counters_reach_the_parent(small_session):
+    try:
+        expected = _counts(small_session, 1)
+        assert expected
+        assert _counts(small_session, 2) == expected
+    finally:
+        METRICS.reset()
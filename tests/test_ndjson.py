@@ -0,0 +1,38 @@
+import pytest
+from rosbeat.ndjson import NdjsonWriter, ndjson_path, open_binary, read_ndjson, write_ndjson
+from rosbeat.parser import save_parsed_logs
+from rosbeat.reader import zstandard
+from rosbeat.record import LogRecord
+
+COMPRESSIONS = ['none', 'gzip', 'xz', pytest.param('zstd', marks=pytest.mark.skipif(
+    zstandard is None, reason="needs the zstandard package"))]
+
+def _records():
+    return [
+        LogRecord('2023-11-14T22:13:20.123000Z', 'INFO', '/talker', 'hello world 1', 'rosout', 'rosout.log',
+                  topics=['/rosout', '/chatter']),
+        LogRecord('2023-11-14T22:13:21Z', 'ERROR', '/listener', 'Traceback:\n  ünïcode "quoted"', 'node_log',
+                  'listener-2.log', repeat_count=3),
+        # Dicts from custom formats are written as they are
+        {'timestamp': '2023-11-14T22:13:22Z', 'log_type': 'custom', 'value': 1.5, 'nested': {'ok': True}},
+    ]
+
+@pytest.mark.parametrize('compression', COMPRESSIONS)
+def test_round_trip(tmp_path, compression):
+    records = _records()
+    path = ndjson_path(str(tmp_path / 'session.ndjson'), compression)
+    assert write_ndjson(records, path) == 3
+    expected = [record.to_dict() if isinstance(record, LogRecord) else record for record in records]
+    assert list(read_ndjson(path)) == expected
+
+    # Appending adds another gzip member, xz stream or zstd frame that reads back as one file
+    with open_binary(path, 'ab') as stream, NdjsonWriter(stream) as writer:
+        writer.write(records[0])
+    assert list(read_ndjson(path)) == expected + expected[:1]
+
+@pytest.mark.parametrize('compression', COMPRESSIONS)
+def test_save_parsed_logs_suffix(tmp_path, compression):
+    assert save_parsed_logs(iter(_records()), str(tmp_path), 'rosout', compression) == 3
+    path = ndjson_path(str(tmp_path / 'rosout.ndjson'), compression)
+    assert [log['timestamp'] for log in read_ndjson(path)] == [
+        '2023-11-14T22:13:20.123000Z', '2023-11-14T22:13:21Z', '2023-11-14T22:13:22Z']
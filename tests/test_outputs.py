@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from rosbeat.__main__ import harvest_session
+from rosbeat.ndjson import read_ndjson
+from rosbeat.outputs import Fanout, HttpOutput, OutputUnavailable
+from rosbeat.registry import Registry
+from rosbeat.watch import LogWatcher
+
+class _Collector(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        status = self.server.status
+        if status == 200 and b'bad' in body:
+            status = 400
+        if status == 200:
+            self.server.received += body.count(b'\n')
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+@pytest.fixture
+def collector():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Collector)
+    server.status = 200
+    server.received = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def _ship(tmp_path, session, output):
+    registry = Registry(str(tmp_path / 'state.json'))
+    fanout = Fanout([output])
+    try:
+        fanout.ingest_harvest(harvest_session(session, registry), registry, quiet=True)
+    except OutputUnavailable:
+        pass
+    fanout.close()
+    return registry
+
+def test_rejected_batches_go_to_dead_letter_and_offsets_advance(tmp_path, collector, write_session):
+    lines = [f"message {i}" for i in range(30)]
+    lines[12] = "bad record"
+    session, log = write_session(lines)
+    url = f"http://127.0.0.1:{collector.server_address[1]}/logs"
+    dead_letter = str(tmp_path / 'rejected.ndjson')
+    output = HttpOutput(url, batch_size=10, linger=0.05, dead_letter=dead_letter)
+
+    registry = _ship(tmp_path, session, output)
+    assert registry.entries[log]['offset'] == os.path.getsize(log)
+    assert collector.received == 20
+    assert len(list(read_ndjson(dead_letter))) == 10
+
+def test_unavailable_collector_holds_offsets_back(tmp_path, collector, write_session):
+    collector.status = 503
+    session, log = write_session([f"message {i}" for i in range(30)])
+    url = f"http://127.0.0.1:{collector.server_address[1]}/logs"
+    output = HttpOutput(url, batch_size=10, linger=0.05, max_retries=1, initial_backoff=0,
+                        dead_letter=str(tmp_path / 'rejected.ndjson'))
+
+    registry = _ship(tmp_path, session, output)
+    assert registry.entries[log]['offset'] == 0
+    assert not os.path.exists(tmp_path / 'rejected.ndjson')
+
+def test_watch_ships_again_after_an_outage(tmp_path, collector, write_session):
+    session, log = write_session(["message 0"])
+    url = f"http://127.0.0.1:{collector.server_address[1]}/logs"
+    fanout = Fanout([HttpOutput(url, linger=0.05, max_retries=0)])
+    registry = Registry(str(tmp_path / 'state.json'))
+    watcher = LogWatcher(session, fanout, registry, linger=0, use_inotify=False, retry_backoff=0.05)
+    watcher._follow_session()
+
+    def tick():
+        watcher._retry()
+        watcher._poll_once()
+        watcher._release_held()
+        watcher.flush()
+
+    tick()
+    assert collector.received == 1
+    collector.status = 503
+    with open(log, 'a') as f:
+        f.write("[2023-11-14 22:13:02,000][INFO] message 1\n" * 3)
+    tick()
+    assert collector.received == 1
+    assert registry.entries[log]['offset'] < os.path.getsize(log)
+
+    collector.status = 200
+    time.sleep(0.1)
+    tick()
+    fanout.close()
+    assert collector.received == 4
+    assert registry.entries[log]['offset'] == os.path.getsize(log)
@@ -0,0 +1,68 @@
+import gzip
+import os
+import shutil
+import rosbeat.parallel
+from rosbeat.__main__ import session_files
+from rosbeat.parallel import ARCHIVE_BATCH, harvest_files, split_file
+
+def _harvest(session, workers):
+    files = [(label, path, parse_line, 0) for label, path, parse_line in session_files(session)]
+    return [(os.path.basename(path), end, log.log_message)
+            for path, end, log in harvest_files(files, workers, chunk_bytes=64 * 1024)]
+
+def _archive(session, name, source):
+    with open(os.path.join(session, source), 'rb') as src, gzip.open(os.path.join(session, name), 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+
+def test_archives_are_parsed_in_workers_and_stay_in_order(small_session, tmp_path, monkeypatch):
+    session = str(tmp_path / 'session')
+    shutil.copytree(small_session, session)
+    # Two rotations of rosout.log, with a fresh log after them
+    _archive(session, 'rosout.log.2.gz', 'rosout.log')
+    _archive(session, 'rosout.log.1.gz', 'rosout.log')
+    with open(os.path.join(session, 'rosout.log'), 'r+') as f:
+        head = f.readlines()[:50]
+        f.seek(0)
+        f.truncate()
+        f.writelines(head)
+
+    expected = _harvest(session, 1)
+    names = [name for name, _, _ in expected]
+    assert names.count('rosout.log.2.gz') > ARCHIVE_BATCH
+    assert 'rosout.log.1.gz' in names
+
+    parent = os.getpid()
+    harvest_log = rosbeat.parallel.harvest_log
+
+    def in_workers_only(*args):
+        assert os.getpid() != parent, f"{args[0]} was parsed in the parent process"
+        return harvest_log(*args)
+
+    monkeypatch.setattr(rosbeat.parallel, 'harvest_log', in_workers_only)
+    assert _harvest(session, 2) == expected
+
+def _triples(files, workers, chunk_bytes):
+    return [(path, end, log.to_dict()) for path, end, log in harvest_files(files, workers, chunk_bytes)]
+
+def test_chunks_of_a_large_file_keep_order_and_offsets(small_session, tmp_path):
+    session = str(tmp_path / 'session')
+    shutil.copytree(small_session, session)
+    # A line still being written at the end, which only the last chunk may hold back
+    with open(os.path.join(session, 'rosout.log'), 'ab') as f:
+        f.write(b'1700000000.123456789 INFO /talker [talker.py:12(run)] [topics: /rosout] half a li')
+    entries = {os.path.basename(path): (label, path, parse_line)
+               for label, path, parse_line in session_files(session)}
+    rosout, node_log = entries['rosout.log'], entries['node_0-99.log']
+    size = os.path.getsize(rosout[1])
+    assert len(split_file(rosout[1], 0, size, 32 * 1024, rosout[2])) > 20
+
+    files = [rosout + (0,), node_log + (0,)]
+    expected = _triples(files, 1, 32 * 1024)
+    assert len(expected) > 5000
+    assert _triples(files, 3, 32 * 1024) == expected
+
+    # Resuming mid-file from a registry offset
+    offset = expected[len(expected) // 3][1]
+    resumed = [rosout + (offset,), node_log + (0,)]
+    assert _triples(resumed, 3, 32 * 1024) == [triple for triple in expected
+                                               if triple[0] != rosout[1] or triple[1] > offset]
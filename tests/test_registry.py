@@ -0,0 +1,127 @@
+import os
+import shutil
+from rosbeat.__main__ import harvest_session
+from rosbeat.outputs import Fanout, NdjsonOutput
+from rosbeat.ndjson import read_ndjson
+from rosbeat.registry import Registry
+from rosbeat.spool import Spool
+
+LINE = "[2023-11-14 22:13:01,123][INFO] Planner found path with 12 poses\n"
+
+def _write(path, lines, mode='w'):
+    with open(path, mode) as f:
+        f.write(LINE * lines)
+
+def test_resume_offset_survives_reload(tmp_path):
+    log = str(tmp_path / 'talker-1.log')
+    _write(log, 50)
+    registry = Registry(str(tmp_path / 'state.json'))
+    assert registry.resume_offset(log) == 0
+    registry.advance(log, len(LINE) * 20)
+    registry.save()
+
+    reloaded = Registry(str(tmp_path / 'state.json'))
+    assert reloaded.resume_offset(log) == len(LINE) * 20
+    assert reloaded.unread(log)
+
+def test_advance_never_moves_back(tmp_path):
+    log = str(tmp_path / 'talker-1.log')
+    _write(log, 10)
+    registry = Registry(str(tmp_path / 'state.json'))
+    registry.resume_offset(log)
+    registry.advance(log, len(LINE) * 5)
+    registry.advance(log, len(LINE) * 2)
+    assert registry.entries[log]['offset'] == len(LINE) * 5
+
+def test_truncated_file_starts_over(tmp_path):
+    log = str(tmp_path / 'talker-1.log')
+    _write(log, 50)
+    registry = Registry(str(tmp_path / 'state.json'))
+    registry.resume_offset(log)
+    registry.advance(log, len(LINE) * 50)
+    # copytruncate: same inode, shorter than the committed offset
+    _write(log, 3)
+    assert registry.resume_offset(log) == 0
+
+def test_rotated_file_keeps_its_offset(tmp_path):
+    log = str(tmp_path / 'rosout.log')
+    _write(log, 50)
+    registry = Registry(str(tmp_path / 'state.json'))
+    registry.resume_offset(log)
+    registry.advance(log, len(LINE) * 30)
+
+    os.rename(log, log + '.1')
+    _write(log, 5)
+    assert registry.resume_offset(log + '.1') == len(LINE) * 30
+    assert registry.resume_offset(log) == 0
+
+def test_replaced_file_starts_over(tmp_path):
+    log = str(tmp_path / 'talker-1.log')
+    _write(log, 50)
+    registry = Registry(str(tmp_path / 'state.json'))
+    registry.resume_offset(log)
+    registry.advance(log, len(LINE) * 50)
+
+    os.remove(log)
+    with open(log, 'w') as f:
+        f.write(LINE.replace('12 poses', '99 poses') * 60)
+    assert registry.resume_offset(log) == 0
+
+def _ship(session, registry):
+    """Harvest a session and commit every offset, as an output does once records are acknowledged."""
+    count = 0
+    for file_path, end, _ in harvest_session(session, registry):
+        registry.advance(file_path, end)
+        count += 1
+    registry.save()
+    return count
+
+def test_harvest_resumes_after_committed_offsets(tmp_path, small_session):
+    session = str(tmp_path / 'session')
+    shutil.copytree(small_session, session)
+    registry = Registry(str(tmp_path / 'state.json'))
+
+    assert _ship(session, registry) > 0
+    for name in os.listdir(session):
+        path = os.path.join(session, name)
+        assert registry.entries[path]['offset'] == os.path.getsize(path)
+    assert _ship(session, Registry(str(tmp_path / 'state.json'))) == 0
+
+    node_log = next(os.path.join(session, name) for name in sorted(os.listdir(session)) if name.startswith('node_'))
+    _write(node_log, 7, 'a')
+    assert _ship(session, Registry(str(tmp_path / 'state.json'))) == 7
+
+def test_partial_last_line_is_left_for_the_next_run(tmp_path):
+    session = tmp_path / 'session'
+    session.mkdir()
+    log = str(session / 'talker-1.log')
+    _write(log, 3)
+    with open(log, 'a') as f:
+        f.write(LINE[:20])
+    registry = Registry(str(tmp_path / 'state.json'))
+
+    assert _ship(str(session), registry) == 3
+    assert registry.entries[log]['offset'] == len(LINE) * 3
+
+def test_spool_commits_offsets_once_written(tmp_path, small_session):
+    registry = Registry(str(tmp_path / 'state.json'))
+    spool = Spool(str(tmp_path / 'spool'))
+    count = spool.append(harvest_session(small_session, registry), registry, batch_size=100)
+    spool.close()
+
+    reloaded = Registry(str(tmp_path / 'state.json'))
+    for path, entry in reloaded.entries.items():
+        assert entry['offset'] == os.path.getsize(path)
+    assert spool.pending_bytes > 0
+    assert count > 0
+
+def test_fanout_commits_offsets_after_delivery(tmp_path, small_session):
+    archive = str(tmp_path / 'archive.ndjson')
+    registry = Registry(str(tmp_path / 'state.json'))
+    fanout = Fanout([NdjsonOutput(archive, batch_size=100, queue_size=512)])
+    count = fanout.ingest_harvest(harvest_session(small_session, registry), registry, quiet=True)
+    fanout.close()
+
+    assert sum(1 for _ in read_ndjson(archive)) == count
+    for path, entry in Registry(str(tmp_path / 'state.json')).entries.items():
+        assert entry['offset'] == os.path.getsize(path)
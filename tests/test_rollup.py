@@ -0,0 +1,66 @@
+import random
+from rosbeat.rollup import Rollup, Summary, is_summary
+
+def _log(second, message='tick', node='/talker', level='INFO'):
+    minutes, seconds = divmod(second, 60)
+    return {'timestamp': f'2023-11-14T22:{13 + minutes:02d}:{seconds:02d}.000Z', 'log_type': 'node_log',
+            'node_name': node, 'log_level': level, 'log_message': message}
+
+def test_top_messages_bound_their_true_counts():
+    summary = Summary(top_n=2, k=256)
+    rng = random.Random(1)
+    messages = ['heavy'] * 300 + ['medium'] * 100 + [f'noise {i}' for i in range(600)]
+    rng.shuffle(messages)
+    for end, message in enumerate(messages, 1):
+        summary.add(0, message, end)
+    rollup = Rollup(top_n=2)
+    top = rollup._document('talker-1.log', (0, 'node_log', '/talker', 'INFO'), summary)['top_messages']
+    assert [entry['message'] for entry in top] == ['heavy', 'medium']
+    for entry, true_count in zip(top, (300, 100)):
+        # Space-Saving: count is an upper bound and count - error a lower bound
+        assert entry['count'] - entry['error'] <= true_count <= entry['count']
+
+def test_distinct_estimate():
+    exact = Summary(top_n=5, k=256)
+    for i in range(100):
+        exact.add(0, f'message {i % 50}', i)
+    assert exact.distinct() == 50
+
+    sketch = Summary(top_n=5, k=256)
+    for i in range(20000):
+        sketch.add(0, f'message {i % 10000}', i)
+    assert 8000 <= sketch.distinct() <= 12000
+
+def test_instead_emits_only_summaries_per_window():
+    harvest = [('talker-1.log', end, _log(second, level=level))
+               for end, (second, level) in enumerate([(1, 'INFO'), (2, 'WARN'), (3, 'INFO'), (61, 'INFO')], 1)]
+    out = list(Rollup(mode='instead', window=60).apply(harvest))
+    assert all(is_summary(log) for _, _, log in out)
+    assert [(log['timestamp'][11:19], log['log_level'], log['count']) for _, _, log in out] == [
+        ('22:13:00', 'WARN', 1), ('22:13:00', 'INFO', 2), ('22:14:00', 'INFO', 1)]
+    # WARN's only record comes after INFO's first, so it can't commit past INFO's start
+    assert [end for _, end, _ in out] == [0, 3, 4]
+
+def test_alongside_keeps_raw_records():
+    harvest = [('talker-1.log', end, _log(second)) for end, second in enumerate([1, 2, 3], 1)]
+    out = list(Rollup(mode='alongside', window=60).apply(harvest))
+    assert [is_summary(log) for _, _, log in out] == [False, False, False, True]
+    assert out[-1][2]['count'] == 3
+
+def test_offsets_wait_for_open_groups():
+    rollup = Rollup(mode='instead', window=60)
+    harvest = [('talker-1.log', 10, _log(1, node='/a')),
+               ('talker-1.log', 20, _log(2, node='/b')),
+               ('talker-1.log', 30, _log(61, node='/a')),
+               # Late: reopens the first window for /b after it was emitted
+               ('talker-1.log', 40, _log(5, node='/b')),
+               ('talker-1.log', 50, _log(62, node='/a'))]
+    out = list(rollup.apply(harvest, flush=False))
+    # The first window's groups, each held back to where the next unshipped group starts
+    assert [(log['node_name'], end) for _, end, log in out] == [('/a', 10), ('/b', 20)]
+
+    # /a's second window (from offset 20) and /b's reopened first window (from 30) are still open
+    assert rollup._open['talker-1.log']
+    later = list(rollup.flush())
+    assert [(log['node_name'], log['timestamp'][11:19], end) for _, end, log in later] == [
+        ('/b', '22:13:00', 20), ('/a', '22:14:00', 50)]
@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+import pytest
+from rosbeat.spool import Spool, SpoolFull
+
+class Cluster:
+    """Stands in for an ingester's bulk(): acknowledges records until it is down or has taken its fill."""
+
+    batch_size = 10
+
+    def __init__(self, capacity=None):
+        self.shipped = []
+        self.down = False
+        self.capacity = capacity
+
+    def bulk(self, items):
+        for meta, log in items:
+            if self.down or (self.capacity is not None and len(self.shipped) >= self.capacity):
+                raise ConnectionError("cluster unreachable")
+            self.shipped.append(log['log_message'])
+            yield meta, True, None
+
+    @staticmethod
+    def is_retryable(error):
+        return False
+
+def _records(count, start=0):
+    return [(None, 0, {'log_message': f'message {i}'}) for i in range(start, start + count)]
+
+def _segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.ndjson'))
+
+def test_drain_ships_everything_and_deletes_segments(tmp_path):
+    directory = str(tmp_path / 'spool')
+    spool = Spool(directory, segment_bytes=256)
+    spool.append(_records(50), batch_size=5)
+    assert len(_segments(directory)) > 2
+
+    cluster = Cluster()
+    assert spool.drain(cluster) == 50
+    assert cluster.shipped == [f'message {i}' for i in range(50)]
+    assert spool.pending_bytes == 0
+    # Only the segment still being written to is left
+    assert len(_segments(directory)) <= 1
+
+def test_drainer_ships_records_as_they_are_spooled(tmp_path):
+    spool = Spool(str(tmp_path / 'spool'))
+    cluster = Cluster()
+    drainer = threading.Thread(target=spool.drain_forever, args=(cluster,), kwargs={'retry_interval': 0.05})
+    drainer.start()
+    spool.append(_records(20))
+    spool.append(_records(20, 20))
+    spool.close()
+    drainer.join(5)
+    assert not drainer.is_alive()
+    assert len(cluster.shipped) == 40
+
+def test_full_spool_during_outage_raises(tmp_path):
+    spool = Spool(str(tmp_path / 'spool'), max_bytes=2000)
+    cluster = Cluster()
+    cluster.down = True
+    drainer = threading.Thread(target=spool.drain_forever, args=(cluster,), kwargs={'retry_interval': 0.05})
+    drainer.start()
+    spool.append(_records(10))
+    deadline = time.monotonic() + 5
+    while not spool.outage and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert spool.outage
+    with pytest.raises(SpoolFull):
+        spool.append(_records(100, 10), batch_size=10)
+    pending = spool.pending_bytes
+    assert pending <= 2000
+
+    # Once the cluster is back, the drainer ships what was spooled before the spool filled up
+    cluster.down = False
+    deadline = time.monotonic() + 5
+    while spool.outage and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Closing first could end the drainer on an attempt that started while the cluster was down
+    spool.close()
+    drainer.join(5)
+    assert cluster.shipped[:10] == [f'message {i}' for i in range(10)]
+    assert spool.pending_bytes == 0
+
+def test_unshipped_segments_are_shipped_after_a_restart(tmp_path):
+    directory = str(tmp_path / 'spool')
+    spool = Spool(directory, segment_bytes=256)
+    spool.append(_records(50), batch_size=5)
+    first = Cluster(capacity=23)
+    with pytest.raises(ConnectionError):
+        spool.drain(first)
+    spool.close()
+
+    reopened = Spool(directory, segment_bytes=256)
+    second = Cluster()
+    reopened.drain(second)
+    # Acknowledged records are not shipped again, and nothing is lost
+    assert first.shipped + second.shipped == [f'message {i}' for i in range(50)]
+    assert reopened.pending_bytes == 0
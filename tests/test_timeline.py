@@ -0,0 +1,53 @@
+import os
+from rosbeat.__main__ import session_files
+from rosbeat.formats import classify_file
+from rosbeat.metrics import METRICS
+from rosbeat.timeline import merge_files
+
+def _line(seconds, message):
+    return f"[2023-11-14 22:13:{seconds:06.3f}][INFO] {message}\n".replace('.', ',', 1)
+
+def _write(session, name, entries):
+    path = session / name
+    path.write_text(''.join(_line(seconds, message) for seconds, message in entries))
+    return str(path)
+
+def _merge(session, window=2.0, offsets=None):
+    files = [(label, path, parse_line, (offsets or {}).get(path, 0))
+             for label, path, parse_line in session_files(str(session))]
+    return list(merge_files(files, window))
+
+def _late():
+    return sum(METRICS.series('rosbeat_timeline_late_total').values())
+
+def test_files_are_merged_by_timestamp(tmp_path):
+    _write(tmp_path, 'talker-1.log', [(1, 'talker 1'), (3, 'talker 3'), (5, 'talker 5')])
+    _write(tmp_path, 'listener-1.log', [(2, 'listener 2'), (3, 'listener 3'), (4, 'listener 4')])
+    messages = [log.log_message for _, _, log in _merge(tmp_path)]
+    # Ties keep the order of the files: listener-1.log is listed before talker-1.log
+    assert messages == ['talker 1', 'listener 2', 'listener 3', 'talker 3', 'listener 4', 'talker 5']
+
+def test_records_within_the_window_are_put_in_order(tmp_path):
+    _write(tmp_path, 'talker-1.log', [(1, 'a'), (2.5, 'c'), (2, 'b'), (6, 'd')])
+    assert [log.log_message for _, _, log in _merge(tmp_path)] == ['a', 'b', 'c', 'd']
+
+def test_record_later_than_the_window_is_clamped(tmp_path):
+    _write(tmp_path, 'talker-1.log', [(1, 'a'), (5, 'b'), (9, 'c'), (2, 'late'), (12, 'd')])
+    before = _late()
+    logs = [log for _, _, log in _merge(tmp_path)]
+    # 'late' can't go before records already released; it follows them, keeping its own timestamp
+    assert [log.log_message for log in logs] == ['a', 'b', 'late', 'c', 'd']
+    assert logs[2].timestamp.startswith('2023-11-14T22:13:02')
+    assert _late() == before + 1
+
+def test_partial_merge_never_commits_past_a_held_record(tmp_path):
+    path = _write(tmp_path, 'talker-1.log', [(0, 'a'), (1.5, 'c'), (1, 'b'), (5, 'd'), (5.5, 'e')])
+    merged = _merge(tmp_path)
+    assert [log.log_message for _, _, log in merged] == ['a', 'b', 'c', 'd', 'e']
+    everything = {log.log_message for _, _, log in merged}
+    for shipped in range(1, len(merged) + 1):
+        committed = merged[shipped - 1][1]
+        # What a restart reads from the committed offset, plus what was shipped, covers every record
+        resumed = {log.log_message for _, log in classify_file('talker-1.log').harvest(path, committed)}
+        assert {log.log_message for _, _, log in merged[:shipped]} | resumed == everything
+    assert merged[-1][1] == os.path.getsize(path)
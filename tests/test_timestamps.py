@@ -0,0 +1,49 @@
+from datetime import datetime, timezone
+import pytest
+from rosbeat.timestamps import date_to_iso, epoch_to_iso, iso_to_millis
+
+def _epoch(when, micros=0):
+    return when.replace(tzinfo=timezone.utc).timestamp() + micros / 1e6
+
+EPOCHS = [
+    '0',
+    f'{_epoch(datetime(2023, 11, 14, 23, 59, 59)):.0f}.999999',  # midnight
+    f'{_epoch(datetime(2023, 11, 15)):.0f}.000001',
+    f'{_epoch(datetime(2023, 11, 30, 23, 59, 59)):.0f}.5',  # month
+    f'{_epoch(datetime(2023, 12, 31, 23, 59, 59)):.0f}.999',  # year
+    f'{_epoch(datetime(2024, 1, 1)):.0f}',
+    f'{_epoch(datetime(2024, 2, 28, 23, 59, 59)):.0f}.25',  # leap day
+    f'{_epoch(datetime(2024, 2, 29, 23, 59, 59)):.0f}.123456',
+    '1700000000.0000005',  # rounds half to even
+    '1700000000.9999996',  # rounds up into the next second
+    '1700000000.123456789',
+]
+
+DATES = [
+    '2023-11-14 23:59:59,999', '2023-11-15 00:00:00,000', '2023-11-15 00:00:00,001',
+    '2023-11-30 23:59:59,500', '2023-12-01 00:00:00,000',
+    '2023-12-31 23:59:59,999', '2024-01-01 00:00:00,000',
+    '2024-02-28 23:59:59,250', '2024-02-29 00:00:00,010', '2024-02-29 23:59:59,999', '2024-03-01 00:00:00,000',
+]
+
+@pytest.mark.parametrize('value', EPOCHS)
+def test_epoch_fast_path_matches_datetime(value):
+    expected = datetime.fromtimestamp(float(value), timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
+    # Once on a cache miss, once on a hit, and once after the cache moved on to another second
+    assert epoch_to_iso(value) == expected
+    assert epoch_to_iso(value) == expected
+    epoch_to_iso('86400')
+    assert epoch_to_iso(value) == expected
+
+@pytest.mark.parametrize('value', DATES)
+def test_date_fast_path_matches_datetime(value):
+    expected = datetime.strptime(value, '%Y-%m-%d %H:%M:%S,%f').isoformat() + 'Z'
+    assert date_to_iso(value) == expected
+    assert date_to_iso(value) == expected
+    date_to_iso('2000-01-01 00:00:00,000')
+    assert date_to_iso(value) == expected
+
+@pytest.mark.parametrize('value', DATES)
+def test_millis_round_trip(value):
+    parsed = datetime.strptime(value, '%Y-%m-%d %H:%M:%S,%f').replace(tzinfo=timezone.utc)
+    assert iso_to_millis(date_to_iso(value)) == round(parsed.timestamp() * 1000)
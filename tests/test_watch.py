@@ -0,0 +1,91 @@
+import os
+import time
+from rosbeat.registry import Registry
+from rosbeat.watch import LogWatcher
+
+RECORD = "[2023-11-14 22:13:01,123][ERROR] Callback raised an exception\n"
+TRACEBACK = ("Traceback (most recent call last):\n"
+             '  File "/opt/ros/lib/talker.py", line 12, in callback\n'
+             "ValueError: invalid goal\n")
+
+class Recorder:
+    """Stands in for an ingester: keeps what is shipped and acknowledges it."""
+
+    def __init__(self):
+        self.shipped = []
+        self.down = False
+
+    def ingest_harvest(self, batch, registry, quiet=False):
+        if self.down:
+            raise ConnectionError("cluster unreachable")
+        for file_path, end, log in batch:
+            self.shipped.append(log)
+            registry.advance(file_path, end)
+        registry.save()
+        return len(batch)
+
+def _watcher(tmp_path, linger=0.2, **kwargs):
+    session = tmp_path / 'session'
+    session.mkdir()
+    registry = Registry(str(tmp_path / 'state.json'))
+    recorder = Recorder()
+    watcher = LogWatcher(str(session), recorder, registry, linger=linger, use_inotify=False, **kwargs)
+    watcher._follow_session()
+    return watcher, recorder, str(session / 'talker-1.log')
+
+def _append(path, text):
+    with open(path, 'a') as f:
+        f.write(text)
+
+def _tick(watcher):
+    watcher._poll_once()
+    watcher._release_held()
+    if watcher.buffer and time.monotonic() - watcher.first_buffered >= watcher.linger:
+        watcher.flush()
+
+def test_traceback_written_later_joins_its_record(tmp_path):
+    watcher, recorder, log = _watcher(tmp_path)
+    _append(log, RECORD)
+    _tick(watcher)
+    _append(log, TRACEBACK)
+    _tick(watcher)
+    assert recorder.shipped == []
+
+    time.sleep(0.25)
+    _tick(watcher)
+    watcher.flush()
+    assert [entry.log_message for entry in recorder.shipped] == [
+        "Callback raised an exception\n" + TRACEBACK.rstrip('\n')]
+    assert watcher.registry.entries[log]['offset'] == os.path.getsize(log)
+
+def test_next_record_releases_the_held_one(tmp_path):
+    watcher, recorder, log = _watcher(tmp_path, linger=60)
+    _append(log, RECORD)
+    _tick(watcher)
+    _append(log, RECORD.replace('ERROR', 'INFO'))
+    _tick(watcher)
+    watcher.flush()
+    assert [entry.log_level for entry in recorder.shipped] == ['ERROR']
+    # The held record is not committed, so a restart reads it again
+    assert watcher.registry.entries[log]['offset'] == len(RECORD)
+
+def test_outage_rereads_from_committed_offsets(tmp_path):
+    watcher, recorder, log = _watcher(tmp_path, linger=0, retry_backoff=0.1)
+    info = RECORD.replace('ERROR', 'INFO')
+    _append(log, info)
+    _tick(watcher)
+    _tick(watcher)
+    recorder.down = True
+    _append(log, info * 3)
+    _tick(watcher)
+    _tick(watcher)
+    assert len(recorder.shipped) == 1
+    assert watcher.registry.entries[log]['offset'] == len(info)
+
+    recorder.down = False
+    time.sleep(0.15)
+    watcher._retry()
+    _tick(watcher)
+    watcher.flush()
+    assert len(recorder.shipped) == 4
+    assert watcher.registry.entries[log]['offset'] == os.path.getsize(log)